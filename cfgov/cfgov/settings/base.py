@@ -319,6 +319,13 @@ HOUSING_COUNSELOR_S3_PATH_TEMPLATE = (
     "/a/assets/hud/{file_format}s/{zipcode}.{file_format}"
 )
 
+# If set, the housing counselor search answers ZIP code lookups from this
+# dataset file (written by the hud_generate_json management command),
+# falling back to the JSON files on S3.
+HOUSING_COUNSELOR_DATASET_PATH = os.environ.get(
+    "HOUSING_COUNSELOR_DATASET_PATH"
+)
+
 HAYSTACK_CONNECTIONS = {
     "default": {
         "ENGINE": "search.backends.CFGOVElasticsearch2SearchEngine",
@@ -457,6 +464,12 @@ DATE_FORMAT = "n/j/Y"
 GOOGLE_ANALYTICS_ID = ""
 GOOGLE_ANALYTICS_SITE = ""
 
+# Pre-rendered mortgage performance API payloads. This must be a directory
+# that the publish_mortgage_payloads script and every web server share, such
+# as a network mount. If it isn't set, payloads can't be published and the
+# API answers every request from the database.
+MORTGAGE_PAYLOAD_ROOT = os.environ.get("MORTGAGE_PAYLOAD_ROOT")
+
 # Regulations.gov environment variables
 REGSGOV_BASE_URL = os.environ.get("REGSGOV_BASE_URL")
 REGSGOV_API_KEY = os.environ.get("REGSGOV_API_KEY")
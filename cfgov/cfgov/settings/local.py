@@ -84,7 +84,13 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.dummy.DummyCache",
         "TIMEOUT": 0,
     }
-    for k in ("default", "post_preview")
+    for k in (
+        "default",
+        "post_preview",
+        "parse_links",
+        "regulations",
+        "mega_menu",
+    )
 }
 
 # Optionally enable cache for post_preview
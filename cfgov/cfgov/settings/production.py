@@ -95,7 +95,37 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'post_preview_cache',
         'TIMEOUT': None,
-    }
+    },
+    # Rewritten page HTML, see core.middleware.ParseLinksCache. Each process
+    # keeps its own copy, culled once it holds MAX_ENTRIES pages.
+    'parse_links': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'parse_links',
+        'TIMEOUT': int(os.getenv('PARSE_LINKS_CACHE_TIMEOUT', 60 * 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('PARSE_LINKS_CACHE_MAX_ENTRIES', 200)),
+        },
+    },
+    # Rendered regulation sections, tables of contents and their generation
+    # tokens, see regulations3k.section_cache. Shared by all hosts so that
+    # saving a section on one host invalidates it everywhere, and sized to
+    # hold every section of every live regulation version.
+    'regulations': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'regulations_cache',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('REGULATIONS_CACHE_MAX_ENTRIES', 20000)
+            ),
+        },
+    },
+    # Converted mega menus, see mega_menu.cache. Shared by all hosts so that
+    # publishing on one host clears the menus everywhere.
+    'mega_menu': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'mega_menu_cache',
+    },
 }
 
 # ALLOWED_HOSTS should be defined as a JSON list in the ALLOWED_HOSTS
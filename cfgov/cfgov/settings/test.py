@@ -41,6 +41,7 @@ FLAG_SOURCES = (
 # other files don't write them to the local development media directory. The
 # test runner cleans up this directory after the tests run.
 MEDIA_ROOT = os.path.join(PROJECT_ROOT, 'cfgov', 'tests', 'test-media')
+MORTGAGE_PAYLOAD_ROOT = os.path.join(MEDIA_ROOT, 'mortgage_payloads')
 
 # Use a test-specific index
 HAYSTACK_CONNECTIONS["default"]["INDEX_NAME"] = (
@@ -0,0 +1,98 @@
+import os
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.utils.encoding import force_str
+
+from wagtail.core.rich_text import expand_db_html
+
+from core.middleware import parse_links
+from core.utils import add_link_markup, get_body_html, get_link_tags
+
+
+def parse_links_per_tag(html, request_path=None):
+    """The previous parse_links, which rescans the page for every link."""
+    expanded_html = expand_db_html(force_str(html))
+
+    body_html = get_body_html(expanded_html)
+    if body_html is None:
+        return expanded_html
+
+    for tag in get_link_tags(body_html):
+        tag_with_markup = add_link_markup(tag, request_path)
+        if tag_with_markup:
+            expanded_html = expanded_html.replace(tag, tag_with_markup)
+
+    return expanded_html
+
+
+class Command(BaseCommand):
+    help = (
+        'Time link parsing on pages, comparing the single-pass parse_links '
+        'with the previous per-link implementation.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pages',
+            nargs='+',
+            help='Site paths to render, like /owning-a-home/, or the names '
+                 'of saved HTML files'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of times to parse each page'
+        )
+
+    def get_html(self, page):
+        if os.path.isfile(page):
+            with open(page, 'rb') as f:
+                return f.read()
+
+        # Render the page without the middleware parsing its links.
+        with override_settings(
+            ALLOWED_HOSTS=['*'], PARSE_LINKS_EXCLUSION_LIST=['']
+        ):
+            response = Client().get(page)
+
+        if response.status_code != 200:
+            raise CommandError('{} returned {}'.format(
+                page, response.status_code
+            ))
+        return response.content
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+
+        for page in options['pages']:
+            html = self.get_html(page)
+            request_path = None if os.path.isfile(page) else page
+
+            if parse_links(html, request_path) != parse_links_per_tag(
+                html, request_path
+            ):
+                self.stderr.write('{}: outputs differ'.format(page))
+
+            before = timeit.timeit(
+                lambda: parse_links_per_tag(html, request_path),
+                number=repeat
+            ) / repeat
+            after = timeit.timeit(
+                lambda: parse_links(html, request_path),
+                number=repeat
+            ) / repeat
+
+            self.stdout.write(
+                '{}: {:,} bytes, {} links, per-link {:.1f} ms, '
+                'single-pass {:.1f} ms ({:.1f}x)'.format(
+                    page,
+                    len(html),
+                    len(get_link_tags(force_str(html))),
+                    before * 1000,
+                    after * 1000,
+                    before / after if after else float('inf')
+                )
+            )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.templatetags.svg_icon import find_icon_names, get_icon
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that every icons/*.svg in staticfiles is a valid SVG, and '
+        'load them into memory'
+    )
+
+    def handle(self, *args, **options):
+        names = find_icon_names()
+        errors = []
+
+        for name in names:
+            try:
+                get_icon(name)
+            except ValueError as e:
+                errors.append(str(e))
+
+        for error in errors:
+            self.stderr.write(error)
+
+        if errors:
+            raise CommandError('{} of {} icons are invalid'.format(
+                len(errors), len(names)
+            ))
+
+        self.stdout.write('{} icons are valid'.format(len(names)))
@@ -1,12 +1,34 @@
+import codecs
+import hashlib
 import re
+import threading
 
 from django.conf import settings
+from django.core.cache import caches
 from django.utils import translation
 from django.utils.encoding import force_str
 
 from wagtail.core.rich_text import expand_db_html
 
-from core.utils import add_link_markup, get_body_html, get_link_tags
+from core.utils import A_TAG_RE, BODY_TAG_RE, get_link_markup
+
+
+# The pieces of a <body> element, for finding it across streamed chunks.
+BODY_OPEN_RE = re.compile(r'<body(?:\s+[^>]*?|)>', re.IGNORECASE)
+BODY_CLOSE_RE = re.compile(r'</body>', re.IGNORECASE)
+
+# The start of an <a> element, and its end.
+A_OPEN_RE = re.compile(r'<a(?:\s|>)', re.IGNORECASE)
+A_CLOSE_RE = re.compile(r'</a>', re.IGNORECASE)
+
+# The cache alias that holds rewritten HTML, and the settings whose values
+# change what parse_links returns for the same input.
+PARSE_LINKS_CACHE_ALIAS = 'parse_links'
+PARSE_LINKS_CACHE_KEY_SETTINGS = ('ROOT_URLCONF', 'SECRET_KEY')
+
+# Wagtail rich text links and embeds, which expand_db_html expands using the
+# database, so HTML that contains them can't be cached.
+RICH_TEXT_REFERENCES = (b'linktype=', b'embedtype=')
 
 
 class DownstreamCacheControlMiddleware(object):
@@ -37,20 +59,195 @@ def parse_links(html, request_path=None, encoding=None):
     expanded_html = expand_db_html(html_as_text)
 
     # Parse links only in the <body> of the HTML
-    body_html = get_body_html(expanded_html)
-    if body_html is None:
+    body_match = BODY_TAG_RE.search(expanded_html)
+    if body_match is None:
         return expanded_html
 
-    link_tags = get_link_tags(body_html)
-    for tag in link_tags:
-        tag_with_markup = add_link_markup(tag, request_path)
+    return rewrite_links(
+        expanded_html,
+        request_path,
+        body_match.start(),
+        body_match.end()
+    )
+
+
+def rewrite_links(html, request_path=None, start=0, end=None):
+    """Add markup to the links in html[start:end], in a single pass.
+
+    The output is built once from the unchanged stretches between links and
+    the links' replacements. Identical links are only processed once.
+    """
+    if end is None:
+        end = len(html)
+
+    chunks = []
+    cursor = 0
+    markup_by_tag = {}
+
+    for match in A_TAG_RE.finditer(html, start, end):
+        tag = match.group(0)
+        if tag not in markup_by_tag:
+            markup_by_tag[tag] = get_link_markup(tag, request_path)
+
+        tag_with_markup = markup_by_tag[tag]
         if tag_with_markup:
-            expanded_html = expanded_html.replace(
-                tag,
-                tag_with_markup
-            )
+            chunks.append(html[cursor:match.start()])
+            chunks.append(tag_with_markup)
+            cursor = match.end()
+
+    if not chunks:
+        return html
+
+    chunks.append(html[cursor:])
+    return ''.join(chunks)
+
+
+def split_complete_html(html):
+    """Split HTML into a part that can be parsed now, and a remainder.
+
+    The remainder starts at a tag, or an <a> element, that may continue in
+    the next chunk of a streamed response.
+    """
+    cut = len(html)
+
+    last_tag_start = html.rfind('<')
+    if last_tag_start != -1 and html.find('>', last_tag_start) == -1:
+        cut = last_tag_start
+
+    last_link = None
+    for last_link in A_OPEN_RE.finditer(html, 0, cut):
+        pass
+    if (
+        last_link is not None and
+        not A_CLOSE_RE.search(html, last_link.start(), cut)
+    ):
+        cut = last_link.start()
+
+    return html[:cut], html[cut:]
+
+
+def parse_links_streaming(chunks, request_path=None, encoding=None):
+    """Process all links in an iterable of HTML chunks.
+
+    This is parse_links for streaming responses. Each chunk is processed as
+    soon as it arrives, except for an incomplete tag or link at its end,
+    which is held back until the next chunk completes it. Links are parsed
+    from the opening <body> tag to the closing </body> tag.
+    """
+    if encoding is None:
+        encoding = settings.DEFAULT_CHARSET
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    state = {'in_body': False, 'after_body': False}
+
+    def process(html):
+        html = expand_db_html(html)
+        if state['after_body']:
+            return html
+
+        start = 0
+        if not state['in_body']:
+            body_open = BODY_OPEN_RE.search(html)
+            if body_open is None:
+                return html
+            state['in_body'] = True
+            start = body_open.end()
+
+        end = len(html)
+        body_close = BODY_CLOSE_RE.search(html, start)
+        if body_close is not None:
+            state['after_body'] = True
+            end = body_close.start()
+
+        return rewrite_links(html, request_path, start, end)
+
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        html, pending = split_complete_html(pending)
+        if html:
+            yield process(html).encode(encoding)
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield process(pending).encode(encoding)
+
+
+class ParseLinksCache(object):
+    """A cache of parse_links output, keyed by a hash of its input.
+
+    The key covers the response body, the request path, the encoding, and
+    the settings that influence rewriting, so a hit is always what
+    parse_links would have returned. HTML that still contains Wagtail rich
+    text references is never cached, because expanding those depends on the
+    database.
+
+    The cache is only used if settings.CACHES has an alias named
+    PARSE_LINKS_CACHE_ALIAS. Hits and misses are counted per process.
+    """
+    def __init__(self, alias=PARSE_LINKS_CACHE_ALIAS):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_cache(self):
+        if self.alias not in settings.CACHES:
+            return None
+        return caches[self.alias]
+
+    def get_key(self, html, request_path, encoding):
+        digest = hashlib.sha256(html)
+        for value in (request_path, encoding) + tuple(
+            getattr(settings, name, None)
+            for name in PARSE_LINKS_CACHE_KEY_SETTINGS
+        ):
+            digest.update(b'\0' + str(value).encode('utf-8'))
+        return 'parse_links:' + digest.hexdigest()
+
+    def parse_links(self, html, request_path=None, encoding=None):
+        """Return parse_links(html, ...), from the cache if possible."""
+        if encoding is None:
+            encoding = settings.DEFAULT_CHARSET
+        if isinstance(html, str):
+            html = html.encode(encoding)
+
+        cache = self.get_cache()
+        if cache is None or any(
+            reference in html for reference in RICH_TEXT_REFERENCES
+        ):
+            return parse_links(html, request_path, encoding=encoding)
+
+        key = self.get_key(html, request_path, encoding)
+        parsed = cache.get(key)
+        if parsed is not None:
+            self.record(hit=True)
+            return parsed
+
+        self.record(hit=False)
+        parsed = parse_links(html, request_path, encoding=encoding)
+        cache.set(key, parsed)
+        return parsed
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """Return this process's cache hit and miss counts."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
 
-    return expanded_html
+parse_links_cache = ParseLinksCache()
 
 
 class ParseLinksMiddleware(object):
@@ -61,11 +258,21 @@ class ParseLinksMiddleware(object):
     def __call__(self, request):
         response = self.get_response(request)
         if self.should_parse_links(request.path, response['content-type']):
-            response.content = parse_links(
-                response.content,
-                request.path,
-                encoding=response.charset
-            )
+            if response.streaming:
+                response.streaming_content = parse_links_streaming(
+                    response.streaming_content,
+                    request.path,
+                    encoding=response.charset
+                )
+                # Rewriting links changes the length of the content.
+                if response.has_header('Content-Length'):
+                    del response['Content-Length']
+            else:
+                response.content = parse_links_cache.parse_links(
+                    response.content,
+                    request.path,
+                    encoding=response.charset
+                )
         return response
 
     @classmethod
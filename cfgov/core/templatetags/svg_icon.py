@@ -1,7 +1,11 @@
+import posixpath
 import re
+from functools import lru_cache
 
 from django import template
 from django.contrib.staticfiles import finders
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.safestring import mark_safe
 
 
@@ -19,11 +23,12 @@ SVG_REGEX = re.compile(
     re.DOTALL | re.IGNORECASE | re.MULTILINE
 )
 
+ICONS_DIR = 'icons'
 
-@register.simple_tag()
-def svg_icon(name):
-    """Return SVG content given an icon name."""
-    relative_path = 'icons/{}.svg'.format(name)
+
+def load_icon(name):
+    """Read and validate an icon from staticfiles, without memoization."""
+    relative_path = '{}/{}.svg'.format(ICONS_DIR, name)
     static_filename = finders.find(relative_path)
 
     if not static_filename:
@@ -32,7 +37,44 @@ def svg_icon(name):
     with open(static_filename, 'r') as f:
         content = f.read()
 
-        if not SVG_REGEX.match(content):
-            raise ValueError('{} is not a valid SVG'.format(static_filename))
+    if not SVG_REGEX.match(content):
+        raise ValueError('{} is not a valid SVG'.format(static_filename))
+
+    return mark_safe(content)
+
+
+@lru_cache(maxsize=None)
+def get_icon(name):
+    """Return an icon's SVG content, reading it from staticfiles only once.
+
+    Missing or invalid icons raise ValueError, and are not memoized.
+    """
+    return load_icon(name)
+
 
-        return mark_safe(content)
+def find_icon_names():
+    """Return the sorted names of every icons/*.svg in staticfiles."""
+    names = set()
+
+    for finder in finders.get_finders():
+        for path, storage in finder.list([]):
+            path = path.replace('\\', '/')
+            directory, filename = posixpath.split(path)
+            name, ext = posixpath.splitext(filename)
+            if directory == ICONS_DIR and ext == '.svg':
+                names.add(name)
+
+    return sorted(names)
+
+
+@receiver(setting_changed)
+def clear_icons(*, setting, **kwargs):
+    """Forget memoized icons when the staticfiles they come from change."""
+    if 'STATICFILES' in setting or setting == 'INSTALLED_APPS':
+        get_icon.cache_clear()
+
+
+@register.simple_tag()
+def svg_icon(name):
+    """Return SVG content given an icon name."""
+    return get_icon(name)
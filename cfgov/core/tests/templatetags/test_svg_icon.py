@@ -1,10 +1,18 @@
 import os
+from io import StringIO
 
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.template import Context, Template
 from django.test import TestCase, override_settings
 from django.utils.safestring import SafeData
 
-from core.templatetags.svg_icon import SVG_REGEX, svg_icon
+import mock
+
+from core.templatetags.svg_icon import (
+    SVG_REGEX, find_icon_names, get_icon, svg_icon
+)
 
 
 VALID_SVG = (
@@ -38,14 +46,21 @@ class SvgRegexTests(TestCase):
         ))
 
 
+TEST_STATICFILES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'staticfiles'
+)
+
+PLACEHOLDER_STATICFILES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'testutils',
+    'staticfiles'
+)
+
+
 @override_settings(
     MOCK_STATICFILES_PATTERNS={},
-    STATICFILES_DIRS=[
-        os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'staticfiles'
-        ),
-    ]
+    STATICFILES_DIRS=[TEST_STATICFILES_DIR]
 )
 class SvgIconTests(TestCase):
     def test_assert_renders_valid_svg_from_staticfiles_icons(self):
@@ -70,3 +85,43 @@ class SvgIconTests(TestCase):
         template = Template('{% load svg_icon %}{% svg_icon "invalid" %}')
         with self.assertRaises(ValueError):
             template.render(Context())
+
+    def test_icon_is_only_read_once(self):
+        get_icon.cache_clear()
+        with mock.patch(
+            'core.templatetags.svg_icon.finders.find',
+            wraps=finders.find
+        ) as mock_find:
+            svg_icon('test')
+            svg_icon('test')
+        mock_find.assert_called_once_with('icons/test.svg')
+
+    def test_icons_are_forgotten_when_staticfiles_change(self):
+        svg_icon('test')
+        with override_settings(STATICFILES_DIRS=[]):
+            with self.assertRaises(ValueError):
+                svg_icon('test')
+        self.assertEqual(svg_icon('test'), VALID_SVG)
+
+    def test_find_icon_names(self):
+        self.assertEqual(find_icon_names(), ['invalid', 'test'])
+
+
+@override_settings(MOCK_STATICFILES_PATTERNS={})
+class ValidateSvgIconsTests(TestCase):
+    def call_command(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('validate_svg_icons', stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    @override_settings(STATICFILES_DIRS=[TEST_STATICFILES_DIR])
+    def test_invalid_icon_fails(self):
+        with self.assertRaises(CommandError) as cm:
+            self.call_command()
+        self.assertEqual(str(cm.exception), '1 of 2 icons are invalid')
+
+    @override_settings(STATICFILES_DIRS=[PLACEHOLDER_STATICFILES_DIR])
+    def test_valid_icons_pass(self):
+        stdout, stderr = self.call_command()
+        self.assertEqual(stderr, '')
+        self.assertEqual(stdout, '1 icons are valid\n')
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, StreamingHttpResponse
 from django.test import (
     RequestFactory, SimpleTestCase, TestCase, override_settings
 )
@@ -9,7 +11,8 @@ import mock
 from bs4 import BeautifulSoup
 
 from core.middleware import (
-    DeactivateTranslationsMiddleware, ParseLinksMiddleware, parse_links
+    DeactivateTranslationsMiddleware, ParseLinksCache, ParseLinksMiddleware,
+    parse_links, parse_links_streaming, split_complete_html
 )
 from v1.models import CFGOVPage
 from v1.tests.wagtail_pages.helpers import publish_page
@@ -278,6 +281,163 @@ class TestParseLinks(TestCase):
         self.assertNotIn('/foo/bar/', output)
         self.assertIn('href="#anchor"', output)
 
+    def test_identical_links_are_processed_once(self):
+        s = (
+            '<body>'
+            '<a href="https://first.com">one</a>'
+            '<a href="https://first.com">one</a>'
+            '</body>'
+        )
+        with mock.patch(
+            'core.middleware.get_link_markup', return_value='<a>x</a>'
+        ) as mock_get_link_markup:
+            output = parse_links(s)
+        mock_get_link_markup.assert_called_once()
+        self.assertEqual(output, '<body><a>x</a><a>x</a></body>')
+
+
+class TestParseLinksStreaming(TestCase):
+    html = (
+        '<html><head><a href="https://head.com">head</a></head>'
+        '<body class="test">'
+        '<a href="/something">internal</a>'
+        '<a href="https://google.com">external link</a>'
+        '<p>哈哈</p>'
+        '<a href="/something.pdf">file</a>'
+        '</body>'
+        '<a href="https://after.com">after</a></html>'
+    )
+
+    def stream(self, chunk_size, encoding='utf-8'):
+        content = self.html.encode(encoding)
+        return b''.join(parse_links_streaming(
+            (
+                content[i:i + chunk_size]
+                for i in range(0, len(content), chunk_size)
+            ),
+            encoding=encoding
+        )).decode(encoding)
+
+    def test_streamed_output_matches_parse_links(self):
+        expected = parse_links(self.html)
+        for chunk_size in (1, 2, 7, 64, len(self.html.encode('utf-8'))):
+            self.assertEqual(self.stream(chunk_size), expected)
+
+    def test_streamed_non_default_encoding(self):
+        self.assertEqual(
+            self.stream(3, encoding='gb2312'),
+            parse_links(self.html)
+        )
+
+    def test_split_holds_back_incomplete_tag(self):
+        self.assertEqual(
+            split_complete_html('<p>text</p><a hr'),
+            ('<p>text</p>', '<a hr')
+        )
+
+    def test_split_holds_back_unclosed_link(self):
+        self.assertEqual(
+            split_complete_html('<p>text</p><a href="/">link'),
+            ('<p>text</p>', '<a href="/">link')
+        )
+
+    def test_split_complete_html(self):
+        self.assertEqual(
+            split_complete_html('<p><a href="/">link</a> text'),
+            ('<p><a href="/">link</a> text', '')
+        )
+
+    def test_middleware_parses_streaming_response(self):
+        def get_response(request):
+            response = StreamingHttpResponse(
+                iter([b'<body><a href="https://go', b'ogle.com">x</a></body>'])
+            )
+            response['Content-Length'] = 50
+            return response
+
+        request = RequestFactory().get('/')
+        response = ParseLinksMiddleware(get_response)(request)
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertIn(b'external-site', b''.join(response.streaming_content))
+
+    def test_middleware_parses_response(self):
+        def get_response(request):
+            return HttpResponse(
+                '<body><a href="https://google.com">x</a></body>'
+            )
+
+        request = RequestFactory().get('/')
+        response = ParseLinksMiddleware(get_response)(request)
+        self.assertIn(b'external-site', response.content)
+
+
+class TestParseLinksCache(TestCase):
+    html = b'<body><a href="https://google.com">external link</a></body>'
+
+    def setUp(self):
+        self.cache = ParseLinksCache()
+        locmem = LocMemCache('test_parse_links', {})
+        locmem.clear()
+        self.cache.get_cache = mock.Mock(return_value=locmem)
+
+    def test_repeat_render_skips_parsing(self):
+        with mock.patch(
+            'core.middleware.parse_links', wraps=parse_links
+        ) as mock_parse_links:
+            first = self.cache.parse_links(self.html, '/')
+            second = self.cache.parse_links(self.html, '/')
+
+        self.assertEqual(first, parse_links(self.html, '/'))
+        self.assertEqual(second, first)
+        mock_parse_links.assert_called_once()
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_key_depends_on_path_encoding_and_settings(self):
+        key = self.cache.get_key(self.html, '/', 'utf-8')
+        self.assertNotEqual(key, self.cache.get_key(self.html, '/a/', 'utf-8'))
+        self.assertNotEqual(key, self.cache.get_key(self.html, '/', 'latin1'))
+        self.assertNotEqual(key, self.cache.get_key(b'<body></body>', '/',
+                                                    'utf-8'))
+        with self.settings(SECRET_KEY='another secret'):
+            self.assertNotEqual(
+                key, self.cache.get_key(self.html, '/', 'utf-8')
+            )
+
+    def test_rich_text_references_are_not_cached(self):
+        for html in (
+            b'<body><a linktype="page" id="1">x</a></body>',
+            b'<body><embed embedtype="image" id="1" format="left"/></body>',
+        ):
+            with mock.patch(
+                'core.middleware.parse_links'
+            ) as mock_parse_links:
+                self.cache.parse_links(html)
+                self.cache.parse_links(html)
+
+            self.assertEqual(mock_parse_links.call_count, 2)
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 0})
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    })
+    def test_get_cache_without_alias(self):
+        self.assertIsNone(ParseLinksCache().get_cache())
+
+    def test_no_cache_parses_every_time(self):
+        self.cache.get_cache.return_value = None
+        with mock.patch('core.middleware.parse_links') as mock_parse_links:
+            self.cache.parse_links(self.html)
+            self.cache.parse_links(self.html)
+
+        self.assertEqual(mock_parse_links.call_count, 2)
+
+    def test_reset_stats(self):
+        self.cache.parse_links(self.html)
+        self.cache.reset_stats()
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 0})
+
 
 class DeactivateTranslationsMiddlewareTests(SimpleTestCase):
     def test_deactivates_translations(self):
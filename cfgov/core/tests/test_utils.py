@@ -4,7 +4,7 @@ from django.test import TestCase
 
 from core.utils import (
     extract_answers_from_request, format_file_size, get_body_html,
-    get_link_tags
+    get_link_tags, link_needs_markup
 )
 
 
@@ -103,3 +103,33 @@ class LinkUtilsTests(TestCase):
             get_link_tags('outer <a  >inner</a>'),
             ['<a  >inner</a>', ]
         )
+
+    def test_link_needs_markup_internal_link(self):
+        self.assertFalse(link_needs_markup('<a href="/foo/">foo</a>', None))
+
+    def test_link_needs_markup_external_link(self):
+        self.assertTrue(
+            link_needs_markup('<a href="https://google.com">g</a>', None)
+        )
+
+    def test_link_needs_markup_file_link(self):
+        self.assertTrue(link_needs_markup('<a href="/f.PDF">f</a>', None))
+
+    def test_link_needs_markup_in_page_anchor(self):
+        self.assertTrue(
+            link_needs_markup('<a href="/foo/#bar">bar</a>', '/foo/')
+        )
+
+    def test_link_needs_markup_iconless_child(self):
+        self.assertTrue(
+            link_needs_markup('<a href="/foo/"><img src="x"></a>', None)
+        )
+
+    def test_link_needs_markup_unclear_href(self):
+        for tag in (
+            '<a>no href</a>',
+            '<a href=/foo/>unquoted</a>',
+            '<a href="/foo/?a=1&amp;b=2">reference</a>',
+            '<a href="/foo/" HREF="https://google.com">twice</a>',
+        ):
+            self.assertTrue(link_needs_markup(tag, None))
@@ -49,6 +49,19 @@ ICONLESS_LINK_CHILD_ELEMENTS = [
     'img', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
 ]
 
+# Match an href attribute, capturing its value if it is quoted and has no
+# character references, so that it is the same after HTML parsing.
+HREF_ATTR_RE = re.compile(
+    r'\shref\s*=\s*(?:"([^"&]*)"|\'([^\'&]*)\'|(.?))',
+    re.IGNORECASE
+)
+
+# Match any child element that can affect a link's icon.
+ICON_CHILD_RE = re.compile(
+    r'<(?:svg|{})\b'.format('|'.join(ICONLESS_LINK_CHILD_ELEMENTS)),
+    re.IGNORECASE
+)
+
 
 def append_query_args_to_url(base_url, args_dict):
     return "{0}?{1}".format(base_url, urlencode(args_dict))
@@ -102,6 +115,40 @@ def get_link_tags(html):
     return A_TAG_RE.findall(html)
 
 
+def link_needs_markup(tag, request_path):
+    """Return False if add_link_markup would certainly not modify a link.
+
+    This inspects the link's HTML with regular expressions, so most links
+    on a page skip being parsed by BeautifulSoup. Links it isn't sure about
+    return True and go through add_link_markup.
+    """
+    open_tag, _, contents = tag.partition('>')
+    hrefs = HREF_ATTR_RE.findall(open_tag)
+    if len(hrefs) != 1 or hrefs[0][2]:
+        return True
+
+    href = hrefs[0][0] or hrefs[0][1]
+    if request_path is not None and href.startswith(request_path + '#'):
+        return True
+
+    if (
+        href.startswith('/external-site/?') or
+        NON_CFPB_LINKS.match(href) or
+        DOWNLOAD_LINKS.search(href)
+    ):
+        return True
+
+    return bool(ICON_CHILD_RE.search(contents))
+
+
+def get_link_markup(tag, request_path):
+    """Return a link with any necessary markup added, or None."""
+    if not link_needs_markup(tag, request_path):
+        return None
+
+    return add_link_markup(tag, request_path)
+
+
 def add_link_markup(tag, request_path):
     """Add necessary markup to the given link and return if modified.
 
@@ -235,7 +235,12 @@ class MortgageBase(models.Model):
         """
         return []
 
-    def aggregate_data(self):
+    def aggregate_data(self, commit=True):
+        """
+        Sum county values into this record.
+
+        Pass `commit=False` to compute the values without saving the record.
+        """
         count_fields = {
             'total': 0, 'current': 0, 'thirty': 0,
             'sixty': 0, 'ninety': 0, 'other': 0}
@@ -247,11 +252,13 @@ class MortgageBase(models.Model):
                     count_fields[field] += getattr(county, field)
             for field in count_fields:
                 setattr(self, field, count_fields[field])
-            self.save()
+            if commit:
+                self.save()
         elif type(self) == NonMSAMortgageData:
             for field in count_fields:
                 setattr(self, field, count_fields[field])
-            self.save()
+            if commit:
+                self.save()
 
     def time_series(self, days_late):
         if days_late == '30-89':
@@ -335,19 +342,26 @@ class NonMSAMortgageData(MortgageBase):
 class NationalMortgageData(MortgageBase):
     """Aggregate national data for a given date."""
 
-    def aggregate_data(self):
-        """Calculates aggregate values for all states, by date"""
+    def aggregate_data(self, commit=True, state_records=None):
+        """
+        Calculates aggregate values for all states, by date.
+
+        Unsaved state records can be passed as `state_records` to aggregate
+        them instead of the stored StateMortgageData for this date.
+        """
         count_fields = {
             'total': 0, 'current': 0, 'thirty': 0,
             'sixty': 0, 'ninety': 0, 'other': 0}
-        state_records = StateMortgageData.objects.filter(
-            date=self.date)
+        if state_records is None:
+            state_records = StateMortgageData.objects.filter(
+                date=self.date)
         for state in state_records:
             for field in count_fields:
                 count_fields[field] += getattr(state, field)
         for field in count_fields:
             setattr(self, field, count_fields[field])
-        self.save()
+        if commit:
+            self.save()
 
 
 class MortgagePerformancePage(BrowsePage):
@@ -390,9 +404,73 @@ class MortgagePerformancePage(BrowsePage):
         css = ['secondary-navigation.css']
 
 
+def get_monthly_averages(model, geo_field, threshold_year):
+    """
+    Return the threshold-year monthly average of `total` for every geography.
+
+    Averages for all geographies in `model` are computed in one aggregate
+    query and returned as a dict keyed by the value of `geo_field`, the
+    foreign key to the geography. Geographies with no records are omitted.
+    """
+    # Clear the models' default ordering, which Django would otherwise add
+    # to the GROUP BY, giving one row per geography and month.
+    rows = model.objects.filter(
+        date__year=threshold_year
+    ).order_by().values(geo_field).annotate(
+        annual_sum=models.Sum('total'),
+        months=models.Count('pk'))
+    return {
+        row[geo_field]: (row['annual_sum'] or 0) * 1.0 / row['months']
+        for row in rows
+    }
+
+
+def bulk_validate(geo_model, flag, averages, threshold_count, eligible=None):
+    """
+    Set a boolean validity flag on every geography in one pass.
+
+    Geographies are valid if their monthly average meets the threshold
+    count, and, if `eligible` is given, if `eligible(geo)` is true. Only
+    changed flags are written, with a single bulk_update.
+    """
+    changed = []
+    for geo in geo_model.objects.all():
+        valid = averages.get(geo.pk, 0) >= threshold_count
+        if eligible is not None and not eligible(geo):
+            valid = False
+        if getattr(geo, flag) is not valid:
+            setattr(geo, flag, valid)
+            changed.append(geo)
+    geo_model.objects.bulk_update(changed, [flag], batch_size=1000)
+    return changed
+
+
+def validate_metro_areas():
+    """Validate every metro area at once; see MetroArea.validate."""
+    (threshold_count,
+     threshold_year) = MortgageDataConstant.get_thresholds()
+    averages = get_monthly_averages(MSAMortgageData, 'msa', threshold_year)
+    bulk_validate(MetroArea, 'valid', averages, threshold_count)
+
+
+def validate_non_msas():
+    """Validate every state's non-MSA area; see State.validate_non_msas."""
+    (threshold_count,
+     threshold_year) = MortgageDataConstant.get_thresholds()
+    averages = get_monthly_averages(
+        NonMSAMortgageData, 'state', threshold_year)
+    bulk_validate(
+        State, 'non_msa_valid', averages, threshold_count,
+        eligible=lambda state: bool(state.non_msa_counties))
+
+
 def validate_counties():
-    for each in County.objects.all():
-        each.validate()
+    """Validate every county at once; see County.validate."""
+    (threshold_count,
+     threshold_year) = MortgageDataConstant.get_thresholds()
+    averages = get_monthly_averages(
+        CountyMortgageData, 'county', threshold_year)
+    bulk_validate(County, 'valid', averages, threshold_count)
     total = County.objects.count()
     valid = County.objects.filter(valid=True).count()
     if total != 0:
@@ -0,0 +1,240 @@
+import logging
+import math
+from array import array
+
+from data_research.models import (
+    County, CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
+    NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
+)
+
+
+logger = logging.getLogger(__name__)
+
+COUNT_FIELDS = ['total', 'current', 'thirty', 'sixty', 'ninety', 'other']
+MISSING = -1  # stands in for a null count
+TABLES = {
+    'county': CountyMortgageData,
+    'msa': MSAMortgageData,
+    'state': StateMortgageData,
+    'non_msa': NonMSAMortgageData,
+    'national': NationalMortgageData,
+}
+
+
+class GeoTable(object):
+    """
+    Mortgage counts for one geo type, stored as flat typed arrays.
+
+    Values for a geography and date live at position
+    `geo_index * len(dates) + date_index`. Delinquency percentages are
+    computed once, when the table is built.
+    """
+    def __init__(self, fips_list, date_index, rows):
+        self.index = {fips: i for i, fips in enumerate(fips_list)}
+        self.date_count = len(date_index)
+        size = len(fips_list) * self.date_count
+        self.present = bytearray(size)
+        self.counts = {
+            field: array('i', [MISSING]) * size for field in COUNT_FIELDS}
+        for row in rows:
+            position = self.position(row[0], date_index[row[1]])
+            self.present[position] = 1
+            for field, value in zip(COUNT_FIELDS, row[2:]):
+                if value is not None:
+                    self.counts[field][position] = value
+        self.percent_90 = array('d', [math.nan]) * size
+        self.percent_30_60 = array('d', [math.nan]) * size
+        total = self.counts['total']
+        thirty = self.counts['thirty']
+        sixty = self.counts['sixty']
+        ninety = self.counts['ninety']
+        for i in range(size):
+            if not self.present[i] or total[i] == MISSING:
+                continue
+            if total[i] == 0:
+                self.percent_90[i] = 0
+                self.percent_30_60[i] = 0
+                continue
+            if ninety[i] != MISSING:
+                self.percent_90[i] = ninety[i] * 1.0 / total[i]
+            if thirty[i] != MISSING and sixty[i] != MISSING:
+                self.percent_30_60[i] = (
+                    (thirty[i] + sixty[i]) * 1.0 / total[i])
+
+    def position(self, fips, date_index):
+        return self.index[fips] * self.date_count + date_index
+
+    def has(self, fips):
+        return fips in self.index
+
+    def value(self, position, days_late):
+        if days_late == '30-89':
+            value = self.percent_30_60[position]
+        else:
+            value = self.percent_90[position]
+        return None if math.isnan(value) else value
+
+
+class MortgageStore(object):
+    """
+    An in-memory, column-oriented copy of the mortgage performance data.
+
+    The store answers the two questions the charts ask -- one geography
+    across all dates, or all geographies for one date -- without touching
+    the database, and builds the same payloads as the API views.
+
+    Loading reads every mortgage table into memory, so the store is only
+    built offline, by publish_mortgage_payloads; web requests that miss
+    the published payloads query the database for their one payload.
+    """
+    def __init__(self, dates, tables, counties, metros, states,
+                 reference_lists, version=None):
+        self.dates = dates
+        self.date_index = {date: i for i, date in enumerate(dates)}
+        self.epochs = [int(date.strftime('%s')) * 1000 for date in dates]
+        self.tables = tables
+        self.counties = counties
+        self.metros = metros
+        self.states = states
+        self.reference_lists = reference_lists
+        self.version = version
+
+    @classmethod
+    def load(cls, version=None):
+        dates = set()
+        for model in TABLES.values():
+            dates.update(model.objects.values_list('date', flat=True))
+        dates = sorted(dates)
+        date_index = {date: i for i, date in enumerate(dates)}
+        tables = {}
+        for name, model in TABLES.items():
+            fips_list = sorted(set(
+                model.objects.values_list('fips', flat=True)))
+            rows = model.objects.values_list(
+                'fips', 'date', *COUNT_FIELDS).iterator()
+            tables[name] = GeoTable(fips_list, date_index, rows)
+        counties = {
+            fips: (name, abbr, valid) for fips, name, abbr, valid
+            in County.objects.values_list(
+                'fips', 'name', 'state__abbr', 'valid')}
+        metros = {
+            fips: (name, valid) for fips, name, valid
+            in MetroArea.objects.values_list('fips', 'name', 'valid')}
+        states = {
+            fips: (name, non_msa_valid) for fips, name, non_msa_valid
+            in State.objects.values_list('fips', 'name', 'non_msa_valid')}
+        reference_lists = {
+            obj.name: obj.json_value for obj
+            in MortgageMetaData.objects.filter(
+                name__in=['allowlist', 'msa_fips', 'sampling_dates'])}
+        logger.info("Loaded mortgage store with {} dates".format(len(dates)))
+        return cls(dates, tables, counties, metros, states, reference_lists,
+                   version=version)
+
+    def series(self, table_name, fips, days_late):
+        """Return time-series points for one geography across all dates."""
+        table = self.tables[table_name]
+        if not table.has(fips):
+            return []
+        start = table.position(fips, 0)
+        return [
+            {'date': self.epochs[i],
+             'value': table.value(start + i, days_late)}
+            for i in range(table.date_count) if table.present[start + i]
+        ]
+
+    def national_time_series(self, days_late):
+        return {'meta': {'name': 'United States',
+                         'fips_type': 'national'},
+                'data': self.series('national', '-----', days_late)}
+
+    def geo_time_series(self, days_late, fips):
+        """Build the same payload as data_research.views.geo_time_series."""
+        reference_lists = self.reference_lists
+        if fips not in reference_lists['allowlist']:
+            return "FIPS code not found or not valid."
+        if len(fips) == 2:
+            if fips not in self.states:
+                raise State.DoesNotExist(fips)
+            return {'meta': {'fips': fips,
+                             'name': self.states[fips][0],
+                             'fips_type': 'state'},
+                    'data': self.series('state', fips, days_late)}
+        if 'non' in fips:
+            if (not self.tables['non_msa'].has(fips)
+                    or fips[:2] not in self.states):
+                raise NonMSAMortgageData.DoesNotExist(fips)
+            return {'meta': {'fips': fips,
+                             'name': "Non-metro area of {}".format(
+                                 self.states[fips[:2]][0]),
+                             'fips_type': 'non_msa'},
+                    'data': self.series('non_msa', fips, days_late)}
+        if fips in reference_lists['msa_fips']:
+            if fips not in self.metros or not self.metros[fips][1]:
+                raise MetroArea.DoesNotExist(fips)
+            return {'meta': {'fips': fips,
+                             'name': self.metros[fips][0],
+                             'fips_type': 'msa'},
+                    'data': self.series('msa', fips, days_late)}
+        if fips not in self.counties or not self.counties[fips][2]:
+            return "County is below display threshold."
+        name, abbr, valid = self.counties[fips]
+        return {'meta': {'fips': fips,
+                         'name': "{}, {}".format(name, abbr),
+                         'fips_type': 'county'},
+                'data': self.series('county', fips, days_late)}
+
+    def snapshot(self, table_name, date, days_late):
+        """Return (fips, value) pairs for every geography on one date."""
+        table = self.tables[table_name]
+        date_index = self.date_index.get(date)
+        if date_index is None:
+            return []
+        pairs = []
+        for fips, i in table.index.items():
+            position = i * table.date_count + date_index
+            if table.present[position]:
+                pairs.append((fips, table.value(position, days_late)))
+        return pairs
+
+    def map_data(self, days_late, geo, date):
+        """Build the same payload as data_research.views.map_data."""
+        national = dict(self.snapshot('national', date, days_late))
+        if '-----' not in national:
+            raise NationalMortgageData.DoesNotExist(date)
+        if geo == 'national':
+            return {'meta': {'fips_type': 'nation',
+                             'date': '{}'.format(date)},
+                    'data': {'value': national['-----'],
+                             'name': 'United States'}}
+        geo_types = {'states': ('state', 'state'),
+                     'counties': ('county', 'county'),
+                     'metros': ('msa', 'msa')}
+        if geo not in geo_types:
+            return "Unkown geographic unit"
+        table_name, fips_type = geo_types[geo]
+        payload = {'meta': {'fips_type': fips_type,
+                            'date': '{}'.format(date),
+                            'national_average': national['-----']},
+                   'data': {}}
+        for fips, value in self.snapshot(table_name, date, days_late):
+            if geo == 'counties':
+                if fips not in self.counties or not self.counties[fips][2]:
+                    continue
+                name = "{}, {}".format(*self.counties[fips][:2])
+            elif geo == 'states':
+                name = self.states[fips][0]
+            else:
+                name, valid = self.metros[fips]
+                if not valid:
+                    value = None
+            payload['data'][fips] = {'value': value, 'name': name}
+        if geo == 'metros':
+            for fips, value in self.snapshot('non_msa', date, days_late):
+                state_name, non_msa_valid = self.states[fips[:2]]
+                if non_msa_valid is False:
+                    value = None
+                payload['data'][fips] = {
+                    'value': value,
+                    'name': "Non-metro area of {}".format(state_name)}
+        return payload
@@ -0,0 +1,157 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = 'mortgage_payloads_version'
+CURRENT_FILE = 'CURRENT'
+# Re-check the CURRENT pointer periodically in case the cache isn't shared.
+# Other processes may keep serving a replaced version for this long.
+VERSION_TIMEOUT = 60
+
+
+def payload_root():
+    return settings.MORTGAGE_PAYLOAD_ROOT
+
+
+def payload_path(version, kind, *args):
+    """Build the on-disk artifact path for one pre-rendered API payload."""
+    return os.path.join(
+        payload_root(), version, kind, *args[:-1], '{}.json'.format(args[-1]))
+
+
+def current_path():
+    return os.path.join(payload_root(), CURRENT_FILE)
+
+
+def read_current_file():
+    if not payload_root():
+        return None
+    try:
+        with open(current_path()) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def get_current_version():
+    """
+    Return the published payload version, or None if there isn't one.
+
+    A version is a dict holding a `version` slug and a `published` ISO
+    timestamp. It's kept in the Django cache and backed by a CURRENT file
+    in the artifact store, so every process sees the same version.
+    """
+    current = cache.get(VERSION_CACHE_KEY)
+    if current is not None:
+        return current
+    current = read_current_file()
+    if current is None:
+        return None
+    cache.set(VERSION_CACHE_KEY, current, VERSION_TIMEOUT)
+    return current
+
+
+def get_payload(kind, *args):
+    """
+    Return a pre-rendered payload for the current version, or None.
+
+    Payloads are read from the on-disk artifact store. They aren't put in
+    the Django cache, where thousands of them would evict unrelated entries.
+    """
+    current = get_current_version()
+    if current is None:
+        return None
+    try:
+        with open(payload_path(current['version'], kind, *args)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def payload_etag(request, *args, **kwargs):
+    """ETag for an API response, derived from the version and URL path."""
+    current = get_current_version()
+    if current is None:
+        return None
+    return hashlib.md5(
+        '{}:{}'.format(current['version'], request.path).encode('utf-8')
+    ).hexdigest()
+
+
+def payload_last_modified(request, *args, **kwargs):
+    """Last-Modified for an API response: when its version was published."""
+    current = get_current_version()
+    if current is None:
+        return None
+    return datetime.datetime.strptime(
+        current['published'], '%Y-%m-%dT%H:%M:%S')
+
+
+def write_payload(version, kind, args, payload):
+    path = payload_path(version, kind, *args)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(payload, f)
+
+
+def publish_payloads(payloads):
+    """
+    Store a new set of payloads and make them current in one step.
+
+    `payloads` is an iterable of (kind, args, payload) tuples. Payloads are
+    written under a new version before the CURRENT pointer is swapped, so
+    readers never see a mix of old and new data. Raises
+    ImproperlyConfigured if MORTGAGE_PAYLOAD_ROOT isn't set.
+
+    Other processes may still use the previous pointer for VERSION_TIMEOUT
+    seconds, so the previous version is kept. Older versions are removed,
+    unless the previous swap happened less than VERSION_TIMEOUT ago; they
+    are then left for the next publish to remove.
+    """
+    if not payload_root():
+        raise ImproperlyConfigured(
+            'MORTGAGE_PAYLOAD_ROOT must be set to a directory shared with '
+            'the web servers to publish mortgage payloads.'
+        )
+    published = datetime.datetime.utcnow().replace(microsecond=0)
+    version = published.strftime('%Y%m%d%H%M%S')
+    os.makedirs(payload_root(), exist_ok=True)
+    count = 0
+    for kind, args, payload in payloads:
+        write_payload(version, kind, args, payload)
+        count += 1
+
+    previous = read_current_file()
+    keep = {version}
+    prune = True
+    if previous is not None:
+        keep.add(previous['version'])
+        previous_swap = os.path.getmtime(current_path())
+        prune = time.time() - previous_swap >= VERSION_TIMEOUT
+
+    current = {'version': version, 'published': published.isoformat()}
+    tmp_path = os.path.join(payload_root(), '{}.tmp'.format(CURRENT_FILE))
+    with open(tmp_path, 'w') as f:
+        json.dump(current, f)
+    os.replace(tmp_path, current_path())
+    cache.set(VERSION_CACHE_KEY, current, VERSION_TIMEOUT)
+
+    if prune:
+        for entry in os.listdir(payload_root()):
+            entry_path = os.path.join(payload_root(), entry)
+            if entry not in keep and os.path.isdir(entry_path):
+                shutil.rmtree(entry_path)
+    logger.info("Published {} mortgage payloads as version {}".format(
+        count, version))
+    return current
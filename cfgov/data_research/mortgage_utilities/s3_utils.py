@@ -25,11 +25,36 @@ def read_in_s3_csv(url):
     return reader
 
 
+def stream_s3_csv(url):
+    """
+    Return a DictReader that consumes a remote CSV as it downloads.
+
+    Unlike read_in_s3_csv, the response body is never held in memory all at
+    once, so this is suitable for very large source files.
+    """
+    response = requests.get(url, stream=True)
+    response.encoding = 'utf-8'
+    lines = response.iter_lines(decode_unicode=True)
+    return csv.DictReader(lines)
+
+
+def download_s3_file(url, file_obj, chunk_size=1024 * 1024):
+    """Stream a remote file into a binary file object, chunk by chunk."""
+    response = requests.get(url, stream=True)
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        file_obj.write(chunk)
+    file_obj.seek(0)
+    return file_obj
+
+
 def bake_csv_to_s3(slug, csv_file_obj, sub_bucket=None):
     """A utility for posting CSV files to a cfgov.files sub_bucket.
 
     Uses the value of settings.AWS_STORAGE_BUCKET_NAME as the destination S3
     bucket. If sub_bucket is not provided, defaults to 'data'.
+
+    csv_file_obj must be a binary file object. Large files are sent as a
+    multipart upload, so they never need to be read into memory whole.
     """
     expire_date = datetime.datetime.utcnow() + datetime.timedelta(days=365)
     expires = expire_date.strftime("%a, %d %b %Y %H:%M:%S GMT")
@@ -41,12 +66,14 @@ def bake_csv_to_s3(slug, csv_file_obj, sub_bucket=None):
     csv_file_obj.seek(0)
 
     s3 = boto3.client('s3')
-    s3.put_object(
-        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-        Key='{}/{}.csv'.format(sub_bucket, slug),
-        ACL='public-read',
-        ContentType='text/csv',
-        Body=csv_file_obj,
-        CacheControl='max-age=2592000,public',
-        Expires=expires
+    s3.upload_fileobj(
+        csv_file_obj,
+        settings.AWS_STORAGE_BUCKET_NAME,
+        '{}/{}.csv'.format(sub_bucket, slug),
+        ExtraArgs={
+            'ACL': 'public-read',
+            'ContentType': 'text/csv',
+            'CacheControl': 'max-age=2592000,public',
+            'Expires': expires,
+        }
     )
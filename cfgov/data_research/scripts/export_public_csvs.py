@@ -1,14 +1,20 @@
 import csv
 import datetime
 import logging
-from io import StringIO
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import TextIOWrapper
+from itertools import groupby
+from tempfile import SpooledTemporaryFile
+
+from django.db import connections
 
 from dateutil import parser
 
 from core.utils import format_file_size
 from data_research.models import (
-    County, CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
-    NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
+    CountyMortgageData, MortgageMetaData, MSAMortgageData,
+    NationalMortgageData, NonMSAMortgageData, StateMortgageData
 )
 from data_research.mortgage_utilities.fips_meta import FIPS, load_fips_meta
 from data_research.mortgage_utilities.s3_utils import (
@@ -18,6 +24,10 @@ from data_research.mortgage_utilities.s3_utils import (
 
 NATION_QUERYSET = NationalMortgageData.objects.all()
 STATES_TO_IGNORE = ['72']  # Excluding Puerto Rico from project launch
+# CSVs larger than this are spooled to disk rather than held in memory.
+SPOOL_MAX_SIZE = 10 * 1024 * 1024
+# Exports run concurrently, but share the download_files metadata record.
+METADATA_LOCK = threading.Lock()
 
 
 NATION_STARTER = {
@@ -103,6 +113,21 @@ def fill_nation_row_date_values(date_set):
                     round_pct(getattr(nation_obj, key)))
 
 
+def pivot_rows(geo_type, queryset, late_value):
+    """
+    Yield one CSV row per FIPS code from a queryset ordered by FIPS and date.
+
+    A row is emitted each time the FIPS code changes, so the whole geo type
+    is exported from a single query.
+    """
+    for fips, records in groupby(queryset.iterator(), lambda r: r.fips):
+        first = next(records)
+        yield (row_starter(geo_type, first)
+               + [round_pct(getattr(first, late_value))]
+               + [round_pct(getattr(record, late_value))
+                  for record in records])
+
+
 def export_downloadable_csv(geo_type, late_value):
     """
     Export a dataset to S3 as a UTF-8 CSV file.
@@ -126,67 +151,64 @@ def export_downloadable_csv(geo_type, late_value):
     geo_dict = {
         'County': {
             'queryset': CountyMortgageData.objects.filter(
-                county__valid=True),
+                county__valid=True).select_related('county__state'),
             'headings': ['RegionType', 'State', 'Name', 'FIPSCode'],
-            'fips_list': sorted(
-                [county.fips for county in County.objects.filter(valid=True)])
         },
         'MetroArea': {
-            'queryset': MSAMortgageData.objects.filter(msa__valid=True),
+            'queryset': MSAMortgageData.objects.filter(
+                msa__valid=True).select_related('msa'),
             'headings': ['RegionType', 'Name', 'CBSACode'],
-            'fips_list': sorted(
-                [metro.fips for metro in MetroArea.objects.filter(valid=True)])
         },
         'NonMetroArea': {
             'queryset': NonMSAMortgageData.objects.filter(
-                state__non_msa_valid=True),
+                state__non_msa_valid=True).select_related('state'),
             'headings': ['RegionType', 'Name', 'CBSACode'],
-            'fips_list': sorted(
-                ["{}-non".format(state.fips) for state
-                 in State.objects.filter(non_msa_valid=True)])
         },
         'State': {
-            'queryset': StateMortgageData.objects.all(),
+            'queryset': StateMortgageData.objects.exclude(
+                fips__in=STATES_TO_IGNORE).select_related('state'),
             'headings': ['RegionType', 'Name', 'FIPSCode'],
-            'fips_list': sorted(
-                [state.fips for state in State.objects.exclude(
-                    fips__in=STATES_TO_IGNORE)])
         },
     }
     slug = "{}Mortgages{}DaysLate-thru-{}".format(
         geo_type, LATE_VALUE_TITLE[late_value], thru_month)
     _map = geo_dict.get(geo_type)
-    fips_list = _map['fips_list']
-    csvfile = StringIO()
-    writer = csv.writer(csvfile)
+    csvfile = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    text_file = TextIOWrapper(csvfile, encoding='utf-8', newline='')
+    writer = csv.writer(text_file)
     writer.writerow(_map['headings'] + date_list)
     nation_starter = [NATION_STARTER[heading]
                       for heading in _map['headings']]
     nation_ender = FIPS.nation_row[late_value]
     writer.writerow(nation_starter + nation_ender)
-    for fips in fips_list:
-        records = _map['queryset'].filter(fips=fips)
-        record_starter = row_starter(geo_type, records.first())
-        record_ender = [round_pct(getattr(record, late_value))
-                        for record in records]
-        writer.writerow(record_starter + record_ender)
+    writer.writerows(pivot_rows(
+        geo_type, _map['queryset'].order_by('fips', 'date'), late_value))
     if geo_type == 'MetroArea':
         non_map = geo_dict['NonMetroArea']
-        for fips in non_map['fips_list']:
-            records = non_map['queryset'].filter(fips=fips)
-            record_starter = row_starter('NonMetroArea', records.first())
-            record_ender = [round_pct(getattr(record, late_value))
-                            for record in records]
-            writer.writerow(record_starter + record_ender)
+        writer.writerows(pivot_rows(
+            'NonMetroArea',
+            non_map['queryset'].order_by('fips', 'date'),
+            late_value))
+    text_file.flush()
+    text_file.detach()
+    bytecount = csvfile.tell()
     bake_csv_to_s3(
         slug,
         csvfile,
         sub_bucket="{}/downloads".format(MORTGAGE_SUB_BUCKET))
+    csvfile.close()
     logger.info("Baked {} to S3".format(slug))
-    csvfile.seek(0, 2)
-    bytecount = csvfile.tell()
     csv_size = format_file_size(bytecount)
-    save_metadata(csv_size, slug, thru_month, late_value, geo_type)
+    with METADATA_LOCK:
+        save_metadata(csv_size, slug, thru_month, late_value, geo_type)
+
+
+def export_in_thread(geo_type, late_value):
+    """Export one CSV, then release this thread's database connection."""
+    try:
+        export_downloadable_csv(geo_type, late_value)
+    finally:
+        connections.close_all()
 
 
 def run(prep_only=False):
@@ -196,8 +218,16 @@ def run(prep_only=False):
 
     if prep_only is False:
         logger.info('Exporting public CSVs to S3 ...')
-        for geo in ['County', 'MetroArea', 'State']:
-            export_downloadable_csv(geo, 'percent_30_60')
-            logger.info('Exported 30-89-day {} CSV'.format(geo))
-            export_downloadable_csv(geo, 'percent_90')
-            logger.info('Exported 90-day {} CSV'.format(geo))
+        exports = [(geo, late_value)
+                   for geo in ['County', 'MetroArea', 'State']
+                   for late_value in ['percent_30_60', 'percent_90']]
+        with ThreadPoolExecutor(max_workers=len(exports)) as executor:
+            futures = {
+                executor.submit(export_in_thread, geo, late_value):
+                (geo, late_value)
+                for geo, late_value in exports}
+            for future in as_completed(futures):
+                geo, late_value = futures[future]
+                future.result()
+                logger.info('Exported {} {} CSV'.format(
+                    LATE_VALUE_TITLE[late_value], geo))
@@ -1,25 +1,39 @@
 import datetime
 import logging
 import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+from django.db import connections
 
 from dateutil import parser
 
 from data_research.models import (
     CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
     NationalMortgageData, NonMSAMortgageData, State, StateMortgageData,
-    validate_counties
+    validate_counties, validate_metro_areas, validate_non_msas
 )
 
 
 logger = logging.getLogger(__name__)
 script = os.path.basename(__file__)
 
+AGGREGATE_CLASSES = [
+    NationalMortgageData,
+    StateMortgageData,
+    MSAMortgageData,
+    NonMSAMortgageData,
+]
+COUNT_FIELDS = ['total', 'current', 'thirty', 'sixty', 'ninety', 'other']
+NATIONAL_FIPS = '-----'
+
 
 def update_sampling_dates():
     """
     Update our metadata list of sampling dates.
     """
-    dates = sorted(set([obj.date for obj in CountyMortgageData.objects.all()]))
+    dates = CountyMortgageData.objects.order_by('date').values_list(
+        'date', flat=True).distinct()
     date_list = ["{}".format(date) for date in dates]
     date_list_obj, cr = MortgageMetaData.objects.get_or_create(
         name='sampling_dates')
@@ -36,23 +50,26 @@ def merge_the_dades():
     Miami-Dade (12086) in the 1990s, we need to combine values for these two
     codes when mortgages assigned to the old FIPS show up in our base data.
 
-    This routine adds values from a 12025 record to the current Miami-Dade
-    record and deletes the outdated record so that the operation can't repeat.
+    This routine adds values from 12025 records to the current Miami-Dade
+    records and deletes the outdated records so that the operation can't
+    repeat. All merged records are written with one bulk_update, and all
+    outdated records are removed with one delete.
     """
-    fields = ['total', 'current', 'thirty', 'sixty', 'ninety', 'other']
     dade = CountyMortgageData.objects.filter(fips='12025')
-    miami_dade = CountyMortgageData.objects.filter(fips='12086')
+    miami_dade = {
+        record.date: record for record
+        in CountyMortgageData.objects.filter(
+            fips='12086', date__in=dade.values('date'))}
     for old_dade in dade:
-        try:
-            new_dade = miami_dade.get(date=old_dade.date)
-        except CountyMortgageData.DoesNotExist:
-            old_dade.delete()
-        else:
-            for field in fields:
-                setattr(new_dade, field, (getattr(old_dade, field) +
-                                          getattr(new_dade, field)))
-            new_dade.save()  # this will recalculate the record's percentages
-            old_dade.delete()
+        new_dade = miami_dade.get(old_dade.date)
+        if new_dade is None:
+            continue
+        for field in COUNT_FIELDS:
+            setattr(new_dade, field, (getattr(old_dade, field) +
+                                      getattr(new_dade, field)))
+    CountyMortgageData.objects.bulk_update(
+        list(miami_dade.values()), COUNT_FIELDS, batch_size=1000)
+    dade.delete()
     logger.info("\nDade and Miami-Dade values merged.")
 
 
@@ -90,37 +107,256 @@ def load_national_values(date):
     record.aggregate_data()
 
 
-def run():
+def delete_aggregates(dates=None):
+    """Delete aggregate records, optionally only those for given dates."""
+    for cls in AGGREGATE_CLASSES:
+        records = cls.objects.all()
+        if dates is not None:
+            records = records.filter(date__in=dates)
+        records.delete()
+
+
+def load_values_by_date(dates):
+    """Aggregate every geography one date and one record at a time."""
+    for date in dates:
+        logger.info(
+            "Aggregating data for {}".format(date))
+        load_msa_values(date)
+        load_state_values(date)
+        load_non_msa_state_values(date)
+        load_national_values(date)
+
+
+def build_date_records(date):
+    """
+    Compute, without saving, every aggregate record for one date.
+
+    Records are returned in the order load_values_by_date would create
+    them: MSAs, states, non-MSA areas, then the national record.
+    """
+    msa_records = [
+        MSAMortgageData(date=date, msa=metro, fips=metro.fips)
+        for metro in MetroArea.objects.all()]
+    states = State.objects.all()
+    state_records = [
+        StateMortgageData(date=date, state=state, fips=state.fips)
+        for state in states]
+    non_msa_records = [
+        NonMSAMortgageData(
+            date=date, state=state, fips='{}-non'.format(state.fips))
+        for state in states]
+    for record in msa_records + state_records + non_msa_records:
+        record.aggregate_data(commit=False)
+    national = NationalMortgageData(date=date, fips=NATIONAL_FIPS)
+    national.aggregate_data(commit=False, state_records=state_records)
+    return msa_records + state_records + non_msa_records + [national]
+
+
+def load_values_in_parallel(dates, workers):
+    """
+    Fan dates out across a pool of worker processes.
+
+    Each worker opens its own database connection and returns unsaved
+    records for one date. Results are collected in date order and written
+    from this process, so row order doesn't depend on worker scheduling.
+    """
+    if workers > 1:
+        # Child processes must not share the parent's open connections.
+        connections.close_all()
+        pool = Pool(workers)
+        results = pool.imap(build_date_records, dates)
+    else:
+        pool = None
+        results = map(build_date_records, dates)
+    try:
+        for date, records in zip(dates, results):
+            logger.info("Saving aggregate data for {}".format(date))
+            by_class = defaultdict(list)
+            for record in records:
+                by_class[type(record)].append(record)
+            for cls in by_class:
+                cls.objects.bulk_create(by_class[cls])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def unique(fips_list):
+    """Return a list's distinct values, in order of first appearance."""
+    return list(dict.fromkeys(fips_list or []))
+
+
+def get_county_memberships():
+    """
+    Map each county FIPS code to the aggregate geographies that include it.
+
+    Memberships are derived from the `counties` and `non_msa_counties`
+    fields of MetroArea and State. Each aggregate is identified by a
+    (model, geo_id, fips) key, where geo_id is the pk of the MetroArea or
+    State the aggregate belongs to. A county listed twice for a geography
+    is only counted once, as in the per-record path's `fips__in` query.
+    """
+    memberships = defaultdict(list)
+    aggregate_keys = []
+    for metro in MetroArea.objects.all():
+        key = (MSAMortgageData, metro.pk, metro.fips)
+        aggregate_keys.append((key, bool(metro.counties)))
+        for fips in unique(metro.counties):
+            memberships[fips].append(key)
+    for state in State.objects.all():
+        state_key = (StateMortgageData, state.pk, state.fips)
+        aggregate_keys.append((state_key, bool(state.counties)))
+        for fips in unique(state.counties):
+            memberships[fips].append(state_key)
+        non_msa_key = (
+            NonMSAMortgageData, state.pk, '{}-non'.format(state.fips))
+        # Empty non-MSA aggregates are stored as zeros, not nulls.
+        aggregate_keys.append((non_msa_key, True))
+        for fips in unique(state.non_msa_counties):
+            memberships[fips].append(non_msa_key)
+    return memberships, aggregate_keys
+
+
+def make_aggregate(cls, geo_id, fips, date, counts):
+    record = cls(fips=fips, date=date, **dict(zip(COUNT_FIELDS, counts)))
+    if cls is MSAMortgageData:
+        record.msa_id = geo_id
+    elif geo_id is not None:
+        record.state_id = geo_id
+    return record
+
+
+def load_values_in_bulk(dates):
+    """
+    Aggregate every geography for every date in a single pass.
+
+    County records are read once and summed into each geography they belong
+    to, and the resulting MSA, state, non-MSA and national records are
+    written with one bulk_create per model. Values match those produced
+    by load_values_by_date.
+    """
+    dates = set(dates)
+    memberships, aggregate_keys = get_county_memberships()
+    sums = defaultdict(lambda: [0] * len(COUNT_FIELDS))
+    county_rows = CountyMortgageData.objects.filter(
+        date__in=dates).values_list('fips', 'date', *COUNT_FIELDS)
+    for row in county_rows.iterator():
+        fips, date, counts = row[0], row[1], row[2:]
+        for key in memberships.get(fips, []):
+            total = sums[(key, date)]
+            for i, value in enumerate(counts):
+                total[i] += value or 0
+
+    new_records = defaultdict(list)
+    for date in sorted(dates):
+        national = [0] * len(COUNT_FIELDS)
+        for key, has_counties in aggregate_keys:
+            cls, geo_id, fips = key
+            if not has_counties:
+                counts = [None] * len(COUNT_FIELDS)
+            else:
+                counts = sums.get((key, date), [0] * len(COUNT_FIELDS))
+            if cls is StateMortgageData and has_counties:
+                national = [a + b for a, b in zip(national, counts)]
+            new_records[cls].append(
+                make_aggregate(cls, geo_id, fips, date, counts))
+        new_records[NationalMortgageData].append(
+            make_aggregate(
+                NationalMortgageData, None, NATIONAL_FIPS, date, national))
+    for cls in AGGREGATE_CLASSES:
+        cls.objects.bulk_create(new_records[cls], batch_size=5000)
+
+
+def snapshot_aggregates(dates=None):
+    snapshot = {}
+    for cls in AGGREGATE_CLASSES:
+        records = cls.objects.all()
+        if dates is not None:
+            records = records.filter(date__in=dates)
+        snapshot[cls.__name__] = set(
+            records.values_list('fips', 'date', *COUNT_FIELDS))
+    return snapshot
+
+
+def compare_load_modes(dates):
+    """
+    Time the per-record and bulk aggregation paths against the same data.
+
+    Both paths rebuild the aggregates for `dates` from scratch, leaving
+    other dates alone; the report logs how long each took and whether they
+    produced identical records.
+    """
+    timings = {}
+    snapshots = {}
+    for mode, loader in [('by-date', load_values_by_date),
+                         ('bulk', load_values_in_bulk)]:
+        delete_aggregates(dates=dates)
+        starter = datetime.datetime.now()
+        loader(dates)
+        timings[mode] = datetime.datetime.now() - starter
+        snapshots[mode] = snapshot_aggregates(dates=dates)
+    for mode in timings:
+        logger.info("{} aggregation took {}".format(mode, timings[mode]))
+    mismatches = [
+        name for name in snapshots['bulk']
+        if snapshots['bulk'][name] != snapshots['by-date'][name]
+    ]
+    if mismatches:
+        logger.warning(
+            "Aggregation modes disagree for {}".format(
+                ', '.join(sorted(mismatches))))
+    else:
+        logger.info("Aggregation modes produced identical records.")
+    return timings, mismatches
+
+
+def run(*args, dates=None):
     """
     This script should be run following a refresh of county mortgage data.
 
     The script wipes national, state and metro-based aggregate records,
     creates new ones for every date in range, and then updates metadata.
+
+    By default, records are aggregated one date and one geography at a time.
+    Pass 'bulk' to aggregate all dates in a single pass, or 'compare' to run
+    both paths and log how long each took:
+    `manage.py runscript load_mortgage_aggregates --script-args bulk`
+
+    Pass 'workers=N' to spread the per-date work across N processes:
+    `manage.py runscript load_mortgage_aggregates --script-args workers=8`
+
+    If a list of `dates` is passed, as process_mortgage_data does for an
+    incremental refresh, only aggregates for those dates are replaced.
     """
+    workers = 1
+    for arg in args:
+        if arg.startswith('workers='):
+            workers = int(arg.split('=', 1)[1])
     starter = datetime.datetime.now()
-    aggregate_classes = [
-        NationalMortgageData,
-        StateMortgageData,
-        MSAMortgageData,
-        NonMSAMortgageData]
-    for cls in aggregate_classes:
-        cls.objects.all().delete()
+    delete_aggregates(dates=dates)
     update_sampling_dates()
     merge_the_dades()
     validate_counties()
-    dates = MortgageMetaData.objects.get(name='sampling_dates').json_value
-    for date_string in dates:
-        date = parser.parse(date_string).date()
-        logger.info(
-            "Aggregating data for {}".format(date))
-        load_msa_values(date)
-        load_state_values(date)
-        load_non_msa_state_values(date)
-        load_national_values(date)
+    sampling_dates = [
+        parser.parse(date_string).date() for date_string
+        in MortgageMetaData.objects.get(name='sampling_dates').json_value]
+    if dates is None:
+        dates = sampling_dates
+    else:
+        # Dates dropped from the source have no aggregates to rebuild.
+        dates = sorted(set(dates) & set(sampling_dates))
+        logger.info("Re-aggregating {} changed dates".format(len(dates)))
+    if 'compare' in args:
+        compare_load_modes(dates)
+    elif 'bulk' in args:
+        load_values_in_bulk(dates)
+    elif workers > 1:
+        load_values_in_parallel(dates, workers)
+    else:
+        load_values_by_date(dates)
     logger.info("Validating MSAs and non-MSAs")
-    for metro in MetroArea.objects.all():
-        metro.validate()
-    for state in State.objects.all():
-        state.validate_non_msas()
+    validate_metro_areas()
+    validate_non_msas()
     logger.info("{} took {} to run.".format(
         script, (datetime.datetime.now() - starter)))
@@ -1,24 +1,35 @@
 import csv
 import datetime
+import hashlib
 import logging
 import os
 import sys
-from io import StringIO
+from functools import lru_cache
+from io import StringIO, TextIOWrapper
+from itertools import islice
+from tempfile import TemporaryFile
+
+from django.db.models import Max
 
 from dateutil import parser
 
 from data_research.models import (
-    County, CountyMortgageData, MortgageDataConstant
+    County, CountyMortgageData, MortgageDataConstant, MortgageMetaData
+)
+from data_research.mortgage_utilities.fips_meta import (
+    SOURCE_HEADINGS, validate_fips
 )
-from data_research.mortgage_utilities.fips_meta import validate_fips
 from data_research.mortgage_utilities.s3_utils import (
-    S3_SOURCE_BUCKET, S3_SOURCE_FILE, read_in_s3_csv
+    S3_SOURCE_BUCKET, S3_SOURCE_FILE, download_s3_file, stream_s3_csv
 )
 from data_research.scripts import (
-    export_public_csvs, load_mortgage_aggregates, update_county_msa_meta
+    export_public_csvs, load_mortgage_aggregates, publish_mortgage_payloads,
+    update_county_msa_meta
 )
 
 
+BATCH_SIZE = 10000
+HASH_MODULUS = 2 ** 128
 DEFAULT_DUMP_SLUG = '/tmp/mp_countydata'
 DATAFILE = StringIO()
 SCRIPT_NAME = os.path.basename(__file__).split('.')[0]
@@ -45,8 +56,153 @@ def dump_as_csv(rows_out, dump_slug):
             writer.writerow(row)
 
 
+@lru_cache(maxsize=None)
+def parse_sampling_date(date_string):
+    """
+    Parse a source date string, such as '01/01/08', into a date.
+
+    The source file repeats a few hundred distinct dates millions of times,
+    so results are memoized rather than re-parsed for every row.
+    """
+    return parser.parse(date_string).date()
+
+
+def row_digest(row):
+    """Return an integer hash of one source row's values."""
+    values = ','.join(row.get(field) or '' for field in SOURCE_HEADINGS)
+    return int(hashlib.md5(values.encode('utf-8')).hexdigest(), 16)
+
+
+def hash_partitions(raw_data, starting_date, through_date, hashes):
+    """
+    Pass source rows through while hashing each in-range date's rows.
+
+    Row hashes are summed, so a date's hash doesn't depend on the order of
+    its rows. Results accumulate in `hashes`, keyed by ISO date string.
+    """
+    for row in raw_data:
+        sampling_date = parse_sampling_date(row.get('date'))
+        if starting_date <= sampling_date <= through_date:
+            key = '{}'.format(sampling_date)
+            hashes[key] = (hashes.get(key, 0) + row_digest(row)) % HASH_MODULUS
+        yield row
+
+
+def get_partition_hashes():
+    """Return stored hashes of the source rows for each loaded date."""
+    try:
+        return MortgageMetaData.objects.get(
+            name='partition_hashes').json_value or {}
+    except MortgageMetaData.DoesNotExist:
+        return {}
+
+
+def save_partition_hashes(hashes):
+    meta, cr = MortgageMetaData.objects.get_or_create(
+        name='partition_hashes')
+    meta.json_value = {
+        date: '{:032x}'.format(value) for date, value in hashes.items()}
+    meta.save()
+
+
+def read_csv_file(file_obj):
+    """Yield dict rows from a binary CSV file object, from its start."""
+    file_obj.seek(0)
+    text_file = TextIOWrapper(file_obj, encoding='utf-8', newline='')
+    try:
+        for row in csv.DictReader(text_file):
+            yield row
+    finally:
+        text_file.detach()
+
+
+def generate_county_records(raw_data, starting_date, through_date, pk=1):
+    """
+    Yield unsaved CountyMortgageData objects for in-range source rows.
+
+    FIPS codes are resolved to counties through a dictionary that is loaded
+    once, rather than with a County query per row. Primary keys are
+    assigned sequentially, starting from `pk`.
+    """
+    county_ids = dict(County.objects.values_list('fips', 'pk'))
+    for row in raw_data:
+        sampling_date = parse_sampling_date(row.get('date'))
+        if sampling_date < starting_date or sampling_date > through_date:
+            continue
+        valid_fips = validate_fips(row.get('fips'))
+        if not valid_fips:
+            continue
+        if valid_fips not in county_ids:
+            raise County.DoesNotExist(
+                "No County found for FIPS {}".format(valid_fips))
+        yield CountyMortgageData(
+            pk=pk,
+            fips=valid_fips,
+            date=sampling_date,
+            total=row.get('open'),
+            current=row.get('current'),
+            thirty=row.get('thirty'),
+            sixty=row.get('sixty'),
+            ninety=row.get('ninety'),
+            other=row.get('other'),
+            county_id=county_ids[valid_fips]
+        )
+        pk += 1
+
+
+def load_county_records(records):
+    """Write records in batches of BATCH_SIZE and return how many."""
+    counter = 0
+    while True:
+        batch = list(islice(records, BATCH_SIZE))
+        if not batch:
+            break
+        CountyMortgageData.objects.bulk_create(batch)
+        counter += len(batch)
+        sys.stdout.write('.')
+        sys.stdout.flush()
+        if counter % 100000 == 0:  # pragma: no cover
+            logger.info("\n{}".format(counter))
+    return counter
+
+
+def load_changed_dates(source_url, starting_date, through_date, hashes):
+    """
+    Reload county records only for dates whose source rows have changed.
+
+    The source is downloaded once to a temporary file and read twice: first
+    to hash each date's rows, then to load rows for dates whose hash differs
+    from the stored one. Records for dates no longer in the source are
+    deleted. Returns the sorted list of dates that were touched.
+    """
+    stored = get_partition_hashes()
+    with TemporaryFile() as source_file:
+        download_s3_file(source_url, source_file)
+        for row in hash_partitions(
+                read_csv_file(source_file),
+                starting_date, through_date, hashes):
+            pass
+        touched = sorted(
+            set(date for date in hashes
+                if stored.get(date) != '{:032x}'.format(hashes[date]))
+            | set(date for date in stored if date not in hashes))
+        logger.info("{} sampling dates are new or changed".format(
+            len(touched)))
+        CountyMortgageData.objects.filter(date__in=touched).delete()
+        touched_set = set(touched)
+        rows = (
+            row for row in read_csv_file(source_file)
+            if '{}'.format(parse_sampling_date(row.get('date'))) in touched_set
+        )
+        next_pk = (CountyMortgageData.objects.aggregate(
+            Max('pk'))['pk__max'] or 0) + 1
+        counter = load_county_records(generate_county_records(
+            rows, starting_date, through_date, pk=next_pk))
+    return [parser.parse(date).date() for date in touched], counter
+
+
 def process_source(
-        starting_date, through_date, dump_slug=None):
+        starting_date, through_date, dump_slug=None, incremental=False):
     """
     Re-generate aggregated data from the latest source CSV posted to S3.
 
@@ -62,65 +218,51 @@ def process_source(
     date,fips,open,current,thirty,sixty,ninety,other
     01/01/08,1001,268,260,4,1,0,3
 
+    The source file is streamed and rows are written in batches of
+    BATCH_SIZE, so memory use stays flat regardless of the file's size.
+
+    A content hash of each sampling date's source rows is stored after every
+    run. If `incremental` is True, only dates whose hash has changed are
+    reloaded, and the list of touched dates is returned; otherwise the table
+    is rebuilt and None is returned.
     """
     starter = datetime.datetime.now()
-    counter = 0
-    pk = 1
-    new_objects = []
-    # truncate table
-    CountyMortgageData.objects.all().delete()
     source_url = "{}/{}".format(S3_SOURCE_BUCKET, S3_SOURCE_FILE)
-    raw_data = read_in_s3_csv(source_url)
-    for row in raw_data:
-        sampling_date = parser.parse(row.get('date')).date()
-        if sampling_date >= starting_date and sampling_date <= through_date:
-            valid_fips = validate_fips(row.get('fips'))
-            if valid_fips:
-                county = County.objects.get(fips=valid_fips)
-                new_objects.append(
-                    CountyMortgageData(
-                        pk=pk,
-                        fips=valid_fips,
-                        date=sampling_date,
-                        total=row.get('open'),
-                        current=row.get('current'),
-                        thirty=row.get('thirty'),
-                        sixty=row.get('sixty'),
-                        ninety=row.get('ninety'),
-                        other=row.get('other'),
-                        county=county
-                    ))
-                pk += 1
-                counter += 1
-                if counter % 10000 == 0:  # pragma: no cover
-                    sys.stdout.write('.')
-                    sys.stdout.flush()
-                if counter % 100000 == 0:  # pragma: no cover
-                    logger.info("\n{}".format(counter))
-    CountyMortgageData.objects.bulk_create(new_objects)
+    hashes = {}
+    touched = None
+    if incremental:
+        touched, counter = load_changed_dates(
+            source_url, starting_date, through_date, hashes)
+    else:
+        # truncate table
+        CountyMortgageData.objects.all().delete()
+        raw_data = hash_partitions(
+            stream_s3_csv(source_url), starting_date, through_date, hashes)
+        counter = load_county_records(
+            generate_county_records(raw_data, starting_date, through_date))
+    save_partition_hashes(hashes)
     logger.info('\n{} took {} '
                 'to create {} countymortgage records'.format(
                     SCRIPT_NAME,
                     (datetime.datetime.now() - starter),
-                    len(new_objects)))
+                    counter))
     if dump_slug:
         dump_as_csv(
-            (
-                (
-                    obj.pk,
-                    obj.fips,
-                    "{}".format(obj.date),
-                    obj.total,
-                    obj.current,
-                    obj.thirty,
-                    obj.sixty,
-                    obj.ninety,
-                    obj.other,
-                    obj.county.pk,
-                ) for obj in new_objects
-            ),
+            CountyMortgageData.objects.order_by('pk').values_list(
+                'pk',
+                'fips',
+                'date',
+                'total',
+                'current',
+                'thirty',
+                'sixty',
+                'ninety',
+                'other',
+                'county_id',
+            ).iterator(),
             dump_slug
         )
+    return touched
 
 
 def run(*args):
@@ -130,8 +272,14 @@ def run(*args):
     The script ingests a through-date (YYYY-MM-DD) and dump location/slug.
     Sample command:
     `manage.py runscript process_mortgage_data --script-args 2017-03-01 /tmp/mp_countydata`  # noqa: E501
+
+    Add 'incremental' to the arguments to reload and re-aggregate only the
+    sampling dates whose source data has changed since the last run:
+    `manage.py runscript process_mortgage_data --script-args 2017-03-01 incremental`  # noqa: E501
     """
     dump_slug = None
+    incremental = 'incremental' in args
+    args = [arg for arg in args if arg != 'incremental']
     starting_date = MortgageDataConstant.objects.get(
         name='starting_date').date_value
     if args:
@@ -139,11 +287,13 @@ def run(*args):
         update_through_date_constant(through_date)
         if len(args) > 1:
             dump_slug = args[1]
-        process_source(
-            starting_date, through_date, dump_slug=dump_slug)
-        load_mortgage_aggregates.run()
+        touched_dates = process_source(
+            starting_date, through_date, dump_slug=dump_slug,
+            incremental=incremental)
+        load_mortgage_aggregates.run('bulk', dates=touched_dates)
         update_county_msa_meta.run()
         export_public_csvs.run()
+        publish_mortgage_payloads.run()
     else:
         logger.info(
             "Please provide a through-date (YYYY-MM-DD).\n"
@@ -0,0 +1,62 @@
+import datetime
+import logging
+import os
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from dateutil import parser
+
+from data_research.mortgage_utilities.columnar_store import MortgageStore
+from data_research.mortgage_utilities.payload_cache import publish_payloads
+from data_research.views import DAYS_LATE_RANGE
+
+
+logger = logging.getLogger(__name__)
+script = os.path.basename(__file__)
+
+MAP_GEOS = ['national', 'states', 'counties', 'metros']
+
+
+def generate_payloads():
+    """
+    Yield every time-series and map API payload for the current data.
+
+    Payloads are yielded as (kind, args, payload) tuples, where args match
+    the URL arguments of the API view that serves the payload. They are
+    built from a freshly loaded MortgageStore rather than the database.
+    """
+    store = MortgageStore.load()
+    for days_late in DAYS_LATE_RANGE:
+        yield (
+            'time-series',
+            (days_late, 'national'),
+            store.national_time_series(days_late))
+        for fips in store.reference_lists['allowlist']:
+            try:
+                payload = store.geo_time_series(days_late, fips)
+            except ObjectDoesNotExist:
+                logger.info("No time-series data for {}".format(fips))
+                continue
+            yield ('time-series', (days_late, fips), payload)
+        for date_string in store.reference_lists['sampling_dates']:
+            date = parser.parse(date_string).date()
+            try:
+                for geo in MAP_GEOS:
+                    yield (
+                        'map-data',
+                        (days_late, geo, date_string[:7]),
+                        store.map_data(days_late, geo, date))
+            except ObjectDoesNotExist:
+                logger.info("No national data for {}".format(date))
+
+
+def run():
+    """
+    Pre-render and publish API payloads after a mortgage data refresh.
+
+    The new payloads replace the previous set all at once.
+    """
+    starter = datetime.datetime.now()
+    publish_payloads(generate_payloads())
+    logger.info("{} took {} to run.".format(
+        script, (datetime.datetime.now() - starter)))
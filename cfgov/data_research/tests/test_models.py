@@ -9,7 +9,9 @@ from model_bakery import baker
 from data_research.models import (
     County, CountyMortgageData, MetroArea, MortgageBase, MortgageDataConstant,
     MortgageMetaData, MortgagePerformancePage, MSAMortgageData,
-    NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
+    NationalMortgageData, NonMSAMortgageData, State, StateMortgageData,
+    get_monthly_averages, validate_counties, validate_metro_areas,
+    validate_non_msas
 )
 from data_research.mortgage_utilities.fips_meta import FIPS, load_fips_meta
 
@@ -215,6 +217,71 @@ class GeoValidationTests(django.test.TestCase):
         state.validate_non_msas()
         self.assertIs(state.non_msa_valid, True)
 
+    def test_bulk_county_validation(self):
+        validate_counties()
+        self.assertEqual(
+            sorted(County.objects.filter(valid=True).values_list(
+                'fips', flat=True)),
+            ['12013', '12081'])
+        CountyMortgageData.objects.filter(fips='12081').update(total=100)
+        validate_counties()
+        self.assertIs(County.objects.get(fips='12081').valid, False)
+
+    def test_bulk_msa_validation(self):
+        validate_metro_areas()
+        self.assertIs(MetroArea.objects.get(fips='45220').valid, False)
+        self.assertIs(MetroArea.objects.get(fips='35840').valid, True)
+
+    def test_bulk_non_msa_validation(self):
+        validate_non_msas()
+        self.assertIs(State.objects.get(fips='12').non_msa_valid, False)
+        NonMSAMortgageData.objects.get(fips='12-non').aggregate_data()
+        validate_non_msas()
+        self.assertIs(State.objects.get(fips='12').non_msa_valid, True)
+        self.assertIs(State.objects.get(fips='34').non_msa_valid, False)
+
+    def test_bulk_validation_matches_single_validation(self):
+        validate_counties()
+        validate_metro_areas()
+        bulk_flags = {
+            obj.fips: obj.valid
+            for model in [County, MetroArea] for obj in model.objects.all()}
+        for model in [County, MetroArea]:
+            for obj in model.objects.all():
+                obj.validate()
+                self.assertIs(obj.valid, bulk_flags[obj.fips])
+
+    def test_get_monthly_averages(self):
+        averages = get_monthly_averages(MSAMortgageData, 'msa', 2016)
+        metro = MetroArea.objects.get(fips='35840')
+        self.assertEqual(averages[metro.pk], 2000)
+
+    def test_get_monthly_averages_over_several_months(self):
+        metro = MetroArea.objects.get(fips='35840')
+        for month, total in [(2, 200), (3, 200), (4, 800)]:
+            baker.make(
+                MSAMortgageData,
+                date=datetime.date(2016, month, 1),
+                fips='35840',
+                total=total,
+                current=total,
+                thirty=0,
+                sixty=0,
+                ninety=0,
+                other=0,
+                msa=metro)
+
+        averages = get_monthly_averages(MSAMortgageData, 'msa', 2016)
+        self.assertEqual(averages, {
+            MetroArea.objects.get(fips='45220').pk: 200,
+            metro.pk: 800,
+        })
+
+        validate_metro_areas()
+        self.assertIs(MetroArea.objects.get(fips='35840').valid, False)
+        metro.validate()
+        self.assertIs(metro.valid, False)
+
     def test_non_msa_validation_no_counties(self):
         """Non-MSA validation occurs on the State model."""
         state = State.objects.get(fips='34')
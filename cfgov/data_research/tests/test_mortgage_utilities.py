@@ -1,8 +1,12 @@
+import datetime
+import unittest
+
 import django
 
 import mock
 
 from data_research.models import MortgageDataConstant
+from data_research.mortgage_utilities.columnar_store import GeoTable
 from data_research.mortgage_utilities.fips_meta import load_constants
 
 
@@ -16,3 +20,33 @@ class LoadConstantsTest(django.test.TestCase):
             name='starting_date').date_value
         load_constants()
         self.assertEqual(mock_FIPS.starting_date, target_starting_date)
+
+
+class GeoTableTest(unittest.TestCase):
+
+    dates = [datetime.date(2008, 1, 1), datetime.date(2008, 2, 1)]
+
+    def setUp(self):
+        date_index = {date: i for i, date in enumerate(self.dates)}
+        rows = [
+            ('12081', self.dates[0], 200, 150, 20, 10, 10, 10),
+            ('12081', self.dates[1], 0, 0, 0, 0, 0, 0),
+            ('12086', self.dates[1], None, None, None, None, None, None),
+        ]
+        self.table = GeoTable(['12081', '12086'], date_index, rows)
+
+    def test_percentages(self):
+        position = self.table.position('12081', 0)
+        self.assertEqual(self.table.value(position, '90'), 0.05)
+        self.assertEqual(self.table.value(position, '30-89'), 0.15)
+        self.assertEqual(self.table.counts['current'][position], 150)
+
+    def test_zero_total(self):
+        position = self.table.position('12081', 1)
+        self.assertEqual(self.table.value(position, '90'), 0)
+
+    def test_missing_values(self):
+        self.assertFalse(self.table.present[self.table.position('12086', 0)])
+        position = self.table.position('12086', 1)
+        self.assertTrue(self.table.present[position])
+        self.assertIsNone(self.table.value(position, '90'))
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+import mock
+
+from data_research.models import MortgageMetaData
+from data_research.mortgage_utilities.payload_cache import (
+    get_current_version, get_payload, publish_payloads
+)
+from data_research.scripts.publish_mortgage_payloads import run as run_publish
+
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-mortgage-payloads',
+    },
+}
+
+
+class PayloadCacheTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings_override = override_settings(
+            MORTGAGE_PAYLOAD_ROOT=self.root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_no_published_version(self):
+        self.assertIsNone(get_current_version())
+        self.assertIsNone(get_payload('time-series', '90', '12081'))
+
+    @override_settings(MORTGAGE_PAYLOAD_ROOT=None)
+    def test_publish_without_payload_root_fails(self):
+        payloads = iter([('time-series', ('90', '12'), 'new')])
+        with self.assertRaises(ImproperlyConfigured):
+            publish_payloads(payloads)
+        self.assertIsNone(get_current_version())
+        self.assertIsNone(get_payload('time-series', '90', '12'))
+
+    def test_publish_and_read_from_disk(self):
+        current = publish_payloads([
+            ('time-series', ('90', '12081'), {'data': [1]}),
+        ])
+        self.assertEqual(get_current_version(), current)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.root, current['version'], 'time-series', '90',
+            '12081.json')))
+        self.assertEqual(
+            get_payload('time-series', '90', '12081'), {'data': [1]})
+        self.assertIsNone(get_payload('time-series', '90', '12086'))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_payloads_are_not_kept_in_django_cache(self):
+        cache.clear()
+        current = publish_payloads([
+            ('map-data', ('90', 'states', '2008-01'), {'data': {}}),
+        ])
+        self.assertEqual(
+            get_payload('map-data', '90', 'states', '2008-01'),
+            {'data': {}})
+        shutil.rmtree(os.path.join(self.root, current['version']))
+        self.assertIsNone(get_payload('map-data', '90', 'states', '2008-01'))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_publish_removes_previous_versions(self):
+        os.makedirs(os.path.join(self.root, '20180101000000', 'map-data'))
+        current = publish_payloads([('time-series', ('90', '12'), 'new')])
+        self.assertEqual(os.listdir(self.root).count(current['version']), 1)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, '20180101000000')))
+        self.assertEqual(get_payload('time-series', '90', '12'), 'new')
+
+    def make_published_versions(self, swapped_at=None):
+        for version in ('20170101000000', '20180101000000'):
+            os.makedirs(os.path.join(self.root, version, 'map-data'))
+        current_path = os.path.join(self.root, 'CURRENT')
+        with open(current_path, 'w') as f:
+            json.dump({
+                'version': '20180101000000',
+                'published': '2018-01-01T00:00:00',
+            }, f)
+        if swapped_at is not None:
+            os.utime(current_path, (swapped_at, swapped_at))
+
+    def test_publish_keeps_version_other_processes_may_use(self):
+        self.make_published_versions(swapped_at=0)
+        current = publish_payloads([('time-series', ('90', '12'), 'new')])
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            sorted(['CURRENT', '20180101000000', current['version']]))
+
+    def test_publish_soon_after_previous_keeps_older_versions(self):
+        self.make_published_versions()
+        current = publish_payloads([('time-series', ('90', '12'), 'new')])
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            sorted([
+                'CURRENT', '20170101000000', '20180101000000',
+                current['version'],
+            ]))
+
+    @mock.patch('data_research.scripts.publish_mortgage_payloads.'
+                'generate_payloads')
+    def test_run_publish(self, mock_generate):
+        mock_generate.return_value = iter([
+            ('time-series', ('90', 'national'), {'data': []}),
+        ])
+        run_publish()
+        self.assertEqual(
+            get_payload('time-series', '90', 'national'), {'data': []})
+
+    def test_view_serves_published_payload(self):
+        publish_payloads([
+            ('time-series', ('90', '12081'), {'data': 'cached'}),
+        ])
+        url = reverse(
+            'data_research_api_mortgage_timeseries',
+            kwargs={'fips': '12081', 'days_late': '90'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'cached')
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @mock.patch('data_research.mortgage_utilities.columnar_store.'
+                'MortgageStore.load')
+    def test_view_miss_queries_database_for_one_payload(self, mock_load):
+        MortgageMetaData.objects.create(name='allowlist', json_value=[])
+        MortgageMetaData.objects.create(name='msa_fips', json_value=[])
+        publish_payloads([
+            ('time-series', ('90', '12081'), {'data': 'cached'}),
+        ])
+        response = self.client.get(reverse(
+            'data_research_api_mortgage_timeseries',
+            kwargs={'fips': '99999', 'days_late': '90'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'FIPS code not found or not valid.')
+        mock_load.assert_not_called()
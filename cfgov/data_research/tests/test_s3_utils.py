@@ -8,7 +8,7 @@ import moto
 import responses
 
 from data_research.mortgage_utilities.s3_utils import (
-    bake_csv_to_s3, read_in_s3_csv
+    bake_csv_to_s3, download_s3_file, read_in_s3_csv, stream_s3_csv
 )
 
 
@@ -21,6 +21,24 @@ class S3UtilsTests(TestCase):
         self.assertEqual(reader.fieldnames, ['a', 'b', 'c'])
         self.assertEqual(sorted(next(reader).values()), ['d', 'e', 'f'])
 
+    @responses.activate
+    def test_stream_s3_csv(self):
+        url = 'https://test.url/foo.csv'
+        responses.add(responses.GET, url, body='a,b,c\r\nd,e,f\r\ng,h,i')
+        reader = stream_s3_csv(url)
+        self.assertEqual(reader.fieldnames, ['a', 'b', 'c'])
+        self.assertEqual(
+            [sorted(row.values()) for row in reader],
+            [['d', 'e', 'f'], ['g', 'h', 'i']]
+        )
+
+    @responses.activate
+    def test_download_s3_file(self):
+        url = 'https://test.url/foo.csv'
+        responses.add(responses.GET, url, body='a,b,c\nd,e,f')
+        downloaded = download_s3_file(url, BytesIO())
+        self.assertEqual(downloaded.read(), b'a,b,c\nd,e,f')
+
     @moto.mock_s3
     @override_settings(AWS_STORAGE_BUCKET_NAME='test.bucket')
     def test_bake_csv_to_s3(self):
@@ -15,15 +15,16 @@ from data_research.models import (
     MortgageMetaData, MSAMortgageData, NationalMortgageData,
     NonMSAMortgageData, State, StateMortgageData, validate_counties
 )
-from data_research.mortgage_utilities.fips_meta import validate_fips
+from data_research.mortgage_utilities.fips_meta import FIPS, validate_fips
 from data_research.scripts.export_public_csvs import (
     export_downloadable_csv, round_pct, row_starter, run as run_export,
     save_metadata
 )
 from data_research.scripts.load_mortgage_aggregates import (
-    load_msa_values, load_national_values, load_non_msa_state_values,
-    load_state_values, merge_the_dades, run as run_aggregates,
-    update_sampling_dates
+    build_date_records, compare_load_modes, load_msa_values,
+    load_national_values, load_non_msa_state_values, load_state_values,
+    load_values_in_bulk, load_values_in_parallel, merge_the_dades,
+    run as run_aggregates, update_sampling_dates
 )
 from data_research.scripts.load_mortgage_performance_csv import load_values
 from data_research.scripts.process_mortgage_data import (
@@ -94,7 +95,7 @@ class SourceToTableTest(django.test.TestCase):
             self.assertEqual(content.strip(), ','.join(self.data_row))
 
     @mock.patch('data_research.scripts.process_mortgage_data.'
-                'read_in_s3_csv')
+                'stream_s3_csv')
     @mock.patch('data_research.scripts.process_mortgage_data.'
                 'dump_as_csv')
     def test_process_source(self, mock_dump, mock_read):
@@ -128,6 +129,88 @@ class SourceToTableTest(django.test.TestCase):
         self.assertEqual(mock_read.call_count, 1)
         self.assertEqual(mock_dump.call_count, 1)
 
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'BATCH_SIZE', 2)
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'stream_s3_csv')
+    def test_process_source_batches(self, mock_read):
+        row = {
+            'fips': '12081',
+            'open': '268',
+            'current': '260',
+            'thirty': '4',
+            'sixty': '1',
+            'ninety': '0',
+            'other': '3'
+        }
+        dates = ['01/01/10', '02/01/10', '03/01/10', '01/01/19']
+        mock_read.return_value = (
+            dict(row, date=date) for date in dates)
+        process_source(self.start_date, self.through_date)
+        # The 2019 row falls outside the date range and is skipped.
+        self.assertEqual(CountyMortgageData.objects.count(), 3)
+        self.assertEqual(
+            sorted(CountyMortgageData.objects.values_list('pk', flat=True)),
+            [1, 2, 3])
+        self.assertEqual(
+            CountyMortgageData.objects.first().county.fips, '12081')
+
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'stream_s3_csv')
+    def test_process_source_unknown_county(self, mock_read):
+        mock_read.return_value = iter([{
+            'date': '01/01/10',
+            'fips': '99999',
+            'open': '268',
+            'current': '260',
+            'thirty': '4',
+            'sixty': '1',
+            'ninety': '0',
+            'other': '3'
+        }])
+        with self.assertRaises(County.DoesNotExist):
+            process_source(self.start_date, self.through_date)
+
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'download_s3_file')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'stream_s3_csv')
+    def test_process_source_incremental(self, mock_read, mock_download):
+        heading = 'date,fips,open,current,thirty,sixty,ninety,other\n'
+        january = '01/01/10,12081,268,260,4,1,0,3\n'
+        february = '02/01/10,12081,280,270,5,2,1,2\n'
+        mock_read.return_value = csv.DictReader(
+            StringIO(heading + january + february))
+        self.assertIsNone(process_source(self.start_date, self.through_date))
+        january_pk = CountyMortgageData.objects.get(
+            date=datetime.date(2010, 1, 1)).pk
+
+        def download(url, file_obj):
+            revised = february.replace('280', '281')
+            march = '03/01/10,12081,290,280,5,2,1,2\n'
+            file_obj.write(
+                (heading + revised + march + january).encode('utf-8'))
+
+        mock_download.side_effect = download
+        touched = process_source(
+            self.start_date, self.through_date, incremental=True)
+        self.assertEqual(
+            touched, [datetime.date(2010, 2, 1), datetime.date(2010, 3, 1)])
+        # January's source rows only moved, so its record is untouched.
+        self.assertEqual(
+            CountyMortgageData.objects.get(
+                date=datetime.date(2010, 1, 1)).pk,
+            january_pk)
+        self.assertEqual(
+            CountyMortgageData.objects.get(
+                date=datetime.date(2010, 2, 1)).total,
+            281)
+        self.assertEqual(CountyMortgageData.objects.count(), 3)
+        self.assertEqual(
+            sorted(MortgageMetaData.objects.get(
+                name='partition_hashes').json_value),
+            ['2010-01-01', '2010-02-01', '2010-03-01'])
+
     @mock.patch('data_research.scripts.process_mortgage_data.'
                 'process_source')
     @mock.patch('data_research.scripts.process_mortgage_data.'
@@ -138,16 +221,44 @@ class SourceToTableTest(django.test.TestCase):
                 'update_county_msa_meta.run')
     @mock.patch('data_research.scripts.process_mortgage_data.'
                 'export_public_csvs.run')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'publish_mortgage_payloads.run')
     def test_run_command(
-            self, mock_export, mock_meta_update, mock_aggregates,
-            mock_update_constants, mock_process):
+            self, mock_publish, mock_export, mock_meta_update,
+            mock_aggregates, mock_update_constants, mock_process):
         run_process_mortgage_data(
             '2018-06-01', 'mock_slug')
+        self.assertEqual(mock_publish.call_count, 1)
         self.assertEqual(mock_export.call_count, 1)
         self.assertEqual(mock_meta_update.call_count, 1)
         self.assertEqual(mock_aggregates.call_count, 1)
         self.assertEqual(mock_update_constants.call_count, 1)
         self.assertEqual(mock_process.call_count, 1)
+        self.assertEqual(mock_process.call_args[1]['incremental'], False)
+        self.assertIsNone(mock_aggregates.call_args[1]['dates'])
+
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'process_source')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'update_through_date_constant')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'load_mortgage_aggregates.run')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'update_county_msa_meta.run')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'export_public_csvs.run')
+    @mock.patch('data_research.scripts.process_mortgage_data.'
+                'publish_mortgage_payloads.run')
+    def test_run_command_incremental(
+            self, mock_publish, mock_export, mock_meta_update,
+            mock_aggregates, mock_update_constants, mock_process):
+        mock_process.return_value = [datetime.date(2018, 6, 1)]
+        run_process_mortgage_data('2018-06-01', 'incremental')
+        self.assertEqual(mock_process.call_args[1]['incremental'], True)
+        self.assertIsNone(mock_process.call_args[1]['dump_slug'])
+        self.assertEqual(
+            mock_aggregates.call_args[1]['dates'],
+            [datetime.date(2018, 6, 1)])
 
     @mock.patch('data_research.scripts.process_mortgage_data.process_source')
     def test_run_command_no_args(self, mock_process):
@@ -398,6 +509,26 @@ class DataExportTest(django.test.TestCase):
         export_downloadable_csv('State', 'percent_90')
         self.assertEqual(mock_bake.call_count, 6)
 
+    @mock.patch('data_research.scripts.export_public_csvs.bake_csv_to_s3')
+    def test_export_downloadable_csv_content(self, mock_bake):
+        contents = []
+        mock_bake.side_effect = lambda slug, f, **kwargs: contents.append(
+            f.seek(0) or f.read().decode('utf-8'))
+        run_export(prep_only=True)
+        export_downloadable_csv('MetroArea', 'percent_90')
+        rows = list(csv.reader(StringIO(contents[0])))
+        self.assertEqual(rows[0][:3], ['RegionType', 'Name', 'CBSACode'])
+        self.assertEqual(rows[1][:3], ['National', 'United States', '-----'])
+        self.assertEqual(
+            rows[2],
+            ['MetroArea', 'North Port-Sarasota-Bradenton, FL', '35840',
+             '6.2'])
+        self.assertEqual(
+            rows[3], ['NonMetroArea', 'Florida', '12-non', '6.2'])
+        self.assertEqual(len(rows), 4)
+        meta = MortgageMetaData.objects.get(name='download_files')
+        self.assertIn('percent_90', meta.json_value[FIPS.dates[-1][:-3]])
+
     def test_row_starter(self):
         """
         def row_starter(geo_type, obj):
@@ -602,6 +733,177 @@ class DataLoadTest(django.test.TestCase):
         self.assertEqual(NonMSAMortgageData.objects.count(), 1)
 
 
+class BulkAggregationTest(django.test.TestCase):
+
+    fixtures = ['mortgage_constants.json', 'mortgage_metadata.json']
+
+    dates = [datetime.date(2016, 1, 1), datetime.date(2016, 2, 1)]
+
+    def setUp(self):
+        baker.make(
+            State,
+            fips='12',
+            abbr='FL',
+            counties=['12001', '12081', '12115'],
+            non_msa_counties=['12001'],
+            name='Florida')
+        baker.make(
+            State,
+            fips='13',
+            abbr='GA',
+            counties=['13001'],
+            non_msa_counties=[],
+            name='Georgia')
+        baker.make(
+            MetroArea,
+            fips='35840',
+            name='North Port-Sarasota-Bradenton, FL',
+            counties=['12081', '12115'],
+            states=['12'],
+            valid=True)
+        for fips in ['12001', '12081', '12115', '13001']:
+            for i, date in enumerate(self.dates):
+                baker.make(
+                    CountyMortgageData,
+                    fips=fips,
+                    date=date,
+                    total=100 + i,
+                    current=50,
+                    thirty=10,
+                    sixty=5,
+                    ninety=2 + i,
+                    other=1)
+
+    def test_load_values_in_bulk(self):
+        load_values_in_bulk(self.dates)
+        self.assertEqual(MSAMortgageData.objects.count(), 2)
+        self.assertEqual(StateMortgageData.objects.count(), 4)
+        self.assertEqual(NonMSAMortgageData.objects.count(), 4)
+        self.assertEqual(NationalMortgageData.objects.count(), 2)
+        msa = MSAMortgageData.objects.get(date=self.dates[1])
+        self.assertEqual(msa.msa.fips, '35840')
+        self.assertEqual(msa.total, 202)
+        self.assertEqual(msa.ninety, 6)
+        florida = StateMortgageData.objects.get(
+            fips='12', date=self.dates[0])
+        self.assertEqual(florida.total, 300)
+        georgia_non_msa = NonMSAMortgageData.objects.get(
+            fips='13-non', date=self.dates[0])
+        self.assertEqual(georgia_non_msa.total, 0)
+        nation = NationalMortgageData.objects.get(date=self.dates[0])
+        self.assertEqual(nation.fips, '-----')
+        self.assertEqual(nation.total, 400)
+
+    def test_compare_load_modes(self):
+        timings, mismatches = compare_load_modes(self.dates)
+        self.assertEqual(sorted(timings), ['bulk', 'by-date'])
+        self.assertEqual(mismatches, [])
+
+    def test_compare_load_modes_keeps_other_dates(self):
+        load_values_in_bulk(self.dates)
+        kept = NationalMortgageData.objects.get(date=self.dates[0]).pk
+        timings, mismatches = compare_load_modes([self.dates[1]])
+        self.assertEqual(mismatches, [])
+        self.assertEqual(
+            NationalMortgageData.objects.get(date=self.dates[0]).pk, kept)
+        self.assertEqual(NationalMortgageData.objects.count(), 2)
+
+    def test_duplicate_county_is_counted_once(self):
+        State.objects.filter(fips='13').update(
+            counties=['13001', '13001'])
+        MetroArea.objects.filter(fips='35840').update(
+            counties=['12081', '12115', '12081'])
+        load_values_in_bulk(self.dates)
+        self.assertEqual(
+            StateMortgageData.objects.get(
+                fips='13', date=self.dates[0]).total,
+            100)
+        self.assertEqual(
+            MSAMortgageData.objects.get(date=self.dates[0]).total, 200)
+        timings, mismatches = compare_load_modes(self.dates)
+        self.assertEqual(mismatches, [])
+
+    def test_build_date_records(self):
+        records = build_date_records(self.dates[0])
+        self.assertEqual(
+            [type(record) for record in records],
+            [MSAMortgageData, StateMortgageData, StateMortgageData,
+             NonMSAMortgageData, NonMSAMortgageData, NationalMortgageData])
+        self.assertTrue(all(record.pk is None for record in records))
+        self.assertEqual(records[-1].total, 400)
+        self.assertEqual(MSAMortgageData.objects.count(), 0)
+
+    def test_load_values_in_parallel_single_worker(self):
+        load_values_in_parallel(self.dates, 1)
+        self.assertEqual(NationalMortgageData.objects.count(), 2)
+        self.assertEqual(
+            list(StateMortgageData.objects.order_by('pk').values_list(
+                'fips', 'date')),
+            [('12', self.dates[0]), ('13', self.dates[0]),
+             ('12', self.dates[1]), ('13', self.dates[1])])
+
+    @mock.patch('data_research.scripts.load_mortgage_aggregates.connections')
+    @mock.patch('data_research.scripts.load_mortgage_aggregates.Pool')
+    def test_load_values_in_parallel_uses_pool(
+            self, mock_pool, mock_connections):
+        pool = mock_pool.return_value
+        pool.imap.side_effect = lambda func, dates: map(func, dates)
+        load_values_in_parallel(self.dates, 4)
+        mock_pool.assert_called_once_with(4)
+        self.assertEqual(mock_connections.close_all.call_count, 1)
+        self.assertEqual(pool.join.call_count, 1)
+        self.assertEqual(MSAMortgageData.objects.count(), 2)
+
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.load_values_in_parallel')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_counties')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_metro_areas')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_non_msas')
+    def test_run_aggregates_workers(
+            self, mock_non_msas, mock_metros, mock_counties, mock_parallel):
+        run_aggregates('workers=3')
+        self.assertEqual(mock_parallel.call_count, 1)
+        self.assertEqual(mock_parallel.call_args[0][1], 3)
+
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.load_values_by_date')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.load_values_in_bulk')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_counties')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_metro_areas')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_non_msas')
+    def test_run_aggregates_bulk(
+            self, mock_non_msas, mock_metros, mock_counties, mock_bulk,
+            mock_by_date):
+        run_aggregates('bulk')
+        self.assertEqual(mock_bulk.call_count, 1)
+        self.assertEqual(mock_by_date.call_count, 0)
+
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_counties')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_metro_areas')
+    @mock.patch('data_research.scripts.'
+                'load_mortgage_aggregates.validate_non_msas')
+    def test_run_aggregates_for_changed_dates(
+            self, mock_non_msas, mock_metros, mock_counties):
+        load_values_in_bulk(self.dates)
+        kept = NationalMortgageData.objects.get(date=self.dates[0]).pk
+        CountyMortgageData.objects.filter(date=self.dates[1]).update(total=1)
+        run_aggregates('bulk', dates=[self.dates[1]])
+        self.assertEqual(
+            NationalMortgageData.objects.get(date=self.dates[0]).pk, kept)
+        self.assertEqual(
+            NationalMortgageData.objects.get(date=self.dates[1]).total, 4)
+        self.assertEqual(StateMortgageData.objects.count(), 4)
+
+
 class UpdateSamplingDatesTest(django.test.TestCase):
 
     fixtures = ['mortgage_constants.json', 'mortgage_metadata.json']
@@ -8,10 +8,14 @@ from django.urls import NoReverseMatch, reverse
 from model_bakery import baker
 
 from data_research.models import (
-    County, CountyMortgageData, MetroArea, MSAMortgageData,
+    County, CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
     NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
 )
-from data_research.views import validate_year_month
+from data_research.mortgage_utilities.columnar_store import MortgageStore
+from data_research.scripts.publish_mortgage_payloads import generate_payloads
+from data_research.views import (
+    geo_time_series, map_data, national_time_series, validate_year_month
+)
 
 
 class YearMonthValidatorTests(unittest.TestCase):
@@ -497,3 +501,56 @@ class TimeseriesViewTests(django.test.TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "County is below display threshold")
+
+    def test_generate_payloads(self):
+        allowlist = MortgageMetaData.objects.get(name='allowlist')
+        allowlist.json_value = ['12', '12-non', '35840', '12081', '01']
+        allowlist.save()
+        payloads = {
+            (kind, args): payload
+            for kind, args, payload in generate_payloads()
+        }
+        self.assertEqual(
+            payloads[('time-series', ('90', '12081'))]['meta']['name'],
+            'Manatee County, FL')
+        self.assertEqual(
+            payloads[('time-series', ('30-89', 'national'))]['meta']['name'],
+            'United States')
+        self.assertIn(
+            '12081',
+            payloads[('map-data', ('90', 'counties', '2008-01'))]['data'])
+        # FIPS codes without a matching geography are skipped.
+        self.assertNotIn(('time-series', ('90', '01')), payloads)
+
+    def test_store_matches_database_payloads(self):
+        allowlist = MortgageMetaData.objects.get(name='allowlist')
+        allowlist.json_value = ['12', '12-non', '35840', '12081']
+        allowlist.save()
+        store = MortgageStore.load()
+        for days_late in ['30-89', '90']:
+            self.assertEqual(
+                store.national_time_series(days_late),
+                national_time_series(days_late))
+            for fips in ['12', '12-non', '35840', '12081', '99999']:
+                self.assertEqual(
+                    store.geo_time_series(days_late, fips),
+                    geo_time_series(days_late, fips))
+            for geo in ['national', 'states', 'counties', 'metros', 'x']:
+                date = datetime.date(2008, 1, 1)
+                self.assertEqual(
+                    store.map_data(days_late, geo, date),
+                    map_data(days_late, geo, date))
+
+    def test_store_invalid_county(self):
+        County.objects.filter(fips='12081').update(valid=False)
+        allowlist = MortgageMetaData.objects.get(name='allowlist')
+        allowlist.json_value = ['12081']
+        allowlist.save()
+        store = MortgageStore.load()
+        self.assertEqual(
+            store.geo_time_series('90', '12081'),
+            "County is below display threshold.")
+        self.assertEqual(
+            store.map_data('90', 'counties', datetime.date(2008, 1, 1))[
+                'data'],
+            {})
@@ -1,5 +1,8 @@
 import datetime
 
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -8,6 +11,9 @@ from data_research.models import (
     County, CountyMortgageData, MetroArea, MortgageMetaData, MSAMortgageData,
     NationalMortgageData, NonMSAMortgageData, State, StateMortgageData
 )
+from data_research.mortgage_utilities.payload_cache import (
+    get_payload, payload_etag, payload_last_modified
+)
 
 
 DAYS_LATE_RANGE = ['30-89', '90']
@@ -28,6 +34,75 @@ class MetaData(APIView):
         return Response(meta_json)
 
 
+def national_time_series(days_late):
+    records = NationalMortgageData.objects.all()
+    return {'meta': {'name': 'United States',
+                     'fips_type': 'national'},
+            'data': [record.time_series(days_late)
+                     for record in records]}
+
+
+def geo_time_series(days_late, fips, reference_lists=None):
+    """
+    Return a FIPS-based slice of base data as a timeseries payload.
+
+    If the FIPS code isn't displayable, an explanatory string is returned
+    instead. The allowlist and MSA list can be passed in as
+    `reference_lists` to avoid reloading them for every FIPS code.
+    """
+    if reference_lists is None:
+        reference_lists = {
+            obj.name: obj.json_value for obj
+            in MortgageMetaData.objects.filter(
+                name__in=['allowlist', 'msa_fips'])}
+    if fips not in reference_lists['allowlist']:
+        return "FIPS code not found or not valid."
+    if len(fips) == 2:
+        state = State.objects.get(fips=fips)
+        records = StateMortgageData.objects.filter(
+            fips=fips)
+        return {'meta': {'fips': fips,
+                         'name': state.name,
+                         'fips_type': 'state'},
+                'data': [record.time_series(days_late)
+                         for record in records]}
+    if 'non' in fips:
+        records = NonMSAMortgageData.objects.filter(
+            fips=fips).select_related('state')
+        return {'meta': {'fips': fips,
+                         'name': "Non-metro area of {}".format(
+                             records.first().state.name),
+                         'fips_type': 'non_msa'},
+                'data': [record.time_series(days_late)
+                         for record in records]}
+
+    if fips in reference_lists['msa_fips']:
+        metro_area = MetroArea.objects.get(fips=fips, valid=True)
+        records = MSAMortgageData.objects.filter(fips=fips)
+        return {'meta': {'fips': fips,
+                         'name': metro_area.name,
+                         'fips_type': 'msa'},
+                'data': [record.time_series(days_late)
+                         for record in records]}
+    else:  # must be a county request
+        try:
+            county = County.objects.select_related('state').get(
+                fips=fips, valid=True)
+        except County.DoesNotExist:
+            return "County is below display threshold."
+        records = CountyMortgageData.objects.filter(fips=fips)
+        name = "{}, {}".format(county.name, county.state.abbr)
+        return {'meta': {'fips': fips,
+                         'name': name,
+                         'fips_type': 'county'},
+                'data': [record.time_series(days_late)
+                         for record in records]}
+
+
+@method_decorator(
+    condition(etag_func=payload_etag,
+              last_modified_func=payload_last_modified),
+    name='get')
 class TimeSeriesNational(APIView):
     """
     View for delivering national time-series data
@@ -38,14 +113,16 @@ class TimeSeriesNational(APIView):
     def get(self, request, days_late):
         if days_late not in DAYS_LATE_RANGE:
             return Response("Unknown delinquency range")
-        records = NationalMortgageData.objects.all()
-        data = {'meta': {'name': 'United States',
-                         'fips_type': 'national'},
-                'data': [record.time_series(days_late)
-                         for record in records]}
+        data = get_payload('time-series', days_late, 'national')
+        if data is None:
+            data = national_time_series(days_late)
         return Response(data)
 
 
+@method_decorator(
+    condition(etag_func=payload_etag,
+              last_modified_func=payload_last_modified),
+    name='get')
 class TimeSeriesData(APIView):
     """
     View for delivering geo-based time-series data
@@ -59,53 +136,9 @@ class TimeSeriesData(APIView):
         """
         if days_late not in DAYS_LATE_RANGE:
             return Response("Unknown delinquency range")
-        reference_lists = {
-            entry: MortgageMetaData.objects.get(name=entry).json_value
-            for entry in ['allowlist', 'msa_fips', 'non_msa_fips']}
-        if fips not in reference_lists['allowlist']:
-            return Response("FIPS code not found or not valid.")
-        if len(fips) == 2:
-            state = State.objects.get(fips=fips)
-            records = StateMortgageData.objects.filter(
-                fips=fips)
-            data = {'meta': {'fips': fips,
-                             'name': state.name,
-                             'fips_type': 'state'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-            return Response(data)
-        if 'non' in fips:
-            records = NonMSAMortgageData.objects.filter(
-                fips=fips)
-            data = {'meta': {'fips': fips,
-                             'name': "Non-metro area of {}".format(
-                                 records.first().state.name),
-                             'fips_type': 'non_msa'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-            return Response(data)
-
-        if fips in reference_lists['msa_fips']:
-            metro_area = MetroArea.objects.get(fips=fips, valid=True)
-            records = MSAMortgageData.objects.filter(fips=fips)
-            data = {'meta': {'fips': fips,
-                             'name': metro_area.name,
-                             'fips_type': 'msa'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
-            return Response(data)
-        else:  # must be a county request
-            try:
-                county = County.objects.get(fips=fips, valid=True)
-            except County.DoesNotExist:
-                return Response("County is below display threshold.")
-            records = CountyMortgageData.objects.filter(fips=fips)
-            name = "{}, {}".format(county.name, county.state.abbr)
-            data = {'meta': {'fips': fips,
-                             'name': name,
-                             'fips_type': 'county'},
-                    'data': [record.time_series(days_late)
-                             for record in records]}
+        data = get_payload('time-series', days_late, fips)
+        if data is None:
+            data = geo_time_series(days_late, fips)
         return Response(data)
 
 
@@ -128,6 +161,83 @@ def validate_year_month(year_month):
     return datetime.date(year, month, 1)
 
 
+def map_data(days_late, geo, date):
+    """
+    Return map data for one geo type and date as a payload.
+
+    If the geo type is unknown, an explanatory string is returned instead.
+    """
+    geo_dict = {
+        'national':
+            {'queryset': NationalMortgageData.objects.get(date=date),
+             'fips_type': 'nation',
+             'geo_obj': ''},
+        'states':
+            {'queryset': StateMortgageData.objects.filter(
+                date=date).select_related('state'),
+             'fips_type': 'state',
+             'geo_obj': 'state'},
+        'counties':
+            {'queryset': CountyMortgageData.objects.filter(
+                date=date, county__valid=True).select_related(
+                    'county__state'),
+             'fips_type': 'county',
+             'geo_obj': 'county'},
+        'metros':
+            {'queryset': MSAMortgageData.objects.filter(
+                date=date).select_related('msa'),
+             'fips_type': 'msa',
+             'geo_obj': 'msa'},
+    }
+    if geo not in geo_dict:
+        return "Unkown geographic unit"
+    nat_records = geo_dict['national']['queryset']
+    nat_data_series = nat_records.time_series(days_late)
+    if geo == 'national':
+        payload = {'meta': {'fips_type': geo_dict[geo]['fips_type'],
+                            'date': '{}'.format(date)},
+                   'data': {}}
+        nat_data_series.update({'name': 'United States'})
+        del(nat_data_series['date'])
+        payload['data'].update(nat_data_series)
+    else:
+        records = geo_dict[geo]['queryset']
+        payload = {'meta': {'fips_type': geo_dict[geo]['fips_type'],
+                            'date': '{}'.format(date),
+                            'national_average': nat_data_series['value']},
+                   'data': {}}
+        for record in records:
+            data_series = record.time_series(days_late)
+            geo_parent = getattr(record, geo_dict[geo]['geo_obj'])
+            if geo == 'counties':
+                name = "{}, {}".format(
+                    geo_parent.name, geo_parent.state.abbr)
+            else:
+                name = geo_parent.name
+            data_series.update(
+                {'name': name})
+            del(data_series['date'])
+            payload['data'].update({record.fips: data_series})
+        if geo == 'metros':
+            for metro in MetroArea.objects.filter(valid=False):
+                payload['data'][metro.fips]['value'] = None
+            non_msa_records = NonMSAMortgageData.objects.filter(
+                date=date).select_related('state')
+            for record in non_msa_records:
+                non_data_series = record.time_series(days_late)
+                if record.state.non_msa_valid is False:
+                    non_data_series['value'] = None
+                non_name = "Non-metro area of {}".format(record.state.name)
+                non_data_series.update({'name': non_name})
+                del non_data_series['date']
+                payload['data'].update({record.fips: non_data_series})
+    return payload
+
+
+@method_decorator(
+    condition(etag_func=payload_etag,
+              last_modified_func=payload_last_modified),
+    name='get')
 class MapData(APIView):
     """
     View for delivering geo-based map data by date
@@ -141,65 +251,7 @@ class MapData(APIView):
             return Response("Invalid year-month pair")
         if days_late not in DAYS_LATE_RANGE:
             return Response("Unknown delinquency range")
-        geo_dict = {
-            'national':
-                {'queryset': NationalMortgageData.objects.get(date=date),
-                 'fips_type': 'nation',
-                 'geo_obj': ''},
-            'states':
-                {'queryset': StateMortgageData.objects.filter(
-                    date=date),
-                 'fips_type': 'state',
-                 'geo_obj': 'state'},
-            'counties':
-                {'queryset': CountyMortgageData.objects.filter(
-                    date=date, county__valid=True),
-                 'fips_type': 'county',
-                 'geo_obj': 'county'},
-            'metros':
-                {'queryset': MSAMortgageData.objects.filter(
-                    date=date),
-                 'fips_type': 'msa',
-                 'geo_obj': 'msa'},
-        }
-        if geo not in geo_dict:
-            return Response("Unkown geographic unit")
-        nat_records = geo_dict['national']['queryset']
-        nat_data_series = nat_records.time_series(days_late)
-        if geo == 'national':
-            payload = {'meta': {'fips_type': geo_dict[geo]['fips_type'],
-                                'date': '{}'.format(date)},
-                       'data': {}}
-            nat_data_series.update({'name': 'United States'})
-            del(nat_data_series['date'])
-            payload['data'].update(nat_data_series)
-        else:
-            records = geo_dict[geo]['queryset']
-            payload = {'meta': {'fips_type': geo_dict[geo]['fips_type'],
-                                'date': '{}'.format(date),
-                                'national_average': nat_data_series['value']},
-                       'data': {}}
-            for record in records:
-                data_series = record.time_series(days_late)
-                geo_parent = getattr(record, geo_dict[geo]['geo_obj'])
-                if geo == 'counties':
-                    name = "{}, {}".format(
-                        geo_parent.name, geo_parent.state.abbr)
-                else:
-                    name = geo_parent.name
-                data_series.update(
-                    {'name': name})
-                del(data_series['date'])
-                payload['data'].update({record.fips: data_series})
-            if geo == 'metros':
-                for metro in MetroArea.objects.filter(valid=False):
-                    payload['data'][metro.fips]['value'] = None
-                for record in NonMSAMortgageData.objects.filter(date=date):
-                    non_data_series = record.time_series(days_late)
-                    if record.state.non_msa_valid is False:
-                        non_data_series['value'] = None
-                    non_name = "Non-metro area of {}".format(record.state.name)
-                    non_data_series.update({'name': non_name})
-                    del non_data_series['date']
-                    payload['data'].update({record.fips: non_data_series})
+        payload = get_payload('map-data', days_late, geo, year_month)
+        if payload is None:
+            payload = map_data(days_late, geo, date)
         return Response(payload)
@@ -1,10 +1,12 @@
 import glob
+import hashlib
+import heapq
 import json
 import logging
 import os
 import re
-import sqlite3
-from math import acos, cos, radians, sin
+from math import acos, cos, radians, sin, sqrt
+from multiprocessing import Pool
 
 from django.template import loader
 
@@ -12,6 +14,13 @@ from django.template import loader
 logger = logging.getLogger(__name__)
 
 
+HTML_TEMPLATE_NAME = 'housing_counselor/pdf_selfcontained.html'
+
+# Hashes of each ZIP code's generated JSON, saved in the JSON directory so
+# the next run can tell which ZIP codes have changed.
+HASHES_FILENAME = 'hashes.json'
+
+
 def distance_in_miles(lat1_radians, lng1_radians, lat2_radians, lng2_radians):
     """Estimate distance in miles between two points in radians.
 
@@ -32,103 +41,321 @@ def distance_in_miles(lat1_radians, lng1_radians, lat2_radians, lng2_radians):
     )
 
 
-def get_db_connection():
-    connection = sqlite3.connect(':memory:')
-    connection.create_function('distance_in_miles', 4, distance_in_miles)
+def unit_vector(latitude_radians, longitude_radians):
+    """Convert a latitude and longitude to a point on the unit sphere."""
+    cos_latitude = cos(latitude_radians)
+    return (
+        cos_latitude * cos(longitude_radians),
+        cos_latitude * sin(longitude_radians),
+        sin(latitude_radians),
+    )
+
 
-    return connection
+def squared_chord(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class CounselorIndex(object):
+    """Nearest-counselor lookups backed by a k-d tree.
+
+    Counselor locations are stored as points on the unit sphere, where the
+    straight-line (chord) distance between two points orders them the same
+    way as the distance along the surface. The tree finds the candidates
+    nearest to a location by chord distance; those candidates are then
+    ranked by distance_in_miles, so results are the same as computing the
+    distance to every counselor and sorting.
+    """
+    # Candidates are gathered a little beyond the limit-th nearest chord
+    # distance, to absorb rounding differences between chord distances and
+    # distance_in_miles.
+    candidate_margin = 1.01
+    candidate_padding = 1e-6
 
+    def __init__(self, counselors):
+        self.locations = []
+        self.vectors = []
+        self.counselors = []
 
-def fill_db(connection, counselors):
-    def prepare_counselors(counselors):
         for counselor in counselors:
-            yield (
-                radians(float(counselor['agc_ADDR_LATITUDE'])),
-                radians(float(counselor['agc_ADDR_LONGITUDE'])),
-                json.dumps(counselor)
+            latitude_radians = radians(float(counselor['agc_ADDR_LATITUDE']))
+            longitude_radians = radians(
+                float(counselor['agc_ADDR_LONGITUDE'])
             )
+            self.locations.append((latitude_radians, longitude_radians))
+            self.vectors.append(
+                unit_vector(latitude_radians, longitude_radians)
+            )
+            # Round-trip through JSON, as results are serialized later.
+            self.counselors.append(json.loads(json.dumps(counselor)))
 
-    create_sql = """
-CREATE TABLE counselors (
-    latitude_radians REAL,
-    longitude_radians REAL,
-    json TEXT
-)
-"""
-
-    insert_sql = """
-INSERT INTO
-    counselors(latitude_radians, longitude_radians, json)
-VALUES (?, ?, ?)
-"""
-
-    connection.execute(create_sql)
-    connection.executemany(insert_sql, prepare_counselors(counselors))
-
-
-def query_db(connection, latitude_radians, longitude_radians):
-    sql = """
-SELECT
-    json,
-    distance_in_miles(latitude_radians, longitude_radians, ?, ?) AS distance
-FROM
-    counselors
-ORDER BY distance ASC
-LIMIT 10
-    """
+        self.tree = self._build(list(range(len(self.vectors))), 0)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return None
+
+        axis = depth % 3
+        indexes.sort(key=lambda i: self.vectors[i][axis])
+        median = len(indexes) // 2
+
+        return (
+            indexes[median],
+            axis,
+            self._build(indexes[:median], depth + 1),
+            self._build(indexes[median + 1:], depth + 1),
+        )
+
+    def _nearest(self, node, point, limit, heap):
+        """Keep the `limit` nearest indexes in `heap`, a max-heap."""
+        if node is None:
+            return
+
+        index, axis, left, right = node
+        distance = squared_chord(self.vectors[index], point)
+        if len(heap) < limit:
+            heapq.heappush(heap, (-distance, index))
+        elif distance < -heap[0][0]:
+            heapq.heapreplace(heap, (-distance, index))
+
+        offset = point[axis] - self.vectors[index][axis]
+        near, far = (left, right) if offset < 0 else (right, left)
+        self._nearest(near, point, limit, heap)
+        if len(heap) < limit or offset ** 2 < -heap[0][0]:
+            self._nearest(far, point, limit, heap)
+
+    def _within(self, node, point, radius, found):
+        """Collect indexes within chord distance `radius` of a point."""
+        if node is None:
+            return
+
+        index, axis, left, right = node
+        if squared_chord(self.vectors[index], point) <= radius ** 2:
+            found.append(index)
+
+        offset = point[axis] - self.vectors[index][axis]
+        if offset <= radius:
+            self._within(left, point, radius, found)
+        if offset >= -radius:
+            self._within(right, point, radius, found)
+
+    def query(self, latitude_radians, longitude_radians, limit=10):
+        """Return the `limit` counselors nearest to a location.
+
+        Each result is a copy of the counselor with its `distance` in miles
+        added, nearest first.
+        """
+        point = unit_vector(latitude_radians, longitude_radians)
+
+        heap = []
+        self._nearest(self.tree, point, limit, heap)
+        if not heap:
+            return []
+
+        radius = (
+            sqrt(-heap[0][0]) * self.candidate_margin +
+            self.candidate_padding
+        )
+        candidates = []
+        self._within(self.tree, point, radius, candidates)
+
+        ranked = sorted(
+            (
+                distance_in_miles(
+                    self.locations[index][0],
+                    self.locations[index][1],
+                    latitude_radians,
+                    longitude_radians
+                ),
+                index
+            )
+            for index in candidates
+        )
 
-    response = connection.execute(sql, (latitude_radians, longitude_radians))
+        results = []
+        for distance, index in ranked[:limit]:
+            result = dict(self.counselors[index])
+            result['distance'] = distance
+            results.append(result)
 
-    results = []
-    for row in response:
-        result = json.loads(row[0])
-        result['distance'] = row[1]
-        results.append(result)
+        return results
 
-    return results
+
+def get_zipcode_data(index, zipcode, latitude_degrees, longitude_degrees):
+    return {
+        'zip': {
+            'zipcode': zipcode,
+            'lat': latitude_degrees,
+            'lng': longitude_degrees,
+        },
+        'counseling_agencies': index.query(
+            radians(latitude_degrees),
+            radians(longitude_degrees)
+        ),
+    }
+
+
+def render_counselor_html(template, zipcode, zipcode_data):
+    return template.render({
+        'zipcode': zipcode,
+        'zipcode_valid': True,
+        'api_json': zipcode_data,
+    })
 
 
 def generate_counselor_json(counselors, zipcodes, target):
-    connection = get_db_connection()
-    fill_db(connection, counselors)
+    index = CounselorIndex(counselors)
 
     logger.info('generating JSON into %s', target)
 
     for zipcode, (latitude_degrees, longitude_degrees) in zipcodes.items():
-        counselors = query_db(
-            connection,
-            radians(latitude_degrees),
-            radians(longitude_degrees)
+        zipcode_data = get_zipcode_data(
+            index, zipcode, latitude_degrees, longitude_degrees
         )
 
-        zipcode_data = {
-            'zip': {
-                'zipcode': zipcode,
-                'lat': latitude_degrees,
-                'lng': longitude_degrees,
-            },
-            'counseling_agencies': counselors,
-        }
-
         json_filename = os.path.join(target, '{}.json'.format(zipcode))
 
         with open(json_filename, 'w') as f:
             f.write(json.dumps(zipcode_data))
 
 
+# State shared by the ZIP code shards generated in one process.
+_worker_state = {}
+
+
+def _init_worker(counselors, json_target, html_target, previous_hashes):
+    _worker_state.update({
+        'index': CounselorIndex(counselors),
+        'json_target': json_target,
+        'html_target': html_target,
+        'template': (
+            loader.get_template(HTML_TEMPLATE_NAME) if html_target else None
+        ),
+        'previous_hashes': previous_hashes,
+    })
+
+
+def _generate_shard(zipcodes):
+    """Write the files for a list of (zipcode, (lat, lng)) pairs.
+
+    Files are only written for ZIP codes whose JSON has changed since the
+    previous run, or whose files are missing. Returns a dict of JSON hashes
+    for every ZIP code in the shard, and a list of the files written.
+    """
+    state = _worker_state
+    hashes = {}
+    changed = []
+
+    for zipcode, (latitude_degrees, longitude_degrees) in zipcodes:
+        zipcode_data = get_zipcode_data(
+            state['index'], zipcode, latitude_degrees, longitude_degrees
+        )
+        zipcode_json = json.dumps(zipcode_data)
+        digest = hashlib.md5(zipcode_json.encode('utf-8')).hexdigest()
+        hashes[zipcode] = digest
+
+        unchanged = state['previous_hashes'].get(zipcode) == digest
+
+        json_filename = os.path.join(
+            state['json_target'], '{}.json'.format(zipcode)
+        )
+        if not unchanged or not os.path.exists(json_filename):
+            with open(json_filename, 'w') as f:
+                f.write(zipcode_json)
+            changed.append(json_filename)
+
+        if state['template'] is None:
+            continue
+
+        html_filename = os.path.join(
+            state['html_target'], '{}.html'.format(zipcode)
+        )
+        if not unchanged or not os.path.exists(html_filename):
+            with open(html_filename, 'w') as f:
+                f.write(render_counselor_html(
+                    state['template'], zipcode, zipcode_data
+                ))
+            changed.append(html_filename)
+
+    return hashes, changed
+
+
+def get_hashes_filename(json_target):
+    """Return the default hashes file for a JSON output directory.
+
+    The file sits next to the directory, not in it, so that it isn't
+    uploaded with the per-ZIP JSON files.
+    """
+    return '{}.{}'.format(os.path.normpath(json_target), HASHES_FILENAME)
+
+
+def load_counselor_hashes(filename):
+    if not os.path.exists(filename):
+        return {}
+
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def save_counselor_hashes(filename, hashes):
+    with open(filename, 'w') as f:
+        json.dump(hashes, f, sort_keys=True)
+
+
+def generate_counselor_files(counselors, zipcodes, json_target,
+                             html_target=None, workers=1, force=False,
+                             hashes_filename=None):
+    """Generate JSON, and optionally HTML, files for changed ZIP codes.
+
+    ZIP codes are split into one shard per worker process, and HTML is
+    rendered straight from the generated data. A ZIP code's files are only
+    rewritten if its JSON differs from the previous run's, unless `force`
+    is set. The JSON hashes are kept in `hashes_filename`, which defaults
+    to get_hashes_filename(json_target). Returns a sorted list of the files
+    that were written.
+    """
+    if hashes_filename is None:
+        hashes_filename = get_hashes_filename(json_target)
+
+    previous_hashes = {} if force else load_counselor_hashes(hashes_filename)
+    initargs = (counselors, json_target, html_target, previous_hashes)
+
+    items = sorted(zipcodes.items())
+    shards = [items[i::workers] for i in range(workers)]
+
+    logger.info(
+        'generating files into %s using %d workers',
+        ', '.join(filter(None, (json_target, html_target))),
+        workers
+    )
+
+    if workers > 1:
+        with Pool(workers, initializer=_init_worker, initargs=initargs) as p:
+            results = p.map(_generate_shard, shards)
+    else:
+        _init_worker(*initargs)
+        results = [_generate_shard(shard) for shard in shards]
+
+    hashes = {}
+    changed = []
+    for shard_hashes, shard_changed in results:
+        hashes.update(shard_hashes)
+        changed.extend(shard_changed)
+
+    save_counselor_hashes(hashes_filename, hashes)
+
+    logger.info('wrote %d files for %d ZIP codes', len(changed), len(items))
+
+    return sorted(changed)
+
+
 def generate_counselor_html(source_dir, target_dir):
-    template_name = 'housing_counselor/pdf_selfcontained.html'
-    template = loader.get_template(template_name)
+    template = loader.get_template(HTML_TEMPLATE_NAME)
 
     for zipcode, filename in get_counselor_json_files(source_dir):
         with open(filename, 'r') as f:
             zipcode_data = json.loads(f.read())
 
-        html = template.render({
-            'zipcode': zipcode,
-            'zipcode_valid': True,
-            'api_json': zipcode_data,
-        })
+        html = render_counselor_html(template, zipcode, zipcode_data)
 
         html_filename = os.path.join(target_dir, '{}.html'.format(zipcode))
 
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+from housing_counselor.generator import CounselorIndex, get_zipcode_data
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of per-ZIP code responses kept in memory by each process.
+LOOKUP_CACHE_SIZE = 4096
+
+
+class CounselorDataset(object):
+    """Answers ZIP code lookups from counselor data held in memory."""
+
+    def __init__(self, counselors, zipcodes):
+        self.index = CounselorIndex(counselors)
+        self.zipcodes = zipcodes
+        self.lookup = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._lookup)
+
+    def _lookup(self, zipcode):
+        """Return the same data as the ZIP code's JSON file, or None."""
+        if zipcode not in self.zipcodes:
+            return None
+
+        latitude_degrees, longitude_degrees = self.zipcodes[zipcode]
+        return get_zipcode_data(
+            self.index, zipcode, latitude_degrees, longitude_degrees
+        )
+
+
+def save_counselor_dataset(counselors, zipcodes, path):
+    """Write the data behind a CounselorDataset to a file.
+
+    The file is replaced atomically, so processes that are reading it
+    never see a partial write.
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump({'counselors': counselors, 'zipcodes': zipcodes}, f)
+    os.replace(temporary_path, path)
+
+
+def load_counselor_dataset(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    return CounselorDataset(data['counselors'], data['zipcodes'])
+
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def get_counselor_dataset():
+    """Return the CounselorDataset for this process, or None.
+
+    The dataset is loaded from HOUSING_COUNSELOR_DATASET_PATH on first use,
+    and reloaded whenever the file is replaced. Returns None if no path is
+    configured or the file can't be read. A file that can't be loaded is
+    only retried once it is replaced.
+    """
+    path = getattr(settings, 'HOUSING_COUNSELOR_DATASET_PATH', None)
+    if not path:
+        return None
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    key = (path, mtime)
+    if _loaded.get('key') != key:
+        with _lock:
+            if _loaded.get('key') != key:
+                try:
+                    dataset = load_counselor_dataset(path)
+                except (OSError, ValueError, KeyError) as err:
+                    logger.warning(
+                        'could not load counselor dataset %s: %s', path, err
+                    )
+                    dataset = None
+                _loaded.update(key=key, dataset=dataset)
+
+    return _loaded['dataset']
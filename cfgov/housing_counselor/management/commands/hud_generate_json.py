@@ -1,19 +1,30 @@
+import argparse
 import logging
 
 from django.core.management.base import BaseCommand, CommandError
 
 from housing_counselor.cleaner import clean_counselors
 from housing_counselor.fetcher import fetch_counselors
-from housing_counselor.generator import generate_counselor_json
+from housing_counselor.generator import generate_counselor_files
 from housing_counselor.geocoder import (
     GazetteerZipCodeFile, GeocodedZipCodeCsv, geocode_counselors
 )
+from housing_counselor.lookup import save_counselor_dataset
 from housing_counselor.results_archiver import save_list
 
 
 logger = logging.getLogger(__name__)
 
 
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            '{} is not a positive integer'.format(value)
+        )
+    return number
+
+
 class Command(BaseCommand):
     help = 'Generate bulk housing counselor JSON data'
 
@@ -25,6 +36,21 @@ class Command(BaseCommand):
                             help='Census Gazetteer zipcode file')
         parser.add_argument('--archive-file-name',
                             help='Archive file output path', required=True)
+        parser.add_argument('--html-target',
+                            help='Also render HTML into this directory')
+        parser.add_argument('--workers', type=positive_int, default=1,
+                            help='Number of worker processes')
+        parser.add_argument('--manifest',
+                            help='Write a list of changed files to this path')
+        parser.add_argument('--force', action='store_true',
+                            help='Rewrite files even if they are unchanged')
+        parser.add_argument('--hashes-file',
+                            help='Where to keep the hashes of generated '
+                                 'JSON (default: next to the JSON output '
+                                 'directory)')
+        parser.add_argument('--dataset-file',
+                            help='Save the data used for in-process lookups '
+                                 'to this path')
 
     def handle(self, *args, **options):
         zipcode_csv_file = options['zipcode_csv_file']
@@ -54,5 +80,24 @@ class Command(BaseCommand):
         # Add in any missing latitude/longitude information for counselors.
         counselors = geocode_counselors(counselors, zipcodes=zipcodes)
 
-        # Generate JSON files for each zipcode.
-        generate_counselor_json(counselors, zipcodes, options['target'])
+        # Save the data that the site can use to answer lookups itself.
+        if options['dataset_file']:
+            save_counselor_dataset(
+                counselors, zipcodes, options['dataset_file']
+            )
+
+        # Generate JSON (and HTML) files for each changed zipcode.
+        changed = generate_counselor_files(
+            counselors,
+            zipcodes,
+            options['target'],
+            html_target=options['html_target'],
+            workers=options['workers'],
+            force=options['force'],
+            hashes_filename=options['hashes_file']
+        )
+
+        # List the changed files, so that only they need to be uploaded.
+        if options['manifest']:
+            with open(options['manifest'], 'w') as f:
+                f.writelines(filename + '\n' for filename in changed)
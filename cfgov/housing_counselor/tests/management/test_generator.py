@@ -1,11 +1,17 @@
 import json
 import os
+import random
 import shutil
 import tempfile
+from math import radians
 from unittest import TestCase
 
+import mock
+
 from housing_counselor.generator import (
-    distance_in_miles, generate_counselor_json, get_counselor_json_files
+    HASHES_FILENAME, CounselorIndex, distance_in_miles,
+    generate_counselor_files, generate_counselor_json,
+    get_counselor_json_files, get_hashes_filename
 )
 
 
@@ -20,6 +26,61 @@ class TestDistanceInMiles(TestCase):
         )
 
 
+class TestCounselorIndex(TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.counselors = [
+            {
+                'agc_ADDR_LATITUDE': rng.uniform(18, 65),
+                'agc_ADDR_LONGITUDE': rng.uniform(-170, -65),
+                'nme': 'Counselor {}'.format(i),
+            } for i in range(200)
+        ]
+        # Two counselors sharing a location.
+        self.counselors.append(dict(self.counselors[0], nme='Duplicate'))
+        self.locations = [
+            (rng.uniform(18, 65), rng.uniform(-170, -65)) for _ in range(50)
+        ]
+        self.locations.append((
+            self.counselors[0]['agc_ADDR_LATITUDE'],
+            self.counselors[0]['agc_ADDR_LONGITUDE'],
+        ))
+
+    def brute_force(self, latitude_radians, longitude_radians, limit=10):
+        ranked = sorted(
+            (
+                distance_in_miles(
+                    radians(c['agc_ADDR_LATITUDE']),
+                    radians(c['agc_ADDR_LONGITUDE']),
+                    latitude_radians,
+                    longitude_radians
+                ),
+                i
+            )
+            for i, c in enumerate(self.counselors)
+        )
+        return [
+            dict(self.counselors[i], distance=distance)
+            for distance, i in ranked[:limit]
+        ]
+
+    def test_query_matches_brute_force(self):
+        index = CounselorIndex(self.counselors)
+        for latitude, longitude in self.locations:
+            self.assertEqual(
+                json.dumps(index.query(radians(latitude), radians(longitude))),
+                json.dumps(self.brute_force(radians(latitude),
+                                            radians(longitude)))
+            )
+
+    def test_query_fewer_counselors_than_limit(self):
+        index = CounselorIndex(self.counselors[:3])
+        self.assertEqual(len(index.query(0.5, -1.5)), 3)
+
+    def test_query_no_counselors(self):
+        self.assertEqual(CounselorIndex([]).query(0.5, -1.5), [])
+
+
 class TestGeneratorCounselorJson(TestCase):
     def setUp(self):
         self.tempdir = tempfile.mkdtemp()
@@ -78,6 +139,135 @@ class TestGeneratorCounselorJson(TestCase):
                 self.assertAlmostEqual(a[k], b[k])
 
 
+class TestGenerateCounselorFiles(TestCase):
+    def setUp(self):
+        self.json_dir = tempfile.mkdtemp()
+        self.html_dir = tempfile.mkdtemp()
+
+        self.counselors = [
+            {'agc_ADDR_LATITUDE': 120, 'agc_ADDR_LONGITUDE': 98},
+            {'agc_ADDR_LATITUDE': 125, 'agc_ADDR_LONGITUDE': 99},
+        ]
+
+        self.zipcodes = {
+            '20001': (115.5, 97.5),
+            '20002': (130.3, 100.1),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.json_dir)
+        shutil.rmtree(self.html_dir)
+        hashes_filename = get_hashes_filename(self.json_dir)
+        if os.path.exists(hashes_filename):
+            os.remove(hashes_filename)
+
+    def test_generate_writes_json_and_hashes(self):
+        changed = generate_counselor_files(
+            self.counselors, self.zipcodes, self.json_dir
+        )
+        self.assertEqual(changed, [
+            os.path.join(self.json_dir, '20001.json'),
+            os.path.join(self.json_dir, '20002.json'),
+        ])
+        self.assertCountEqual(
+            os.listdir(self.json_dir),
+            ['20001.json', '20002.json']
+        )
+        self.assertEqual(
+            get_hashes_filename(self.json_dir),
+            self.json_dir + '.' + HASHES_FILENAME
+        )
+        self.assertTrue(os.path.exists(get_hashes_filename(self.json_dir)))
+
+    def test_generate_with_hashes_filename(self):
+        hashes_filename = os.path.join(self.html_dir, 'hashes.json')
+        generate_counselor_files(
+            self.counselors, self.zipcodes, self.json_dir,
+            hashes_filename=hashes_filename
+        )
+        self.assertTrue(os.path.exists(hashes_filename))
+        self.assertFalse(os.path.exists(get_hashes_filename(self.json_dir)))
+        self.assertEqual(
+            generate_counselor_files(
+                self.counselors, self.zipcodes, self.json_dir,
+                hashes_filename=hashes_filename
+            ),
+            []
+        )
+
+    def test_generate_matches_generate_counselor_json(self):
+        generate_counselor_files(self.counselors, self.zipcodes, self.json_dir)
+        generate_counselor_json(self.counselors, self.zipcodes, self.html_dir)
+        for zipcode in self.zipcodes:
+            filename = '{}.json'.format(zipcode)
+            with open(os.path.join(self.json_dir, filename)) as a, \
+                    open(os.path.join(self.html_dir, filename)) as b:
+                self.assertEqual(a.read(), b.read())
+
+    def test_generate_skips_unchanged_zipcodes(self):
+        generate_counselor_files(self.counselors, self.zipcodes, self.json_dir)
+        self.assertEqual(
+            generate_counselor_files(
+                self.counselors, self.zipcodes, self.json_dir
+            ),
+            []
+        )
+
+        self.counselors[0]['nme'] = 'New name'
+        self.zipcodes['20003'] = (200.0, 200.0)
+        self.assertEqual(
+            len(generate_counselor_files(
+                self.counselors, self.zipcodes, self.json_dir
+            )),
+            3
+        )
+
+    def test_generate_force_rewrites_everything(self):
+        generate_counselor_files(self.counselors, self.zipcodes, self.json_dir)
+        self.assertEqual(
+            len(generate_counselor_files(
+                self.counselors, self.zipcodes, self.json_dir, force=True
+            )),
+            2
+        )
+
+    @mock.patch('housing_counselor.generator.loader')
+    def test_generate_renders_html_from_data(self, mock_loader):
+        template = mock_loader.get_template.return_value
+        template.render.return_value = '<html></html>'
+        changed = generate_counselor_files(
+            self.counselors, self.zipcodes, self.json_dir,
+            html_target=self.html_dir
+        )
+        self.assertIn(os.path.join(self.html_dir, '20001.html'), changed)
+        self.assertEqual(template.render.call_count, 2)
+        context = template.render.call_args_list[0][0][0]
+        self.assertEqual(context['zipcode'], '20001')
+        self.assertEqual(context['api_json']['zip']['zipcode'], '20001')
+
+        # Missing HTML is regenerated even if the JSON hasn't changed.
+        os.remove(os.path.join(self.html_dir, '20002.html'))
+        self.assertEqual(
+            generate_counselor_files(
+                self.counselors, self.zipcodes, self.json_dir,
+                html_target=self.html_dir
+            ),
+            [os.path.join(self.html_dir, '20002.html')]
+        )
+
+    def test_generate_with_workers(self):
+        changed = generate_counselor_files(
+            self.counselors, self.zipcodes, self.json_dir, workers=2
+        )
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(
+            generate_counselor_files(
+                self.counselors, self.zipcodes, self.json_dir, workers=2
+            ),
+            []
+        )
+
+
 class TestGetCounselorJsonFiles(TestCase):
     def setUp(self):
         self.tempdir = tempfile.mkdtemp()
@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+
+class HudGenerateJsonTests(SimpleTestCase):
+    def call_command(self, *args):
+        call_command(
+            'hud_generate_json', 'jsons', '--archive-file-name', 'archive',
+            *args
+        )
+
+    def test_workers_must_be_positive(self):
+        for workers in ('0', '-1'):
+            with self.assertRaises(CommandError):
+                self.call_command('--workers', workers)
+
+    def test_workers_must_be_an_integer(self):
+        with self.assertRaises(CommandError):
+            self.call_command('--workers', 'many')
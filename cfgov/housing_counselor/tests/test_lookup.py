@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+import mock
+
+from housing_counselor import lookup
+from housing_counselor.generator import generate_counselor_json
+from housing_counselor.lookup import (
+    CounselorDataset, get_counselor_dataset, save_counselor_dataset
+)
+
+
+class CounselorLookupTestCase(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.dataset_file = os.path.join(self.tempdir, 'dataset.json')
+
+        self.counselors = [
+            {'agc_ADDR_LATITUDE': 120, 'agc_ADDR_LONGITUDE': 98},
+            {'agc_ADDR_LATITUDE': 125, 'agc_ADDR_LONGITUDE': 99},
+        ]
+
+        self.zipcodes = {
+            '20001': (115.5, 97.5),
+            '20002': (130.3, 100.1),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_lookup_matches_generated_json(self):
+        generate_counselor_json(self.counselors, self.zipcodes, self.tempdir)
+        dataset = CounselorDataset(self.counselors, self.zipcodes)
+        with open(os.path.join(self.tempdir, '20001.json')) as f:
+            self.assertEqual(dataset.lookup('20001'), json.load(f))
+
+    def test_lookup_unknown_zipcode(self):
+        dataset = CounselorDataset(self.counselors, self.zipcodes)
+        self.assertIsNone(dataset.lookup('99999'))
+
+    def test_lookup_is_cached(self):
+        dataset = CounselorDataset(self.counselors, self.zipcodes)
+        self.assertIs(dataset.lookup('20001'), dataset.lookup('20001'))
+
+    def test_no_dataset_configured(self):
+        with self.settings(HOUSING_COUNSELOR_DATASET_PATH=None):
+            self.assertIsNone(get_counselor_dataset())
+
+    def test_missing_dataset_file(self):
+        with self.settings(HOUSING_COUNSELOR_DATASET_PATH=self.dataset_file):
+            self.assertIsNone(get_counselor_dataset())
+
+    def test_dataset_is_loaded_and_reloaded(self):
+        save_counselor_dataset(
+            self.counselors, self.zipcodes, self.dataset_file
+        )
+        with override_settings(
+            HOUSING_COUNSELOR_DATASET_PATH=self.dataset_file
+        ):
+            dataset = get_counselor_dataset()
+            self.assertIsNotNone(dataset.lookup('20002'))
+            self.assertIs(get_counselor_dataset(), dataset)
+
+            save_counselor_dataset(
+                self.counselors, {'20003': (1.0, 2.0)}, self.dataset_file
+            )
+            # Make sure the replacement has a different modification time.
+            os.utime(self.dataset_file, (0, 0))
+            reloaded = get_counselor_dataset()
+            self.assertIsNot(reloaded, dataset)
+            self.assertIsNone(reloaded.lookup('20002'))
+            self.assertIsNotNone(reloaded.lookup('20003'))
+
+    def test_corrupt_dataset_is_not_reloaded_until_replaced(self):
+        with open(self.dataset_file, 'w') as f:
+            f.write('{"counselors": [')
+        with override_settings(
+            HOUSING_COUNSELOR_DATASET_PATH=self.dataset_file
+        ), mock.patch.object(
+            lookup, 'load_counselor_dataset',
+            wraps=lookup.load_counselor_dataset
+        ) as mock_load:
+            with self.assertLogs('housing_counselor.lookup', 'WARNING'):
+                self.assertIsNone(get_counselor_dataset())
+            self.assertIsNone(get_counselor_dataset())
+            self.assertEqual(mock_load.call_count, 1)
+
+            save_counselor_dataset(
+                self.counselors, self.zipcodes, self.dataset_file
+            )
+            os.utime(self.dataset_file, (0, 0))
+            self.assertIsNotNone(get_counselor_dataset())
+            self.assertEqual(mock_load.call_count, 2)
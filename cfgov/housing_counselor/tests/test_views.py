@@ -63,6 +63,33 @@ class HousingCounselorViewTestCase(TestCase):
         self.assertIn('12345.pdf', response.context_data['pdf_url'])
 
 
+class HousingCounselorGetCounselorsTestCase(TestCase):
+
+    @mock.patch('housing_counselor.views.requests_retry_session')
+    @mock.patch('housing_counselor.views.get_counselor_dataset')
+    def test_get_counselors_from_dataset(self, mock_dataset, mock_session):
+        mock_dataset.return_value.lookup.return_value = {'zip': {}}
+        self.assertEqual(
+            HousingCounselorView.get_counselors(None, '20001'),
+            {'zip': {}}
+        )
+        mock_session.assert_not_called()
+
+    @mock.patch('housing_counselor.views.requests_retry_session')
+    @mock.patch('housing_counselor.views.get_counselor_dataset')
+    def test_get_counselors_falls_back_to_s3(self, mock_dataset, mock_session):
+        mock_dataset.return_value.lookup.return_value = None
+        response = mock_session.return_value.get.return_value
+        response.json.return_value = {'zip': {'zipcode': '20001'}}
+        self.assertEqual(
+            HousingCounselorView.get_counselors(None, '20001'),
+            {'zip': {'zipcode': '20001'}}
+        )
+        mock_session.return_value.get.assert_called_once_with(
+            HousingCounselorView.s3_json_url('20001')
+        )
+
+
 @override_settings(AWS_STORAGE_BUCKET_NAME='foo.bucket')
 class HousingCounselorPDFViewTestCase(TestCase):
 
@@ -10,6 +10,7 @@ import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+from housing_counselor.lookup import get_counselor_dataset
 from legacy.forms import HousingCounselorForm
 
 
@@ -101,9 +102,18 @@ class HousingCounselorView(TemplateView, HousingCounselorS3URLMixin):
     def get_counselors(cls, request, zipcode):
         """Return list of housing counselors closest to a given zipcode.
 
+        Results come from the in-memory counselor dataset, if one is
+        configured and knows the ZIP code, and otherwise from S3.
+
         Raises requests.HTTPError on for nonexistent ZIP code.
         Raises requests.exceptions.ConnectionError for aborted connections.
         """
+        dataset = get_counselor_dataset()
+        if dataset is not None:
+            zipcode_data = dataset.lookup(zipcode)
+            if zipcode_data is not None:
+                return zipcode_data
+
         api_url = cls.s3_json_url(zipcode)
 
         response = requests_retry_session().get(api_url)
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from mega_menu.frontend_conversion import FrontendConverter
+from mega_menu.models import Menu
+
+
+# Menus are kept in their own cache, shared by every host, so that a change
+# saved on one host invalidates the menus on all of them.
+MEGA_MENU_CACHE_ALIAS = 'mega_menu'
+
+# Cached menus are cleared when they change, so the timeout only bounds how
+# long a change that doesn't clear them, like a page move, can go unseen.
+MEGA_MENU_CACHE_TIMEOUT = 60 * 60
+
+
+def get_mega_menu_cache():
+    return caches[MEGA_MENU_CACHE_ALIAS]
+
+
+def invalidate_mega_menus():
+    """Drop every cached mega menu, for all languages and sites."""
+    get_mega_menu_cache().clear()
+
+
+def select_menu(language=None):
+    """Return the Menu for a language, falling back to the default one."""
+    # First try to find a menu for the given language.
+    if language:
+        try:
+            return Menu.objects.get(language=language)
+        except Menu.DoesNotExist:
+            pass
+
+    # Next try to find a menu for the default Django language.
+    try:
+        return Menu.objects.get(language=settings.LANGUAGE_CODE[:2])
+    except Menu.DoesNotExist:
+        pass
+
+    # If we can't find a menu, return None.
+    return None
+
+
+def get_menu_items(language=None, site=None, request=None):
+    """Return the unselected frontend menu items for a language and site.
+
+    Returns None if there is no menu. The items are cached until a menu is
+    saved or a page is published or unpublished; see
+    FrontendConverter.get_unselected_menu_items.
+    """
+    cache = get_mega_menu_cache()
+    key = 'mega_menu:{}:{}'.format(language or '', site.pk if site else '')
+
+    # Cache a dict, so that a missing menu is cached as well.
+    cached = cache.get(key)
+    if cached is None:
+        menu = select_menu(language)
+        cached = {'menu_items': None}
+
+        if menu:
+            converter = FrontendConverter(
+                menu,
+                request=request,
+                current_site=site
+            )
+            cached['menu_items'] = converter.get_unselected_menu_items()
+
+        cache.set(key, cached, MEGA_MENU_CACHE_TIMEOUT)
+
+    return cached['menu_items']
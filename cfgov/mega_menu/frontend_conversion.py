@@ -1,29 +1,101 @@
 from itertools import chain
 
 
+def select_link(link, path, exact_only=False):
+    """Return the link, or a copy of it marked as selected for path."""
+    url = link.get('url')
+
+    if exact_only:
+        selected = url and path == url
+    else:
+        selected = url and path.startswith(url)
+
+    return dict(link, selected=True) if selected else link
+
+
+def select_menu_items(menu_items, path):
+    """Mark the menu items and links that match the current path.
+
+    Menu items come from FrontendConverter.get_unselected_menu_items. They
+    aren't modified; selected items and links are returned as copies.
+    """
+    return [select_menu_item(menu_item, path) for menu_item in menu_items]
+
+
+def select_menu_item(menu_item, path):
+    selected_item = dict(menu_item)
+
+    # Normally we want to mark menu links as selected if the current
+    # request is either on that link or one of its children; this lets us
+    # properly highlight the menu if on the child of a menu link. But we
+    # don't want to do this for overview links, which are always the parent
+    # of all links beneath them.
+    selected_item['overview'] = select_link(
+        menu_item['overview'], path, exact_only=True
+    )
+
+    if 'nav_groups' in menu_item:
+        selected_item['nav_groups'] = [
+            dict(column, nav_items=[
+                select_link(link, path) for link in column['nav_items']
+            ])
+            for column in menu_item['nav_groups']
+        ]
+
+    for key in ('featured_items', 'other_items'):
+        if key in menu_item:
+            selected_item[key] = [
+                select_link(link, path) for link in menu_item[key]
+            ]
+
+    # If the current request either matches or is a child of this menu's
+    # links (overview, other, and columns, deliberately excluding
+    # featured), then we mark this menu as selected.
+    for link in chain(
+        [menu_item['overview']],
+        menu_item.get('other_items', []),
+        *chain(
+            column['nav_items']
+            for column in menu_item.get('nav_groups', [])
+        )
+    ):
+        url = link.get('url')
+        if url and path.startswith(url):
+            selected_item['selected'] = True
+            break
+
+    return selected_item
+
+
 class FrontendConverter:
-    def __init__(self, menu, request=None):
+    def __init__(self, menu, request=None, current_site=None):
         self.menu = menu
         self.request = request
+        self.current_site = current_site
 
     def get_menu_items(self):
+        menu_items = self.get_unselected_menu_items()
+
+        if self.request is None:
+            return menu_items
+
+        return select_menu_items(menu_items, self.request.path)
+
+    def get_unselected_menu_items(self):
+        """Convert the menu without marking anything as selected.
+
+        The result depends only on the menu, its linked pages, and the
+        current site, so it can be cached and shared between requests.
+        """
         return [
             self.get_menu_item(submenu.value) for submenu in self.menu.submenus
         ]
 
     def get_menu_item(self, submenu):
-        # Normally we want to mark menu links as selected if the current
-        # request is either on that link or one of its children; this lets us
-        # properly highlight the menu if on the child of a menu link. But we
-        # don't want to do this for overview links, which are always the parent
-        # of all links beneath them.
-        overview_link = self.make_link(
-            {
-                'page': submenu.get('overview_page'),
-                'text': submenu.get('title'),
-            },
-            selected_exact_only=True
-        )
+        overview_link = self.make_link({
+            'page': submenu.get('overview_page'),
+            'text': submenu.get('title'),
+        })
 
         menu_item = {'overview': overview_link}
 
@@ -39,19 +111,6 @@ class FrontendConverter:
         if other_links:
             menu_item['other_items'] = other_links
 
-        # If the current request either matches or is a child of this menu's
-        # links (overview, other, and columns, deliberately excluding
-        # featured), then we mark this menu as selected.
-        for link in chain(
-            [overview_link],
-            other_links,
-            *chain(column['nav_items'] for column in columns)
-        ):
-            url = link.get('url')
-            if url and self.request.path.startswith(url):
-                menu_item['selected'] = True
-                break
-
         return menu_item
 
     def get_columns(self, submenu):
@@ -77,13 +136,16 @@ class FrontendConverter:
     def make_links(self, values):
         return list(map(self.make_link, values)) if values else []
 
-    def make_link(self, value, selected_exact_only=False):
+    def make_link(self, value):
         page = value.get('page')
         text = value.get('text')
         icon = value.get('icon')
 
         if page:
-            url = page.get_url(request=self.request)
+            url = page.get_url(
+                request=self.request,
+                current_site=self.current_site
+            )
 
             link = {
                 'url': url,
@@ -99,12 +161,4 @@ class FrontendConverter:
         if icon:
             link['icon'] = icon
 
-        if selected_exact_only:
-            selected = url and self.request.path == url
-        else:
-            selected = url and self.request.path.startswith(url)
-
-        if selected:
-            link['selected'] = True
-
         return link
@@ -1,38 +1,27 @@
-from django.conf import settings
+from wagtail.core.models import Site
 
 from jinja2 import contextfunction
 from jinja2.ext import Extension
 
-from mega_menu.models import Menu
-
-
-def select_menu_for_context(context):
-    # First try to find a menu for the language from the context.
-    language = context.get('language')
-
-    if language:
-        try:
-            return Menu.objects.get(language=language)
-        except Menu.DoesNotExist:
-            pass
-
-    # Next try to find a menu for the default Django language.
-    try:
-        return Menu.objects.get(language=settings.LANGUAGE_CODE[:2])
-    except Menu.DoesNotExist:
-        pass
-
-    # If we can't find a menu, return None.
-    return None
+from mega_menu.cache import get_menu_items
+from mega_menu.frontend_conversion import select_menu_items
 
 
 def get_mega_menu_content(context):
-    menu = select_menu_for_context(context)
+    request = context.get('request')
+    site = Site.find_for_request(request)
+
+    menu_items = get_menu_items(
+        context.get('language'),
+        site=site,
+        request=request
+    )
 
-    if not menu:
-        return None
+    if menu_items is None or request is None:
+        return menu_items
 
-    return menu.get_content_for_frontend(request=context.get('request'))
+    # Only which items are selected depends on the request.
+    return select_menu_items(menu_items, request.path)
 
 
 class MegaMenuExtension(Extension):
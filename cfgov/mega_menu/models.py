@@ -1,8 +1,11 @@
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from wagtail.admin.edit_handlers import FieldPanel, StreamFieldPanel
 from wagtail.core.fields import StreamField
+from wagtail.core.signals import page_published, page_unpublished
 
 from mega_menu.blocks import MenuStreamBlock
 from mega_menu.frontend_conversion import FrontendConverter
@@ -30,3 +33,15 @@ class Menu(models.Model):
 
     def get_content_for_frontend(self, request=None):
         return FrontendConverter(self, request=request).get_menu_items()
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+@receiver(page_published)
+@receiver(page_unpublished)
+def mega_menu_changed(sender, **kwargs):
+    # Menus embed page titles and URLs, and a page's URL also changes when
+    # one of its ancestors is published with a new slug, so any publish
+    # invalidates every menu.
+    from mega_menu.cache import invalidate_mega_menus
+    invalidate_mega_menus()
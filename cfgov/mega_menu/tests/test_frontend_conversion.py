@@ -5,7 +5,7 @@ from django.utils.text import slugify
 
 from wagtail.core.models import Page, Site
 
-from mega_menu.frontend_conversion import FrontendConverter
+from mega_menu.frontend_conversion import FrontendConverter, select_menu_items
 from mega_menu.models import Menu
 
 
@@ -182,3 +182,33 @@ class FrontendConverterTests(TestCase):
                 ],
             },
         ])
+
+    def test_unselected_menu_items_do_not_depend_on_request(self):
+        converter = FrontendConverter(self.menu, request=self.request)
+        unselected = converter.get_unselected_menu_items()
+        self.assertNotIn('selected', json.dumps(unselected))
+
+        selected = select_menu_items(unselected, self.request.path)
+        self.assertEqual(selected, self.do_conversion(self.menu))
+
+    def test_selecting_menu_items_does_not_modify_them(self):
+        unselected = FrontendConverter(
+            self.menu, request=self.request
+        ).get_unselected_menu_items()
+        before = json.dumps(unselected)
+
+        select_menu_items(unselected, '/consumer-tools/')
+        select_menu_items(unselected, '/financial-well-being/')
+        self.assertEqual(json.dumps(unselected), before)
+
+    def test_other_link_selects_its_menu_item(self):
+        unselected = FrontendConverter(
+            self.menu, request=self.request
+        ).get_unselected_menu_items()
+        menu_items = select_menu_items(
+            unselected, '/financial-well-being/child/'
+        )
+        self.assertNotIn('selected', menu_items[0])
+        self.assertTrue(menu_items[1]['selected'])
+        self.assertNotIn('selected', menu_items[1]['overview'])
+        self.assertTrue(menu_items[1]['other_items'][0]['selected'])
@@ -1,6 +1,8 @@
 import json
 
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
+
+from wagtail.core.models import Page, Site
 
 from mega_menu.jinja2tags import get_mega_menu_content
 from mega_menu.models import Menu
@@ -48,5 +50,82 @@ class MegaMenuTests(TestCase):
 
     def test_renders_in_single_database_query(self):
         request = RequestFactory().get('/')
+        Site.find_for_request(request)
         with self.assertNumQueries(1):
             get_mega_menu_content({'request': request})
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-mega-menu-default',
+    },
+    'mega_menu': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-mega-menu',
+    },
+})
+class MegaMenuCacheTests(TestCase):
+    def setUp(self):
+        root_page = Site.objects.get(is_default_site=True).root_page
+        self.page = Page(title='Consumer Tools', slug='consumer-tools')
+        root_page.add_child(instance=self.page)
+
+        self.menu = Menu.objects.create(language='en', submenus=json.dumps([
+            {
+                'type': 'submenu',
+                'value': {'overview_page': self.page.pk},
+            },
+        ]))
+
+    def get_request(self, path='/'):
+        request = RequestFactory().get(path)
+        Site.find_for_request(request)
+        return request
+
+    def get_content(self, path='/', **context):
+        context['request'] = self.get_request(path)
+        return get_mega_menu_content(context)
+
+    def test_cached_menu_renders_without_database_queries(self):
+        content = self.get_content()
+        request = self.get_request()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_mega_menu_content({'request': request}),
+                content
+            )
+
+    def test_selection_depends_on_request_path(self):
+        self.assertNotIn('selected', self.get_content('/')[0])
+        self.assertTrue(self.get_content('/consumer-tools/')[0]['selected'])
+        self.assertNotIn('selected', self.get_content('/')[0])
+
+    def test_languages_are_cached_separately(self):
+        Menu.objects.create(language='es', submenus=json.dumps([
+            {'type': 'submenu', 'value': {'title': 'Spanish'}},
+        ]))
+        self.assertIn('Consumer Tools', json.dumps(self.get_content()))
+        self.assertIn(
+            'Spanish',
+            json.dumps(self.get_content(language='es'))
+        )
+
+    def test_saving_menu_invalidates_cache(self):
+        self.get_content()
+        self.menu.submenus = json.dumps([
+            {'type': 'submenu', 'value': {'title': 'Updated'}},
+        ])
+        self.menu.save()
+        self.assertIn('Updated', json.dumps(self.get_content()))
+
+    def test_deleting_menu_invalidates_cache(self):
+        self.get_content()
+        self.menu.delete()
+        self.assertIsNone(self.get_content())
+
+    def test_publishing_page_invalidates_cache(self):
+        self.get_content()
+        self.page.title = 'Updated Tools'
+        self.page.save_revision().publish()
+        self.assertIn('Updated Tools', json.dumps(self.get_content()))
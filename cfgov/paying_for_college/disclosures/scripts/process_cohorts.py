@@ -1,11 +1,11 @@
 import datetime
 import logging
+from bisect import bisect_right
+from collections import defaultdict
 
 import localflavor
 
-from paying_for_college.models.disclosures import (
-    DEFAULT_EXCLUSIONS, HIGHEST_DEGREES, School
-)
+from paying_for_college.models.disclosures import DEFAULT_EXCLUSIONS, School
 
 
 STATES = sorted(
@@ -13,7 +13,12 @@ STATES = sorted(
     [tup[0] for tup in localflavor.us.us_states.NON_CONTIGUOUS_STATES] +
     ['PR']
 )
-DEGREE_COHORTS = {k: [] for k in HIGHEST_DEGREES.keys()}
+METRICS = ['grad_rate', 'repay_3yr', 'median_total_debt']
+COHORT_FIELDS = [
+    'cohort_ranking_by_state',
+    'cohort_ranking_by_control',
+    'cohort_ranking_by_highest_degree',
+]
 logger = logging.getLogger(__name__)
 
 
@@ -25,106 +30,125 @@ def get_grad_level(school):
         return school.degrees_highest
 
 
-def build_base_cohorts():
+def get_base_query():
     """
-    Pre-build the base highest-degree cohorts.
+    Return the schools to rank.
 
     DEFAULT_EXCLUSIONS are the primary keys for the home offices of schools
     or school systems, plus our fake demo school, 999999.
     """
-    global DEGREE_COHORTS
-    base_query = School.objects.filter(
+    return School.objects.filter(
         operating=True, state__in=STATES).exclude(
         pk__in=DEFAULT_EXCLUSIONS).exclude(
             degrees_highest='')
-    for key in DEGREE_COHORTS:
-        DEGREE_COHORTS[key] += [
-            school for school in base_query if get_grad_level(school) == key
-        ]
-    return base_query
 
 
-def calculate_percentile_rank(array, score):
-    """Get a school score's percentile rank from an array of cohort scores."""
-    true_false_array = [value <= score for value in array]
-    if len(true_false_array) == 0:
-        return
-    raw_rank = float(sum(true_false_array)) / len(true_false_array)
-    return int(round(raw_rank * 100))
+class Cohort(object):
+    """A cohort's size, plus its sorted values for each metric."""
+
+    def __init__(self):
+        self.size = 0
+        self.values = {metric: [] for metric in METRICS}
+
+    def add(self, school):
+        self.size += 1
+        for metric in METRICS:
+            value = getattr(school, metric)
+            if value is not None:
+                self.values[metric].append(float(value))
+
+    def sort(self):
+        for values in self.values.values():
+            values.sort()
 
+    def rank(self, school, metric):
+        """
+        Return a school's percentile rank among the cohort for a metric.
 
-def rank_by_metric(school, cohort, metric):
-    """Return a school's percentile rank among a cohort by 3 metrics."""
-    values = [
-        getattr(s, metric) for s in cohort if getattr(s, metric) is not None
-    ]
-    payload = {'cohort_count': len(values)}
-    array = [float(val) for val in values]
-    target_value = float(getattr(school, metric))
-    payload.update({
-        'percentile_rank': calculate_percentile_rank(array, target_value)
-    })
-    return payload
+        The rank is the share of the cohort's values at or below the
+        school's value, counted by a bisection of the sorted values.
+        """
+        values = self.values[metric]
+        payload = {'cohort_count': len(values)}
+        if not values:
+            payload['percentile_rank'] = None
+            return payload
+        target_value = float(getattr(school, metric))
+        raw_rank = float(bisect_right(values, target_value)) / len(values)
+        payload['percentile_rank'] = int(round(raw_rank * 100))
+        return payload
+
+
+def get_cohort_keys(school):
+    """
+    Return the keys of a school's degree, state and control cohorts.
+
+    For school control, we want cohorts only for public and private;
+    we do not want a special cohort of for-profit schools, and schools
+    without a control value don't get a control cohort.
+    """
+    grad_level = get_grad_level(school)
+    control_key = None
+    if school.control:
+        control_key = (grad_level, school.control == 'Public')
+    return grad_level, (grad_level, school.state), control_key
+
+
+def build_cohorts(schools):
+    """Group schools into degree, state and control cohorts in one pass."""
+    cohorts = defaultdict(Cohort)
+    for school in schools:
+        grad_level = get_grad_level(school)
+        cohorts[grad_level].add(school)
+        cohorts[(grad_level, school.state)].add(school)
+        # Schools without a control value count as private.
+        cohorts[(grad_level, school.control == 'Public')].add(school)
+    for cohort in cohorts.values():
+        cohort.sort()
+    return cohorts
+
+
+def rank_school(school, cohorts):
+    """Set a school's cohort rankings by degree, control, and state."""
+    by_degree = {}
+    by_state = {}
+    by_control = {}
+    degree_key, state_key, control_key = get_cohort_keys(school)
+    for metric in METRICS:
+        if getattr(school, metric) is None:
+            by_state.update({metric: None})
+            by_control.update({metric: None})
+            by_degree.update({metric: None})
+            continue
+        for by_cohort, key in ((by_state, state_key),
+                               (by_control, control_key),
+                               (by_degree, degree_key)):
+            if key in cohorts:
+                by_cohort.update({metric: cohorts[key].rank(school, metric)})
+    school.cohort_ranking_by_state = by_state
+    school.cohort_ranking_by_control = by_control
+    school.cohort_ranking_by_highest_degree = by_degree
 
 
 def run(single_school=None):
-    """Get percentile rankings for schools by degree, control, and state."""
-    count = 0
+    """
+    Get percentile rankings for schools by degree, control, and state.
+
+    Schools are grouped into cohorts once, and each cohort's metric values
+    are sorted, so every ranking is a binary search. Rankings are saved
+    with one bulk_update.
+    """
     starter = datetime.datetime.now()
-    base_query = build_base_cohorts()
+    schools = list(get_base_query())
+    cohorts = build_cohorts(schools)
     if single_school:
-        base_query = base_query.filter(pk=single_school)
-    for school in base_query:
-        by_degree = {}
-        by_state = {}
-        by_control = {}
-        count += 1
-        if count % 500 == 0:  # pragma: no cover
-            logger.info("{} schools processed".format(count))
-        # degree_cohort is the default, national base cohort
-        # base query weeds out schools without state or degrees_highest values
-        degree_cohort = DEGREE_COHORTS.get(get_grad_level(school))
-        state_cohort = [
-            s for s in degree_cohort
-            if s
-            and s.state
-            and s.state == school.state
+        schools = [
+            school for school in schools if school.pk == int(single_school)
         ]
-        # For school control, we want cohorts only for public and private;
-        # We do not want a special cohort of for-profit schools
-        if not school.control:
-            control_cohort = None
-        elif school.control == 'Public':
-            control_cohort = [
-                s for s in degree_cohort if s.control == school.control
-            ]
-        else:
-            control_cohort = [
-                s for s in degree_cohort if s.control != 'Public'
-            ]
-        for metric in ['grad_rate', 'repay_3yr', 'median_total_debt']:
-            if getattr(school, metric) is None:
-                by_state.update({metric: None})
-                by_control.update({metric: None})
-                by_degree.update({metric: None})
-            else:
-                if state_cohort:
-                    by_state.update({
-                        metric: rank_by_metric(school, state_cohort, metric)
-                    })
-                if control_cohort:
-                    by_control.update({
-                        metric: rank_by_metric(school, control_cohort, metric)
-                    })
-                if degree_cohort:
-                    by_degree.update({
-                        metric: rank_by_metric(school, degree_cohort, metric)
-                    })
-        school.cohort_ranking_by_state = by_state
-        school.cohort_ranking_by_control = by_control
-        school.cohort_ranking_by_highest_degree = by_degree
-        school.save()
+    for school in schools:
+        rank_school(school, cohorts)
+    School.objects.bulk_update(schools, COHORT_FIELDS, batch_size=500)
     logger.info("\nCohort script took {} to process {} schools".format(
         datetime.datetime.now() - starter,
-        count
+        len(schools)
     ))
@@ -239,23 +239,65 @@ class TestScripts(django.test.TestCase):
             None
         )
 
-    def test_build_base_cohorts(self):
+    def test_build_cohorts(self):
         school = School.objects.get(pk=100654)
-        base_query = process_cohorts.build_base_cohorts()
-        cohort = process_cohorts.DEGREE_COHORTS.get(school.degrees_highest)
-        metric = 'grad_rate'
+        schools = list(process_cohorts.get_base_query())
+        cohorts = process_cohorts.build_cohorts(schools)
+        cohort = cohorts[process_cohorts.get_grad_level(school)]
+        self.assertEqual(len(schools), 6)
         self.assertEqual(
-            base_query.count(), 6)
+            cohort.rank(school, 'grad_rate').get('percentile_rank'),
+            80
+        )
+
+    def test_cohort_rank_counts_values_at_or_below(self):
+        schools = list(process_cohorts.get_base_query())
+        cohorts = process_cohorts.build_cohorts(schools)
+        for school in schools:
+            grad_level = process_cohorts.get_grad_level(school)
+            degree_cohort = [
+                s for s in schools
+                if process_cohorts.get_grad_level(s) == grad_level
+            ]
+            for metric in process_cohorts.METRICS:
+                if getattr(school, metric) is None:
+                    continue
+                values = [
+                    float(getattr(s, metric)) for s in degree_cohort
+                    if getattr(s, metric) is not None
+                ]
+                at_or_below = [
+                    value for value in values
+                    if value <= float(getattr(school, metric))
+                ]
+                self.assertEqual(
+                    cohorts[grad_level].rank(school, metric),
+                    {
+                        'cohort_count': len(values),
+                        'percentile_rank': int(round(
+                            float(len(at_or_below)) / len(values) * 100
+                        )),
+                    }
+                )
+
+    @unittest.skipUnless(
+        connection.vendor == 'postgresql', 'PostgreSQL-dependent')
+    def test_run_cohorts_saves_in_bulk(self):
+        with mock.patch.object(School, 'save') as mock_save:
+            process_cohorts.run()
+        mock_save.assert_not_called()
         self.assertEqual(
-            process_cohorts.rank_by_metric(school, cohort, metric).get(
-                'percentile_rank'),
+            School.objects.get(
+                pk=100654
+            ).cohort_ranking_by_highest_degree['grad_rate']['percentile_rank'],
             80
         )
 
-    def test_percentile_rank_blank_array(self):
-        self.assertIs(
-            process_cohorts.calculate_percentile_rank([], 0.50),
-            None
+    def test_cohort_rank_empty_cohort(self):
+        school = School.objects.get(pk=100654)
+        self.assertEqual(
+            process_cohorts.Cohort().rank(school, 'grad_rate'),
+            {'cohort_count': 0, 'percentile_rank': None}
         )
 
     @unittest.skipUnless(
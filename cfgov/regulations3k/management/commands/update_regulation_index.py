@@ -2,8 +2,13 @@ import logging
 
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from haystack import connections as haystack_connections
+from haystack.utils import get_identifier
 
-from regulations3k.models import Part, Section
+from elasticsearch.helpers import bulk
+
+from regulations3k.models import Part, Section, SectionParagraph
+from regulations3k.models.django import mark_indexed
 
 
 logger = logging.getLogger(__name__)
@@ -14,36 +19,85 @@ def _run_haystack_update():
     call_command('update_index', 'regulations3k', '--remove')
 
 
+def _update_haystack_documents(changed, removed, using='default'):
+    """
+    Push only changed paragraphs to Elasticsearch, using the bulk API.
+
+    `changed` is a list of SectionParagraphs to (re-)index, and `removed`
+    a list of pks of SectionParagraphs whose documents should be deleted.
+    """
+    connection = haystack_connections[using]
+    backend = connection.get_backend()
+    if changed:
+        index = connection.get_unified_index().get_index(SectionParagraph)
+        # Reload so the index can follow section relations without a query
+        # per paragraph.
+        paragraphs = SectionParagraph.objects.filter(
+            pk__in=[graph.pk for graph in changed]
+        ).select_related('section__subpart__version__part')
+        backend.update(index, paragraphs)
+    if removed:
+        bulk(
+            backend.conn,
+            [{
+                '_op_type': 'delete',
+                '_id': get_identifier(SectionParagraph(pk=pk)),
+            } for pk in removed],
+            index=backend.index_name,
+            doc_type='modelresult',
+            raise_on_error=False,
+        )
+
+
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Re-index every regulations3k document instead of only '
+                 'the paragraphs that changed.'
+        )
+
     def handle(self, *args, **options):
-        """Extract paragraphs and run Haystack's `update_index` command."""
+        """Extract paragraphs and index the ones that changed."""
         counter = {
             'created': 0,
+            'updated': 0,
             'deleted': 0,
             'kept': 0,
             'dupes': [],
+            'changed': [],
+            'removed': [],
         }
         regulations = Part.objects.all()
         versions = [part.effective_version for part in regulations
                     if part.effective_version]
-        sections = Section.objects.filter(subpart__version__in=versions)
+        sections = Section.objects.filter(
+            subpart__version__in=versions
+        ).select_related('subpart__version__part')
         for section in sections:
             section_count = section.extract_graphs()
-            for key in ['created', 'deleted', 'kept']:
+            for key in ['created', 'updated', 'deleted', 'kept']:
                 counter[key] += section_count.get(key, 0)
-            counter['dupes'] += section_count['dupes']
+            for key in ['dupes', 'changed', 'removed']:
+                counter[key] += section_count[key]
         dupes = sorted(set(counter['dupes']))
         logger.info(
             "Section paragraphs have been extracted for {} regulations.\n"
-            "{} were created, {} were unchanged, {} were deleted, and "
-            "{} dupes were found".format(
+            "{} were created, {} were updated, {} were unchanged, "
+            "{} were deleted, and {} dupes were found".format(
                 regulations.count(),
                 counter['created'],
+                counter['updated'],
                 counter['kept'],
                 counter['deleted'],
                 len(dupes)))
         if dupes:
             logger.info("These paragraph IDs were dupes: \n{}".format(
                 "\n".join(dupes)))
-        _run_haystack_update()
+        if options['rebuild']:
+            _run_haystack_update()
+        else:
+            _update_haystack_documents(counter['changed'], counter['removed'])
+        mark_indexed(counter['changed'])
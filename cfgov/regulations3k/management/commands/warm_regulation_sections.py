@@ -0,0 +1,43 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from regulations3k.models import RegulationPage
+from regulations3k.section_cache import SECTION_CACHE_ALIAS
+
+
+logger = logging.getLogger(__name__)
+
+# Django's default MAX_ENTRIES for cache backends that cull.
+DEFAULT_MAX_ENTRIES = 300
+
+
+class Command(BaseCommand):
+    help = (
+        'Pre-render every section of the live regulation versions, '
+        'typically after an import.'
+    )
+
+    def handle(self, *args, **options):
+        pages = RegulationPage.objects.live().filter(
+            regulation__isnull=False
+        ).select_related('regulation')
+        total = 0
+        for page in pages:
+            count = page.warm_section_cache()
+            logger.info("Rendered {} sections for {}".format(
+                count, page.regulation))
+            total += count
+        logger.info("Rendered {} regulation sections".format(total))
+
+        cache_settings = settings.CACHES.get(SECTION_CACHE_ALIAS, {})
+        max_entries = cache_settings.get('OPTIONS', {}).get(
+            'MAX_ENTRIES', DEFAULT_MAX_ENTRIES
+        )
+        if total > max_entries:
+            logger.warning(
+                "Rendered {} sections into the '{}' cache, which holds at "
+                "most {} entries; raise its MAX_ENTRIES so that they are "
+                "not culled".format(total, SECTION_CACHE_ALIAS, max_entries)
+            )
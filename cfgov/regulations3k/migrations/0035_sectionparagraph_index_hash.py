@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regulations3k', '0034_design_system_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sectionparagraph',
+            name='index_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import re
 from datetime import date
 
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils.functional import cached_property
 from django.utils.html import strip_tags
@@ -15,6 +16,8 @@ from wagtail.contrib.frontend_cache.utils import PurgeBatch
 
 import regdown
 
+from regulations3k.section_cache import invalidate_version
+
 
 # Labels always require at least 1 alphanumeric character, then any number of
 # alphanumeric characters and hyphens.
@@ -27,6 +30,12 @@ validate_label = RegexValidator(
 )
 
 
+# Marks the boundaries between paragraphs rendered in a single regdown call.
+PARAGRAPH_SEPARATOR = 'regdownparagraphseparator'
+PARAGRAPH_SEPARATOR_RE = re.compile(
+    r'<p[^>]*>{}</p>'.format(PARAGRAPH_SEPARATOR))
+
+
 def sortable_label(label, separator='-'):
     """ Create a sortable tuple out of a label.
     Converts a dashed label into a tuple based on the following rules:
@@ -51,6 +60,58 @@ def sortable_label(label, separator='-'):
     return tuple(segments)
 
 
+def content_hash(text):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def paragraph_index_hash(section, paragraph):
+    """Hash everything a paragraph's search document is built from.
+
+    That is the paragraph's text and the section and effective version
+    fields indexed with it (see RegulationParagraphIndex).
+    """
+    version = section.subpart.version
+    return content_hash('\n'.join([
+        paragraph,
+        section.title,
+        section.label,
+        section.sortable_label,
+        version.part.part_number,
+        str(version.effective_date),
+    ]))
+
+
+def render_paragraphs(contents, paragraph_ids):
+    """Render labeled paragraphs to plain text with one regdown call.
+
+    Each paragraph's regdown is pulled out in a single pass over the
+    contents, with the same rules as regdown's exact-match
+    extract_labeled_paragraph. The paragraphs are then rendered together,
+    separated by a marker paragraph, and the result is split back apart.
+    Returns one plain-text paragraph per ID, in order.
+    """
+    raw_graphs = {}
+    current_label = None
+    for line in contents.splitlines(True):
+        match = regdown.LabeledParagraphProcessor.RE.search(line)
+        if match and match.group('label') != current_label:
+            current_label = match.group('label')
+            if current_label in raw_graphs:
+                # Only a label's first paragraph is used.
+                current_label = None
+            else:
+                raw_graphs[current_label] = [line]
+        elif current_label is not None:
+            raw_graphs[current_label].append(line)
+    separator = '\n\n{}\n\n'.format(PARAGRAPH_SEPARATOR)
+    markup = regdown.regdown(separator.join(
+        ''.join(raw_graphs.get(pid, [])) for pid in paragraph_ids))
+    return [
+        strip_tags(graph).strip()
+        for graph in PARAGRAPH_SEPARATOR_RE.split(markup)
+    ][:len(paragraph_ids)]
+
+
 class Part(models.Model):
     cfr_title_number = models.CharField(max_length=255)
     chapter = models.CharField(max_length=255)
@@ -206,12 +267,16 @@ class Subpart(models.Model):
 
     @property
     def section_range(self):
-        if self.subpart_type != Subpart.BODY or not self.sections.exists():
+        if self.subpart_type != Subpart.BODY:
+            return ''
+
+        # A single evaluation, which uses prefetched sections if present.
+        sections = list(self.sections.all())
+        if not sections:
             return ''
 
-        sections = self.sections.all()
         return "{}–{}".format(
-            sections[0].numeric_label, sections.reverse()[0].numeric_label)
+            sections[0].numeric_label, sections[-1].numeric_label)
 
     class Meta:
         ordering = ['subpart_type', 'label']
@@ -247,49 +312,73 @@ class Section(models.Model):
         ordering = ['sortable_label']
 
     def extract_graphs(self):
-        """Break out and store a section's paragraphs for indexing."""
+        """Break out and store a section's paragraphs for indexing.
+
+        The section is rendered with a single regdown call and split into
+        paragraphs, which are diffed against the stored ones by content
+        hash. Changes are written with one bulk_create, one bulk_update and
+        one delete.
+
+        Paragraphs whose search document is out of date are returned as
+        `changed`: new and updated paragraphs, and those whose section or
+        version fields changed since they were last indexed, or that never
+        were. The pks of deleted paragraphs are returned as `removed`.
+        Each changed paragraph carries its new `index_hash`, unsaved, for
+        `mark_indexed` to record once its document has been pushed.
+        """
         part = self.subpart.version.part
         section_tag = "{}-{}".format(part.part_number, self.label)
-        extractor = regdown.extract_labeled_paragraph
         paragraph_ids = re.findall(r'[^{]*{(?P<label>[\w\-]+)}', self.contents)
-        created = 0
-        deleted = 0
+        index_graphs = render_paragraphs(self.contents, paragraph_ids)
+        existing = {}
+        to_delete = []
+        for graph in SectionParagraph.objects.filter(
+                section__subpart__version__part=part,
+                section__label=self.label).order_by('pk'):
+            if graph.section_id != self.pk or graph.paragraph_id in existing:
+                to_delete.append(graph.pk)
+            else:
+                existing[graph.paragraph_id] = graph
+        to_create = []
+        to_update = []
+        stale = []
         kept = 0
-        exclude_from_deletion = []
-        known_ids = []
+        seen = set()
         dupes = []
-        for pid in paragraph_ids:
-            raw_graph = extractor(pid, self.contents, exact=True)
-            markup_graph = regdown.regdown(raw_graph)
-            index_graph = strip_tags(markup_graph).strip()
-            full_id = "{}-{}".format(section_tag, pid)
-            graph, cr = SectionParagraph.objects.get_or_create(
-                paragraph=index_graph,
-                paragraph_id=pid,
-                section=self)
-            if cr:
-                created += 1
+        for pid, index_graph in zip(paragraph_ids, index_graphs):
+            if pid in seen:
+                dupes.append("{}-{}".format(section_tag, pid))
+                continue
+            seen.add(pid)
+            graph = existing.pop(pid, None)
+            if graph is None:
+                to_create.append(SectionParagraph(
+                    paragraph=index_graph,
+                    paragraph_id=pid,
+                    section=self))
+            elif content_hash(graph.paragraph) != content_hash(index_graph):
+                graph.paragraph = index_graph
+                to_update.append(graph)
             else:
-                if full_id in known_ids:
-                    dupes.append(full_id)
-                else:
-                    known_ids.append(full_id)
-                    kept += 1
-            exclude_from_deletion.append(graph.pk)
-        to_delete = SectionParagraph.objects.filter(
-            section__subpart__version__part=part,
-            section__label=self.label).exclude(
-            pk__in=exclude_from_deletion)
-        deleted += to_delete.count()
-        for graph in to_delete:
-            graph.delete()
-        dupes = sorted(set(dupes))
+                kept += 1
+                if graph.index_hash != paragraph_index_hash(self, index_graph):
+                    stale.append(graph)
+        to_delete.extend(graph.pk for graph in existing.values())
+        SectionParagraph.objects.bulk_create(to_create)
+        SectionParagraph.objects.bulk_update(to_update, ['paragraph'])
+        SectionParagraph.objects.filter(pk__in=to_delete).delete()
+        changed = to_create + to_update + stale
+        for graph in changed:
+            graph.index_hash = paragraph_index_hash(self, graph.paragraph)
         return {
             'section': section_tag,
-            'created': created,
-            'deleted': deleted,
+            'created': len(to_create),
+            'updated': len(to_update),
+            'deleted': len(to_delete),
             'kept': kept,
-            'dupes': dupes,
+            'dupes': sorted(set(dupes)),
+            'changed': changed,
+            'removed': to_delete,
         }
 
     def save(self, **kwargs):
@@ -328,16 +417,31 @@ class SectionParagraph(models.Model):
         Section,
         on_delete=models.CASCADE,
         related_name="paragraphs")
+    # The paragraph_index_hash of the paragraph's search document when it
+    # was last indexed, or blank if it hasn't been.
+    index_hash = models.CharField(max_length=32, blank=True, editable=False)
 
     def __str__(self):
         return "Section {}-{} paragraph {}".format(
             self.section.part, self.section.label, self.paragraph_id)
 
 
+def mark_indexed(paragraphs):
+    """Record that the `changed` paragraphs from extract_graphs are indexed.
+    """
+    SectionParagraph.objects.bulk_update(paragraphs, ['index_hash'])
+
+
 @receiver(post_save, sender=EffectiveVersion)
 def effective_version_saved(sender, instance, **kwargs):
     """ Invalidate the cache if the effective_version is not a draft """
+    from regulations3k.toc import (
+        invalidate_part_versions, rebuild_table_of_contents
+    )
+    invalidate_version(instance.pk)
+    invalidate_part_versions(instance.part_id)
     if not instance.draft:
+        rebuild_table_of_contents(instance)
         batch = PurgeBatch()
         for page in instance.part.page.all():
             urls = page.get_urls_for_version(instance)
@@ -347,7 +451,12 @@ def effective_version_saved(sender, instance, **kwargs):
 
 @receiver(post_save, sender=Section)
 def section_saved(sender, instance, **kwargs):
+    # Other sections may embed this one's paragraphs, so drop every
+    # cached render for the version, not just this section's.
+    from regulations3k.toc import rebuild_table_of_contents
+    invalidate_version(instance.subpart.version_id)
     if not instance.subpart.version.draft:
+        rebuild_table_of_contents(instance.subpart.version)
         batch = PurgeBatch()
         for page in instance.subpart.version.part.page.all():
             urls = page.get_urls_for_version(
@@ -355,3 +464,17 @@ def section_saved(sender, instance, **kwargs):
             )
             batch.add_urls(urls)
         batch.purge()
+
+
+@receiver(post_delete, sender=Section)
+def section_deleted(sender, instance, **kwargs):
+    from regulations3k.toc import rebuild_table_of_contents
+    invalidate_version(instance.subpart.version_id)
+    if not instance.subpart.version.draft:
+        rebuild_table_of_contents(instance.subpart.version)
+
+
+@receiver(post_delete, sender=EffectiveVersion)
+def effective_version_deleted(sender, instance, **kwargs):
+    from regulations3k.toc import invalidate_part_versions
+    invalidate_part_versions(instance.part_id)
@@ -12,7 +12,6 @@ from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.template.loader import get_template
 from django.template.response import TemplateResponse
-from haystack.query import SearchQuerySet
 
 from wagtail.admin.edit_handlers import (
     FieldPanel, ObjectList, StreamFieldPanel, TabbedInterface
@@ -27,8 +26,13 @@ from regdown import regdown
 
 from ask_cfpb.models.pages import SecondaryNavigationJSMixin
 from regulations3k.blocks import RegulationsListingFullWidthText
-from regulations3k.models import Part, Section, SectionParagraph, label_re_str
+from regulations3k.models import Part, Section, label_re_str
 from regulations3k.resolver import get_contents_resolver, get_url_resolver
+from regulations3k.search import SearchResultPage, search_paragraphs
+from regulations3k.section_cache import (
+    SECTION_CACHE_TIMEOUT, get_section_cache, section_cache_key
+)
+from regulations3k.toc import get_part_versions, get_table_of_contents
 from v1.atomic_elements import molecules, organisms
 from v1.models import CFGOVPage, CFGOVPageManager
 
@@ -75,56 +79,66 @@ class RegulationsSearchPage(RoutablePageMixin, CFGOVPage):
                 request,
                 self.get_template(request),
                 self.get_context(request))
-        sqs = SearchQuerySet().filter(content=search_query)
+        short_names = {
+            reg.part_number: reg.short_name for reg in all_regs}
+        num_results = validate_num_results(request)
+        try:
+            page_number = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page_number = 1
+        search = partial(
+            search_paragraphs, search_query, regs=regs, order=order,
+            size=num_results)
+        response = search(offset=(page_number - 1) * num_results)
+        paginator = Paginator(
+            SearchResultPage(
+                response['hits'], response['count'],
+                (page_number - 1) * num_results),
+            num_results)
+        if validate_page_number(request, paginator) != page_number:
+            # The requested page is out of range; fall back to the first.
+            page_number = 1
+            response = search(offset=0)
+            paginator = Paginator(
+                SearchResultPage(response['hits'], response['count'], 0),
+                num_results)
+        part_counts = response['part_counts']
         payload.update({
             'all_regs': [{
-                'short_name': reg.short_name,
-                'id': reg.part_number,
-                'num_results': sqs.filter(
-                    part=reg.part_number).models(SectionParagraph).count(),
-                'selected': reg.part_number in regs}
-                for reg in all_regs]
+                'short_name': short_name,
+                'id': part_number,
+                'num_results': part_counts.get(part_number, 0),
+                'selected': part_number in regs}
+                for part_number, short_name in short_names.items()]
         })
         payload.update({'total_count': sum(
             [reg['num_results'] for reg in payload['all_regs']])})
-        if len(regs) == 1:
-            sqs = sqs.filter(part=regs[0])
-        elif regs:
-            sqs = sqs.filter(part__in=regs)
-        if order == 'regulation':
-            sqs = sqs.order_by('part', 'section_order')
-        sqs = sqs.highlight(
-            pre_tags=['<strong>'],
-            post_tags=['</strong>']).models(SectionParagraph)
-        for hit in sqs:
+        for hit in response['hits']:
             try:
-                snippet = Markup(" ".join(hit.highlighted))
+                snippet = Markup(" ".join(hit['highlighted']))
             except TypeError as e:
                 logger.warning(
                     "Query string {} produced a TypeError: {}".format(
                         search_query, e))
                 continue
 
-            short_name = all_regs.get(part_number=hit.part).short_name
             hit_payload = {
-                'id': hit.paragraph_id,
-                'part': hit.part,
-                'reg': short_name,
-                'label': hit.title,
+                'id': hit['paragraph_id'],
+                'part': hit['part'],
+                'reg': short_names.get(hit['part']),
+                'label': hit['title'],
                 'snippet': snippet,
                 'url': "{}{}/{}/#{}".format(
-                    self.parent().url, hit.part,
-                    hit.section_label, hit.paragraph_id),
+                    self.parent().url, hit['part'],
+                    hit['section_label'], hit['paragraph_id']),
             }
             payload['results'].append(hit_payload)
 
-        payload.update({'current_count': sqs.count()})
+        payload.update({'current_count': response['count']})
         self.results = payload
         context = self.get_context(request)
-        num_results = validate_num_results(request)
-        paginator = Paginator(payload['results'], num_results)
-        page_number = validate_page_number(request, paginator)
         paginated_page = paginator.page(page_number)
+        paginated_page.object_list = payload['results']
         context.update({
             'current_count': payload['current_count'],
             'total_count': payload['total_count'],
@@ -249,37 +263,33 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
             return True
         return False
 
-    def get_versions_query(self, request):
-        versions = self.regulation.versions
+    def get_versions(self, request):
+        """ List the versions the user may see, oldest first """
+        versions = get_part_versions(self.regulation)
 
         if not self.can_serve_draft_versions(request):
-            versions = versions.filter(draft=False)
+            versions = [v for v in versions if not v.draft]
 
         return versions
 
     def get_effective_version(self, request, date_str=None):
         """ Get the requested effective version if the user has permission """
-        query_filter = {}
-
         if date_str is None:
-            query_filter['effective_date__lte'] = date.today()
+            today = date.today()
+            matches = [
+                v for v in self.get_versions(request)
+                if v.effective_date <= today
+            ]
         else:
-            query_filter['effective_date'] = date_str
-
-        draft_permission = self.can_serve_draft_versions(request)
-        if not draft_permission:
-            query_filter['draft'] = False
-
-        effective_version = self.regulation.versions.filter(
-            **query_filter
-        ).order_by(
-            '-effective_date'
-        ).first()
+            matches = [
+                v for v in self.get_versions(request)
+                if str(v.effective_date) == date_str
+            ]
 
-        if effective_version is None:
+        if not matches:
             raise Http404
 
-        return effective_version
+        return matches[-1]
 
     def get_section_query(self, request=None, effective_version=None):
         """Query set for Sections in this regulation's effective version."""
@@ -302,7 +312,7 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
                 'search-regulations/results/?regs=' +
                 self.regulation.part_number
             ),
-            'num_versions': self.get_versions_query(request).count(),
+            'num_versions': len(self.get_versions(request)),
         })
         return context
 
@@ -367,16 +377,54 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
 
         return template.render(context)
 
+    def render_section(self, section, effective_version, date_str=None,
+                       draft_permission=False):
+        """ Render a section's regdown to HTML, caching the result
+
+        Rendered HTML is cached by page, effective version, section label,
+        date_str and draft visibility. Cached renders are invalidated when
+        a section or effective version is saved. """
+        key = section_cache_key(
+            self.pk, effective_version.pk, section.label,
+            date_str=date_str, draft_permission=draft_permission
+        )
+        cache = get_section_cache()
+        content = cache.get(key)
+        if content is None:
+            content = regdown(
+                section.contents,
+                url_resolver=get_url_resolver(self, date_str=date_str),
+                contents_resolver=get_contents_resolver(effective_version),
+                render_block_reference=partial(
+                    self.render_interp, {'regulation': self.regulation}
+                )
+            )
+            cache.set(key, content, SECTION_CACHE_TIMEOUT)
+        return content
+
+    def warm_section_cache(self, effective_version=None):
+        """ Pre-render every section of an effective version
+
+        Defaults to the live version, as seen by the public. Returns the
+        number of sections rendered. """
+        if effective_version is None:
+            effective_version = self.regulation.effective_version
+        if effective_version is None:
+            return 0
+        sections = self.get_section_query(effective_version=effective_version)
+        count = 0
+        for section in sections:
+            self.render_section(section, effective_version)
+            count += 1
+        return count
+
     @route(r'^(?:(?P<date_str>[0-9]{4}-[0-9]{2}-[0-9]{2})/)?$', name="index")
     def index_route(self, request, date_str=None):
         request.is_preview = getattr(request, 'is_preview', False)
 
         effective_version = self.get_effective_version(
             request, date_str=date_str)
-        section_query = self.get_section_query(
-            effective_version=effective_version
-        )
-        sections = list(section_query.all())
+        sections = get_table_of_contents(effective_version).sections
 
         context = self.get_context(request)
         context.update({
@@ -399,20 +447,17 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
     @route(r'^versions/(?:(?P<section_label>' + label_re_str + r')/)?$',
            name="versions")
     def versions_page(self, request, section_label=None):
-        section_query = self.get_section_query(request=request)
-        sections = list(section_query.all())
+        effective_version = self.get_effective_version(request)
+        sections = get_table_of_contents(effective_version).sections
         context = self.get_context(request, sections=sections)
 
         versions = [
             {
                 'effective_date': v.effective_date,
                 'date_str': str(v.effective_date),
-                'sections': self.get_section_query(effective_version=v).all(),
                 'draft': v.draft
             }
-            for v in self.get_versions_query(request).order_by(
-                '-effective_date'
-            )
+            for v in reversed(self.get_versions(request))
         ]
 
         context.update({
@@ -437,38 +482,36 @@ class RegulationPage(RoutablePageMixin, SecondaryNavigationJSMixin, CFGOVPage):
 
         effective_version = self.get_effective_version(
             request, date_str=date_str)
-        section_query = self.get_section_query(
-            effective_version=effective_version
-        )
+        toc = get_table_of_contents(effective_version)
 
-        next_version = self.get_versions_query(request).filter(
-            effective_date__gt=effective_version.effective_date
-        ).first()
+        next_version = next((
+            v for v in self.get_versions(request)
+            if v.effective_date > effective_version.effective_date
+        ), None)
 
         kwargs = {}
         if date_str is not None:
             kwargs['date_str'] = date_str
 
-        try:
-            section = section_query.get(label=section_label)
-        except Section.DoesNotExist:
+        section = toc.get_section(section_label)
+        if section is None:
             return redirect(
                 self.url + self.reverse_subpage(
                     "index", kwargs=kwargs
                 )
             )
 
-        sections = list(section_query.all())
-        current_index = sections.index(section)
+        sections = toc.sections
+        current_index = toc.index(section_label)
         context = self.get_context(
             request, section, sections=sections, **kwargs
         )
 
-        content = regdown(
-            section.contents,
-            url_resolver=get_url_resolver(self, date_str=date_str),
-            contents_resolver=get_contents_resolver(effective_version),
-            render_block_reference=partial(self.render_interp, context)
+        content = self.render_section(
+            section,
+            effective_version,
+            date_str=date_str,
+            draft_permission=self.can_serve_draft_versions(request)
         )
 
         next_section = get_next_section(sections, current_index)
@@ -1,10 +1,12 @@
 import re
+from functools import lru_cache
 
 from django.conf import settings
 
 from regdown import extract_labeled_paragraph
 
 from regulations3k.models import Section
+from regulations3k.section_cache import get_version_generation
 
 
 DEFAULT_REGULATIONS_REFERENCE_MAPPING = [
@@ -16,52 +18,114 @@ DEFAULT_REGULATIONS_REFERENCE_MAPPING = [
 ]
 
 
-def resolve_reference(reference):
-    """ Given a reference, return destination section and paragraph labels
-    This function uses the REGULATIONS_REFERENCE_MAPPING setting to resolve
-    references into their destination section and paragraph labels. It does
-    not containing that reference """
+class ReferenceResolver(object):
+    """ Resolve references using a precompiled reference mapping
+    The mapping is a list of (pattern, section format, paragraph format)
+    tuples, like the REGULATIONS_REFERENCE_MAPPING setting. Patterns are
+    compiled once, when the resolver is created. """
+
+    def __init__(self, reference_mapping):
+        self.reference_mapping = [
+            (re.compile(pattern), section_format, paragraph_format)
+            for pattern, section_format, paragraph_format in reference_mapping
+        ]
+
+    def resolve(self, reference):
+        for reference_re, section_format, paragraph_format in \
+                self.reference_mapping:
+            match = reference_re.match(reference)
+            if match:
+                groups = match.groupdict()
+                return (
+                    section_format.format(**groups),
+                    paragraph_format.format(**groups)
+                )
+        return (None, None)
+
+
+@lru_cache(maxsize=8)
+def _get_reference_resolver(reference_mapping):
+    return ReferenceResolver(reference_mapping)
+
+
+def get_reference_resolver():
+    """ Return a ReferenceResolver for the current reference mapping """
     reference_mapping = getattr(
         settings,
         'REGULATIONS_REFERENCE_MAPPING',
         DEFAULT_REGULATIONS_REFERENCE_MAPPING
     )
+    return _get_reference_resolver(
+        tuple(tuple(reference_map) for reference_map in reference_mapping)
+    )
 
-    for reference_map in reference_mapping:
-        reference_re = re.compile(reference_map[0])
-        match = reference_re.match(reference)
-        if match:
-            dest_section_label = reference_map[1].format(**match.groupdict())
-            dest_paragraph_label = reference_map[2].format(**match.groupdict())
-            return (dest_section_label, dest_paragraph_label)
 
-    return (None, None)
+def resolve_reference(reference):
+    """ Given a reference, return destination section and paragraph labels
+    This function uses the REGULATIONS_REFERENCE_MAPPING setting to resolve
+    references into their destination section and paragraph labels. It does
+    not containing that reference """
+    return get_reference_resolver().resolve(reference)
+
+
+class ContentsResolver(object):
+    """ A Regdown contents_resolver for one EffectiveVersion
+    All of the version's section contents are loaded with a single query
+    the first time a reference is resolved, and each extracted paragraph is
+    memoized, so repeated references cost nothing. """
+
+    def __init__(self, effective_version_id, reference_resolver=None):
+        self.effective_version_id = effective_version_id
+        self.reference_resolver = (
+            reference_resolver or get_reference_resolver())
+        self.paragraphs = {}
+        self._sections = None
+
+    @property
+    def sections(self):
+        if self._sections is None:
+            self._sections = dict(Section.objects.filter(
+                subpart__version_id=self.effective_version_id
+            ).values_list('label', 'contents'))
+        return self._sections
+
+    def __call__(self, reference):
+        dest_section_label, dest_paragraph_label = \
+            self.reference_resolver.resolve(reference)
+        key = (dest_section_label, dest_paragraph_label)
+        if key not in self.paragraphs:
+            contents = self.sections.get(dest_section_label)
+            if contents is None:
+                self.paragraphs[key] = ''
+            else:
+                self.paragraphs[key] = extract_labeled_paragraph(
+                    dest_paragraph_label,
+                    contents,
+                    exact=False
+                )
+        return self.paragraphs[key]
+
+
+@lru_cache(maxsize=32)
+def _get_contents_resolver(effective_version_id, generation,
+                           reference_resolver):
+    return ContentsResolver(effective_version_id, reference_resolver)
 
 
 def get_contents_resolver(effective_version):
     """ Return a Regdown contents_resolver function for the RegulationPage
     This constructs a contents_resolver that will resolve references and
     return their contents for all sections that are part of the current
-    EffectiveVersion served by the given page. """
-    section_query = Section.objects.filter(
-        subpart__version=effective_version
+    EffectiveVersion served by the given page.
+
+    Resolvers are reused until the version's sections change, which is
+    tracked by the same generation token as the rendered-section cache. """
+    return _get_contents_resolver(
+        effective_version.pk,
+        get_version_generation(effective_version.pk),
+        get_reference_resolver()
     )
 
-    def contents_resolver(reference):
-        dest_section_label, dest_paragraph_label = resolve_reference(reference)
-        try:
-            dest_section = section_query.get(label=dest_section_label)
-        except Section.DoesNotExist:
-            return ''
-        dest_paragraph = extract_labeled_paragraph(
-            dest_paragraph_label,
-            dest_section.contents,
-            exact=False
-        )
-        return dest_paragraph
-
-    return contents_resolver
-
 
 def get_url_resolver(page, date_str=None):
     """ Returns a Regdown url_resolver function for the RegulationPage
@@ -2,11 +2,17 @@ import datetime
 import logging
 import re
 import sys
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import Pool, cpu_count
+
+from django.db import connections, transaction
 
 import requests
 from bs4 import BeautifulSoup as bS
+from lxml import etree
 
-from regulations3k.models.django import Section, Subpart
+from regulations3k.models.django import Section, Subpart, sortable_label
 from regulations3k.parser.integer_conversion import int_to_alpha
 from regulations3k.parser.paragraphs import (
     bold_first_italics, combine_bolds, graph_top, lint_paragraph,
@@ -18,6 +24,7 @@ from regulations3k.parser.patterns import (
 )
 from regulations3k.parser.payload import CFR_TITLE, PayLoad
 from regulations3k.parser.regtable import RegTable
+from regulations3k.toc import invalidate_part_versions
 
 
 logger = logging.getLogger(__name__)
@@ -44,6 +51,7 @@ HEADLINE_MAP = {
     'HD3': "\n#### {}\n",
 }
 LINK_FARM_TAGS = ['XREF', 'FP-1', 'FP-2']
+BATCH_SIZE = 500
 PAYLOAD = PayLoad()
 LEVEL_STATE = IdLevelState()
 
@@ -243,7 +251,7 @@ def parse_sections(section_list, part, subpart):
                 'HEAD').text.strip().replace('\xc2', ''),
             contents=section_content
         )
-        _section.save()
+        PAYLOAD.sections.append(_section)
 
 
 def set_table(table_soup, label):
@@ -342,9 +350,7 @@ def parse_appendices(appendices, part):
             title=head,
             contents=prefix + parse_appendix_elements(_appendix, default_label)
         )
-        appendix.save()
-
-    PAYLOAD.appendices.append(appendix)
+        PAYLOAD.appendices.append(appendix)
 
 
 def divine_interp_tag_use(element, part_num):
@@ -492,8 +498,6 @@ def parse_interps(interp_div, part, subpart):
             PAYLOAD.interp_refs.update(ref)
         for element in section_heading.findNextSiblings():
             if element in section_headings:
-                section.save()
-                PAYLOAD.interpretations.append(section)
                 break
             if element.name in ['HD1', 'XREF', 'CITA']:
                 continue
@@ -521,11 +525,61 @@ def parse_interps(interp_div, part, subpart):
                     section.contents += parse_interp_graph(p)
             else:
                 section.contents += "\n{}\n".format(element.text.strip())
-        section.save()
         if section not in PAYLOAD.interpretations:
             PAYLOAD.interpretations.append(section)
 
 
+@contextmanager
+def import_state():
+    """
+    Give one import its own PayLoad and IdLevelState.
+
+    The parsing functions share state through the module-level PAYLOAD and
+    LEVEL_STATE; this swaps in fresh instances for the duration of an
+    import, so nothing leaks from one part to the next. Worker processes
+    each have their own module globals, so parts can be imported in
+    parallel.
+    """
+    global PAYLOAD, LEVEL_STATE
+    saved = (PAYLOAD, LEVEL_STATE)
+    PAYLOAD, LEVEL_STATE = PayLoad(), IdLevelState()
+    try:
+        yield PAYLOAD
+    finally:
+        PAYLOAD, LEVEL_STATE = saved
+
+
+def save_sections(payload):
+    """Bulk-insert the sections, appendices and interps of one import."""
+    sections = payload.interpretations + payload.appendices + payload.sections
+    for section in sections:
+        # bulk_create skips Section.save, which sets the sortable label.
+        section.sortable_label = '-'.join(sortable_label(section.label))
+    Section.objects.bulk_create(sections, batch_size=BATCH_SIZE)
+    return len(sections)
+
+
+def import_part(part_number, part_soup):
+    """
+    Create a draft version of a Part from the part's DIV5 soup.
+
+    Everything the part creates is written in a single transaction, so a
+    failed parse doesn't leave a partial version behind. Sections are
+    collected while parsing and inserted in bulk at the end.
+    """
+    with import_state() as payload, transaction.atomic():
+        payload.get_effective_date(part_number)
+        payload.parse_part(part_soup, part_number)
+        part = payload.part
+        payload.parse_version(part_soup, part)
+        # parse_subparts will create and associate sections and appendices
+        parse_subparts(part_soup, part)
+        save_sections(payload)
+    # A page view during the import may have cached the version list
+    # before the new version was committed.
+    invalidate_part_versions(part.pk)
+
+
 def ecfr_to_regdown(part_number, file_path=None):
     """
     Extract a regulation Part from eCFR XML, and create regdown content.
@@ -568,12 +622,7 @@ def ecfr_to_regdown(part_number, file_path=None):
     soup = bS(markup, "lxml-xml")
     parts = soup.find_all('DIV5')
     part_soup = [div for div in parts if div['N'] == part_number][0]
-    PAYLOAD.get_effective_date(part_number)
-    PAYLOAD.parse_part(part_soup, part_number)
-    part = PAYLOAD.part
-    PAYLOAD.parse_version(part_soup, part)
-    # parse_subparts will create and associate sections and appendices
-    parse_subparts(part_soup, part)
+    import_part(part_number, part_soup)
     msg = (
         "Draft version of Part {} created.\n"
         "Parsing took {}".format(
@@ -582,13 +631,146 @@ def ecfr_to_regdown(part_number, file_path=None):
     return msg
 
 
+def open_ecfr_source(file_path=None):
+    """
+    Return a readable source for the title-12 eCFR XML, or None.
+
+    A local file is opened in binary mode; otherwise the latest XML is
+    streamed from www.gpo.gov rather than read into memory.
+    """
+    if file_path:
+        try:
+            return open(file_path, 'rb')
+        except IOError:
+            logger.info("Could not open local file {}".format(file_path))
+            return
+    ecfr_request = requests.get(LATEST_ECFR, stream=True)
+    if not ecfr_request.ok:
+        logger.info(
+            "ECFR request failed with code {} and reason {}".format(
+                ecfr_request.status_code, ecfr_request.reason))
+        return
+    ecfr_request.raw.decode_content = True
+    return ecfr_request.raw
+
+
+def stream_parts(source, part_numbers):
+    """
+    Yield (part number, DIV5 markup) for each requested part in an XML source.
+
+    The source is read incrementally, and each DIV5 element is discarded as
+    soon as it has been serialized, so memory is bounded by the largest part
+    rather than the whole title.
+    """
+    for event, element in etree.iterparse(
+            source, events=('end',), tag='DIV5'):
+        part_number = element.get('N')
+        if part_number in part_numbers:
+            yield part_number, etree.tostring(element, encoding='unicode')
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def import_part_markup(part):
+    """Import one (part number, DIV5 markup) pair and time it."""
+    part_number, markup = part
+    starter = datetime.datetime.now()
+    part_soup = bS(markup, 'lxml-xml').find('DIV5')
+    import_part(part_number, part_soup)
+    return part_number, datetime.datetime.now() - starter
+
+
+def import_parts_in_pool(pool, parts, max_pending):
+    """
+    Import parts in a process pool, yielding results in submission order.
+
+    At most `max_pending` parts are submitted but unfinished at a time, so
+    the parts iterable is only read as fast as the workers import parts.
+    """
+    pending = deque()
+    for part in parts:
+        pending.append(pool.apply_async(import_part_markup, (part,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def stream_ecfr_to_regdown(part_numbers, file_path=None, workers=1):
+    """
+    Import several Parts from a single streaming pass over the eCFR XML.
+
+    Each part is imported in its own transaction. With more than one
+    worker, parts are parsed in a pool of processes as they are read from
+    the XML. Reading stays at most one part per worker ahead of parsing, so
+    memory is bounded by the largest parts rather than the whole title.
+    Returns a dict of per-part parsing times.
+    """
+    for part_number in part_numbers:
+        if part_number not in PART_ALLOWLIST:
+            raise ValueError('Provided Part number is not a CFPB regulation.')
+    source = open_ecfr_source(file_path=file_path)
+    if source is None:
+        return
+    parts = stream_parts(source, set(part_numbers))
+    timings = {}
+    pool = None
+    try:
+        if workers > 1:
+            # Child processes must not share the parent's open connections.
+            connections.close_all()
+            pool = Pool(workers)
+            results = import_parts_in_pool(pool, parts, workers)
+        else:
+            results = map(import_part_markup, parts)
+        for part_number, elapsed in results:
+            timings[part_number] = elapsed
+            logger.info(
+                "Draft version of Part {} created.\n"
+                "Parsing took {}".format(part_number, elapsed))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        source.close()
+    missing = sorted(set(part_numbers) - set(timings))
+    if missing:
+        logger.info("Parts not found in the eCFR XML: {}".format(
+            ", ".join(missing)))
+    return timings
+
+
 def run(*args):
+    """
+    Import regulation parts from eCFR XML.
+
+    'STREAM' imports every legacy part from a single pass over the XML,
+    parsing parts in one process per CPU core by default; add 'workers=N'
+    to change that.
+    """
+    workers = min(cpu_count(), len(LEGACY_PARTS))
+    for arg in args:
+        if arg.startswith('workers='):
+            workers = int(arg.split('=', 1)[1])
+    args = [arg for arg in args if not arg.startswith('workers=')]
     if len(args) not in [1, 2]:
         logger.info(
             "Usage: ./cfgov/manage.py runscript "
             "ecfr_importer --script-args "
-            "[PART NUMBER or 'ALL'] [OPTIONAL XML FILE PATH]")
+            "[PART NUMBER, 'ALL' or 'STREAM'] [OPTIONAL XML FILE PATH] "
+            "[OPTIONAL workers=N]")
         sys.exit(1)
+    file_path = args[1] if len(args) == 2 else None
+    source_name = 'local XML file' if file_path else 'the latest eCFR XML'
+    if args[0] == 'STREAM':
+        starter = datetime.datetime.now()
+        logger.info("parsing all parts from {} in one pass".format(
+            source_name))
+        stream_ecfr_to_regdown(
+            LEGACY_PARTS, file_path=file_path, workers=workers)
+        logger.info("Overall, parsing took {}".format(
+            datetime.datetime.now() - starter))
     elif len(args) == 1:
         if args[0] == 'ALL':
             starter = datetime.datetime.now()
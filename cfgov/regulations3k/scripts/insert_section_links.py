@@ -2,9 +2,13 @@
 
 import logging
 import re
+from functools import lru_cache
+
+from wagtail.contrib.frontend_cache.utils import PurgeBatch
 
 from regulations3k.models import Part, Section
-from regulations3k.scripts.ecfr_importer import PART_ALLOWLIST
+from regulations3k.scripts.ecfr_importer import BATCH_SIZE, PART_ALLOWLIST
+from regulations3k.section_cache import invalidate_version
 
 
 REG_BASE = '/policy-compliance/rulemaking/regulations/{}/'
@@ -16,6 +20,7 @@ ID_RE = re.compile(r'\(([a-zA-Z0-9]{1,4})\)')
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
 def get_url(section_reference):
     if not PARTS_RE.match(section_reference):
         return
@@ -35,20 +40,40 @@ def get_url(section_reference):
 
 
 def insert_section_links(regdown):
-    """Turn internal section references into links."""
-    section_refs = SECTION_RE.findall(regdown)
-    if not section_refs:
-        return
-    index_head = 0
-    for i, ref in enumerate(section_refs):
+    """
+    Turn internal section references into links.
+
+    The output is built in one pass over the regdown. Each linkable
+    reference replaces the first occurrence of its text after the previous
+    link, as in the original replace-based approach.
+    """
+    chunks = []
+    cursor = 0
+    found = False
+    for i, match in enumerate(SECTION_RE.finditer(regdown)):
+        found = True
+        ref = match.group(1)
         url = get_url(ref)
         if url:
-            link = '<a href="{}" data-linktag="{}">{}</a> '.format(url, i, ref)
-            regdown = (
-                regdown[:index_head] +
-                regdown[index_head:].replace(ref, link, 1))
-            index_head = regdown.index(link) + len(link)
-    return regdown
+            start = regdown.find(ref, cursor)
+            chunks.append(regdown[cursor:start])
+            chunks.append(
+                '<a href="{}" data-linktag="{}">{}</a> '.format(url, i, ref))
+            cursor = start + len(ref)
+    if not found:
+        return
+    chunks.append(regdown[cursor:])
+    return ''.join(chunks)
+
+
+def purge_sections(sections):
+    """Purge the cached pages of updated sections in one CDN request."""
+    batch = PurgeBatch()
+    for section in sections:
+        version = section.subpart.version
+        for page in version.part.page.all():
+            batch.add_urls(page.get_urls_for_version(version, section=section))
+    batch.purge()
 
 
 def insert_links(reg=None):
@@ -56,10 +81,13 @@ def insert_links(reg=None):
         parts = Part.objects.all()
     else:
         parts = Part.objects.filter(part_number=reg)
-    live_versions = [part.effective_version for part in parts]
+    live_versions = [part.effective_version for part in parts
+                     if part.effective_version]
     live_sections = Section.objects.filter(
         subpart__version__in=live_versions).exclude(
-        subpart__title__contains='Supplement I')
+        subpart__title__contains='Supplement I').select_related(
+        'subpart__version__part')
+    linked_sections = []
     for section in live_sections:
         if 'data-linktag' in section.contents:
             logger.info("Section {} already has links applied".format(section))
@@ -72,7 +100,16 @@ def insert_links(reg=None):
         else:
             logger.info("Links added to section {}".format(section))
             section.contents = linked_regdown
-            section.save()
+            linked_sections.append(section)
+    if not linked_sections:
+        return
+    # bulk_update skips the post_save signal, so expire the rendered
+    # sections and purge the CDN here, once for the whole run.
+    Section.objects.bulk_update(
+        linked_sections, ['contents'], batch_size=BATCH_SIZE)
+    for version in live_versions:
+        invalidate_version(version.pk)
+    purge_sections(linked_sections)
 
 
 def run(*args):
@@ -0,0 +1,110 @@
+from haystack import connections as haystack_connections
+from haystack.utils import get_model_ct
+
+from regulations3k.models import SectionParagraph
+
+
+def build_search_body(search_query, regs=None, order='relevance',
+                      offset=0, size=25, using='default'):
+    """
+    Build one Elasticsearch request for regulation paragraph search.
+
+    The request returns a page of highlighted hits, plus a terms
+    aggregation on `part` that counts matches for every regulation. The
+    regulation filter is applied as a post_filter, so it narrows the hits
+    without narrowing the per-regulation counts.
+    """
+    query = haystack_connections[using].get_query()
+    body = {
+        'query': {
+            'bool': {
+                'must': {
+                    'query_string': {
+                        'default_field': 'text',
+                        'default_operator': 'AND',
+                        'query': '({})'.format(query.clean(search_query)),
+                        'analyze_wildcard': True,
+                        'auto_generate_phrase_queries': True,
+                    },
+                },
+                'filter': {
+                    'terms': {'django_ct': [get_model_ct(SectionParagraph)]},
+                },
+            },
+        },
+        'aggs': {
+            'part': {'terms': {'field': 'part', 'size': 0}},
+        },
+        'highlight': {
+            'fields': {'text': {}},
+            'pre_tags': ['<strong>'],
+            'post_tags': ['</strong>'],
+        },
+        'from': offset,
+        'size': size,
+    }
+    if regs:
+        body['post_filter'] = {'terms': {'part': regs}}
+    if order == 'regulation':
+        body['sort'] = [
+            {'part': {'order': 'asc'}},
+            {'section_order': {'order': 'asc'}},
+        ]
+    return body
+
+
+def search_paragraphs(search_query, regs=None, order='relevance',
+                      offset=0, size=25, using='default'):
+    """
+    Search regulation paragraphs with a single Elasticsearch round trip.
+
+    Returns a dict with the page of `hits` (each a dict of the indexed
+    fields, plus `highlighted`), the `count` of hits matching the
+    regulation filter, and `part_counts`, a dict of unfiltered match
+    counts keyed by part number.
+    """
+    backend = haystack_connections[using].get_backend()
+    response = backend.conn.search(
+        index=backend.index_name,
+        doc_type='modelresult',
+        body=build_search_body(
+            search_query, regs=regs, order=order, offset=offset, size=size,
+            using=using
+        ),
+    )
+    hits = []
+    for hit in response['hits']['hits']:
+        result = dict(hit['_source'])
+        result['highlighted'] = hit.get('highlight', {}).get('text')
+        hits.append(result)
+    return {
+        'hits': hits,
+        'count': response['hits']['total'],
+        'part_counts': {
+            bucket['key']: bucket['doc_count']
+            for bucket in response['aggregations']['part']['buckets']
+        },
+    }
+
+
+class SearchResultPage(object):
+    """
+    A sequence of `count` search results, only one page of which is loaded.
+
+    This lets Django's Paginator work with results that are paginated by
+    Elasticsearch: slicing returns the loaded hits that fall in the slice.
+    """
+    def __init__(self, hits, count, offset):
+        self.hits = hits
+        self.count = count
+        self.offset = offset
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = max((key.start or 0) - self.offset, 0)
+            stop = (key.stop if key.stop is not None else self.count)
+            return self.hits[start:max(stop - self.offset, 0)]
+        return self.hits[key - self.offset]
@@ -0,0 +1,55 @@
+import uuid
+
+from django.core.cache import caches
+
+
+# Rendered sections and their generation tokens live in their own cache,
+# shared by every host, so that a save on one host invalidates them all.
+SECTION_CACHE_ALIAS = 'regulations'
+
+# Rendered sections are invalidated by generation, so they only need to
+# outlive the gap between imports.
+SECTION_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def get_section_cache():
+    return caches[SECTION_CACHE_ALIAS]
+
+
+def _generation_key(version_id):
+    return 'regulations3k:section-generation:{}'.format(version_id)
+
+
+def get_version_generation(version_id):
+    """Return the current cache generation token for an effective version.
+
+    Every rendered-section key includes this token, so replacing it
+    invalidates all of the version's sections at once, including sections
+    whose contents embed paragraphs from a section that has changed.
+    """
+    cache = get_section_cache()
+    key = _generation_key(version_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.set(key, generation, None)
+    return generation
+
+
+def invalidate_version(version_id):
+    """Drop all cached section renders for an effective version."""
+    get_section_cache().set(
+        _generation_key(version_id), uuid.uuid4().hex, None
+    )
+
+
+def section_cache_key(page_id, version_id, section_label, date_str=None,
+                      draft_permission=False):
+    return 'regulations3k:section:{}:{}:{}:{}:{}:{}'.format(
+        get_version_generation(version_id),
+        page_id,
+        version_id,
+        section_label,
+        date_str or 'current',
+        'draft' if draft_permission else 'public'
+    )
@@ -10,7 +10,7 @@ import mock
 from bs4 import BeautifulSoup as bS
 from requests import Response
 
-from regulations3k.models import Part, Subpart
+from regulations3k.models import Part, Section, Subpart, sortable_label
 from regulations3k.parser import paragraphs
 from regulations3k.parser.integer_conversion import (
     alpha_to_int, int_to_alpha, int_to_roman, roman_to_int
@@ -217,6 +217,95 @@ class ImporterTestCase(DjangoTestCase):
         self.assertEqual(Part.objects.filter(
             part_number=part_number).count(), 1)
 
+    @mock.patch('regulations3k.scripts.ecfr_importer.requests.get')
+    def test_stream_ecfr_to_regdown(self, mock_get):
+        mock_response = mock.Mock(  # mock the effective_date request
+            Response,
+            reason='REQUESTS FOR HUMANS MY EYE',
+            ok=True)
+        mock_response.json.return_value = {'results':
+                                           [{'effective_on': '2018-06-01'}]}
+        mock_get.return_value = mock_response
+        timings = ecfr_importer.stream_ecfr_to_regdown(
+            ['1002', '1003', '1026'], file_path=self.xml_fixture)
+        self.assertEqual(sorted(timings), ['1002', '1003'])
+        self.assertEqual(
+            Subpart.objects.filter(
+                version__part__part_number='1003',
+                subpart_type=Subpart.APPENDIX).count(),
+            1
+        )
+
+    def test_stream_parts_skips_unrequested_parts(self):
+        with open(self.xml_fixture, 'rb') as f:
+            parts = list(ecfr_importer.stream_parts(f, {'1003'}))
+        self.assertEqual([part_number for part_number, soup in parts],
+                         ['1003'])
+        self.assertTrue(parts[0][1].startswith('<DIV5 N="1003"'))
+
+    @mock.patch('regulations3k.scripts.ecfr_importer.requests.get')
+    def test_import_part_bulk_inserts_sections(self, mock_get):
+        mock_response = mock.Mock(
+            Response,
+            ok=True)
+        mock_response.json.return_value = {'results':
+                                           [{'effective_on': '2018-06-01'}]}
+        mock_get.return_value = mock_response
+        payload = PAYLOAD
+        soup = bS(self.test_xml, 'lxml-xml')
+        ecfr_importer.import_part('1002', soup.find('DIV5'))
+        # The import ran with its own state and left the module's alone.
+        self.assertIs(ecfr_importer.PAYLOAD, payload)
+        sections = Section.objects.filter(
+            subpart__version__part__part_number='1002')
+        self.assertTrue(sections.exists())
+        for section in sections:
+            self.assertEqual(
+                section.sortable_label,
+                '-'.join(sortable_label(section.label)))
+
+    @mock.patch('regulations3k.scripts.ecfr_importer.connections')
+    @mock.patch('regulations3k.scripts.ecfr_importer.Pool')
+    @mock.patch('regulations3k.scripts.ecfr_importer.import_part')
+    def test_stream_ecfr_to_regdown_uses_pool(
+            self, mock_import, mock_pool, mock_connections):
+        pool = mock_pool.return_value
+        pool.apply_async.side_effect = lambda func, args: mock.Mock(
+            get=mock.Mock(return_value=func(*args)))
+        timings = ecfr_importer.stream_ecfr_to_regdown(
+            ['1002', '1003'], file_path=self.xml_fixture, workers=2)
+        mock_pool.assert_called_once_with(2)
+        self.assertEqual(mock_connections.close_all.call_count, 1)
+        self.assertEqual(pool.join.call_count, 1)
+        self.assertEqual(mock_import.call_count, 2)
+        self.assertEqual(sorted(timings), ['1002', '1003'])
+
+    @mock.patch('regulations3k.scripts.ecfr_importer.import_part_markup')
+    def test_import_parts_in_pool_reads_parts_as_workers_finish(
+            self, mock_import_markup):
+        read = []
+
+        def parts():
+            for part in range(5):
+                read.append(part)
+                yield part
+
+        pool = mock.Mock()
+        pool.apply_async.side_effect = lambda func, args: mock.Mock(
+            get=mock.Mock(return_value=args[0]))
+        results = ecfr_importer.import_parts_in_pool(pool, parts(), 2)
+        for result in results:
+            # No more than two parts are read ahead of the consumed result.
+            self.assertLessEqual(len(read), result + 2)
+        self.assertEqual(read, list(range(5)))
+        self.assertEqual(pool.apply_async.call_count, 5)
+
+    def test_stream_bad_file_path_returns_none(self):
+        self.assertIs(
+            ecfr_importer.stream_ecfr_to_regdown(
+                ['1002'], file_path='fake_file_path'),
+            None)
+
     def test_bad_file_path_returns_none(self):
         self.assertIs(
             ecfr_importer.ecfr_to_regdown('1002', file_path='fake_file_path'),
@@ -322,6 +411,15 @@ class ImporterRunTestCase(unittest.TestCase):
         ecfr_importer.run('ALL', '/mock/local/file.xml')
         self.assertEqual(mock_importer.call_count, 11)
 
+    @mock.patch('regulations3k.scripts.ecfr_importer.stream_ecfr_to_regdown')
+    @mock.patch('regulations3k.scripts.ecfr_importer.ecfr_to_regdown')
+    def test_run_stream(self, mock_importer, mock_stream):
+        ecfr_importer.run('STREAM', '/mock/local/file.xml', 'workers=2')
+        self.assertEqual(mock_importer.call_count, 0)
+        mock_stream.assert_called_once_with(
+            ecfr_importer.LEGACY_PARTS, file_path='/mock/local/file.xml',
+            workers=2)
+
     def test_run_importer_no_args(self):
         with self.assertRaises(SystemExit):
             ecfr_importer.run()
@@ -2,7 +2,9 @@ import datetime
 import unittest
 
 from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.core.paginator import Paginator
 from django.http import Http404, HttpRequest, QueryDict
 from django.test import (
@@ -25,6 +27,21 @@ from regulations3k.models.pages import (
     get_section_url, validate_num_results, validate_order,
     validate_page_number, validate_regs_list
 )
+from regulations3k.toc import get_table_of_contents
+
+
+LOCMEM_CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-regulations3k-{}'.format(alias),
+    }
+    for alias in ('default', 'regulations')
+}
+
+
+def clear_caches():
+    for alias in LOCMEM_CACHES:
+        caches[alias].clear()
 
 
 class RegModelTests(DjangoTestCase):
@@ -388,79 +405,95 @@ class RegModelTests(DjangoTestCase):
             'Appendix B to Part 1002-Errata'
         )
 
-    @mock.patch('regulations3k.models.pages.SearchQuerySet.models')
-    def test_routable_search_page_calls_elasticsearch(self, mock_sqs):
-        mock_return = mock.Mock()
-        mock_return.part = '1002'
-        mock_return.text = ('Now is the time for all good men to come to the '
-                            'aid of their country.')
-        mock_return.highlighted = ['Now is the time for all good men',
-                                   'to come to the aid of their country.']
-        mock_return.paragraph_id = 'a'
-        mock_return.title = 'Section 1002.1 Now is the time.'
-        mock_return.section_label = '1'
-        mock_queryset = mock.Mock()
-        mock_queryset.__iter__ = mock.Mock(return_value=iter([mock_return]))
-        mock_queryset.count.return_value = 1
-        mock_sqs.return_value = mock_queryset
+    def search_response(self, highlighted):
+        return {
+            'hits': [{
+                'part': '1002',
+                'highlighted': highlighted,
+                'paragraph_id': 'a',
+                'title': 'Section 1002.1 Now is the time.',
+                'section_label': '1',
+            }],
+            'count': 1,
+            'part_counts': {'1002': 1, '1030': 4},
+        }
+
+    @mock.patch('regulations3k.models.pages.search_paragraphs')
+    def test_routable_search_page_calls_elasticsearch(self, mock_search):
+        mock_search.return_value = self.search_response(
+            ['Now is the time for all good men',
+             'to come to the aid of their country.'])
         response = self.client.get(
             self.reg_search_page.url + self.reg_search_page.reverse_subpage(
                 'regulation_results_page'),
             {'q': 'disclosure', 'regs': '1002', 'order': 'regulation'})
-        self.assertEqual(mock_sqs.call_count, 3)
+        self.assertEqual(mock_search.call_count, 1)
         self.assertEqual(response.status_code, 200)
+        mock_search.assert_called_with(
+            'disclosure', regs=['1002'], order='regulation', size=25,
+            offset=0)
+        self.assertEqual(response.context_data['total_count'], 5)
+        self.assertEqual(response.context_data['current_count'], 1)
+        self.assertEqual(
+            response.context_data['results'].object_list[0]['reg'],
+            'Regulation B')
         response2 = self.client.get(
             self.reg_search_page.url + self.reg_search_page.reverse_subpage(
                 'regulation_results_page'),
             QueryDict(query_string=(
                 'q=disclosure&regs=1002&regs=1003&order=regulation')))
         self.assertEqual(response2.status_code, 200)
-        self.assertEqual(mock_sqs.call_count, 6)
-
-    @mock.patch('regulations3k.models.pages.SearchQuerySet.models')
-    def test_routable_search_page_handles_null_highlights(self, mock_sqs):
-        mock_return = mock.Mock()
-        mock_return.part = '1002'
-        mock_return.text = ''
-        mock_return.highlighted = None
-        mock_return.paragraph_id = 'a'
-        mock_return.title = 'Section 1002.1 Now is the time.'
-        mock_return.section_label = '1'
-        mock_queryset = mock.Mock()
-        mock_queryset.__iter__ = mock.Mock(return_value=iter([mock_return]))
-        mock_queryset.count.return_value = 1
-        mock_sqs.return_value = mock_queryset
+        self.assertEqual(mock_search.call_count, 2)
+
+    @mock.patch('regulations3k.models.pages.search_paragraphs')
+    def test_routable_search_page_paginates_in_elasticsearch(
+            self, mock_search):
+        response = self.search_response(['snippet'])
+        response['count'] = 60
+        mock_search.return_value = response
+        self.client.get(
+            self.reg_search_page.url + self.reg_search_page.reverse_subpage(
+                'regulation_results_page'),
+            {'q': 'disclosure', 'page': '3'})
+        self.assertEqual(mock_search.call_count, 1)
+        self.assertEqual(mock_search.call_args[1]['offset'], 50)
+        self.client.get(
+            self.reg_search_page.url + self.reg_search_page.reverse_subpage(
+                'regulation_results_page'),
+            {'q': 'disclosure', 'page': '4'})
+        # Page 4 is out of range, so the first page is fetched instead.
+        self.assertEqual(mock_search.call_count, 3)
+        self.assertEqual(mock_search.call_args[1]['offset'], 0)
+
+    @mock.patch('regulations3k.models.pages.search_paragraphs')
+    def test_routable_search_page_handles_null_highlights(self, mock_search):
+        mock_search.return_value = self.search_response(None)
         response = self.client.get(
             self.reg_search_page.url + self.reg_search_page.reverse_subpage(
                 'regulation_results_page'),
             {'q': 'disclosure', 'regs': '1002', 'order': 'regulation'})
-        self.assertEqual(mock_sqs.call_count, 3)
+        self.assertEqual(mock_search.call_count, 1)
         self.assertEqual(response.status_code, 200)
-        response2 = self.client.get(
-            self.reg_search_page.url + self.reg_search_page.reverse_subpage(
-                'regulation_results_page'),
-            QueryDict(query_string=(
-                'q=disclosure&regs=1002&regs=1003&order=regulation')))
-        self.assertEqual(response2.status_code, 200)
-        self.assertEqual(mock_sqs.call_count, 6)
+        self.assertEqual(
+            list(response.context_data['results'].object_list), [])
 
-    @mock.patch('regulations3k.models.pages.SearchQuerySet.models')
-    def test_search_page_refuses_single_character_search(self, mock_sqs):
+    @mock.patch('regulations3k.models.pages.search_paragraphs')
+    def test_search_page_refuses_single_character_search(self, mock_search):
         response = self.client.get(
             self.reg_search_page.url + self.reg_search_page.reverse_subpage(
                 'regulation_results_page'),
             {'q': '%21', 'regs': '1002', 'order': 'regulation'})
-        self.assertEqual(mock_sqs.call_count, 0)
+        self.assertEqual(mock_search.call_count, 0)
         self.assertEqual(response.status_code, 200)
 
-    @mock.patch('regulations3k.models.pages.SearchQuerySet.models')
-    def test_routable_search_page_reg_only(self, mock_sqs):
+    @mock.patch('regulations3k.models.pages.search_paragraphs')
+    def test_routable_search_page_reg_only(self, mock_search):
         response = self.client.get(
             self.reg_search_page.url + self.reg_search_page.reverse_subpage(
                 'regulation_results_page'),
             QueryDict(query_string='regs=1002'))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(mock_sqs.call_count, 0)
+        self.assertEqual(mock_search.call_count, 0)
 
     def test_get_breadcrumbs_section(self):
         crumbs = self.reg_page.get_breadcrumbs(
@@ -645,6 +678,114 @@ class RegModelTests(DjangoTestCase):
             ['http://localhost/reg-landing/1002/4/']
         )
 
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_render_section_is_cached(self):
+        clear_caches()
+        content = self.reg_page.render_section(
+            self.section_num4, self.effective_version)
+        self.assertIn('Regdown paragraph a.', content)
+        with mock.patch('regulations3k.models.pages.regdown') as mock_regdown:
+            self.assertEqual(
+                self.reg_page.render_section(
+                    self.section_num4, self.effective_version),
+                content
+            )
+            self.reg_page.render_section(
+                self.section_num4, self.effective_version,
+                draft_permission=True)
+            self.assertEqual(mock_regdown.call_count, 1)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_section_saved_invalidates_rendered_sections(self):
+        clear_caches()
+        self.reg_page.render_section(
+            self.section_num15, self.effective_version)
+        self.section_num4.contents = 'new contents'
+        self.section_num4.save()
+        with mock.patch('regulations3k.models.pages.regdown') as mock_regdown:
+            self.reg_page.render_section(
+                self.section_num15, self.effective_version)
+            self.assertEqual(mock_regdown.call_count, 1)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_table_of_contents_is_cached(self):
+        clear_caches()
+        toc = get_table_of_contents(self.effective_version)
+        with self.assertNumQueries(0):
+            cached_toc = get_table_of_contents(self.effective_version)
+            self.assertEqual(
+                [section.label for section in cached_toc.sections],
+                [section.label for section in toc.sections]
+            )
+            self.assertEqual(
+                [subpart.section_range
+                 for subpart in cached_toc.subparts.values()],
+                [subpart.section_range
+                 for subpart in toc.subparts.values()]
+            )
+        self.assertEqual(
+            cached_toc.get_section('4').subpart,
+            self.section_num4.subpart
+        )
+        self.assertIsNone(cached_toc.get_section('not-a-section'))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_cached_table_of_contents_defers_contents(self):
+        clear_caches()
+        get_table_of_contents(self.effective_version)
+        with self.assertNumQueries(0):
+            toc = get_table_of_contents(self.effective_version)
+            sections = list(toc.sections)
+            for subpart in toc.subparts.values():
+                sections.extend(subpart.sections.all())
+        self.assertTrue(sections)
+        for section in sections:
+            self.assertIn('contents', section.get_deferred_fields())
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_section_saved_rebuilds_table_of_contents(self):
+        clear_caches()
+        get_table_of_contents(self.effective_version)
+        self.section_num4.title = '\xa7 1002.4 A new title'
+        self.section_num4.save()
+        with self.assertNumQueries(0):
+            toc = get_table_of_contents(self.effective_version)
+            self.assertEqual(
+                toc.get_section('4').title, '\xa7 1002.4 A new title')
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_section_deleted_rebuilds_table_of_contents(self):
+        clear_caches()
+        get_table_of_contents(self.effective_version)
+        self.section_num4.delete()
+        with self.assertNumQueries(0):
+            toc = get_table_of_contents(self.effective_version)
+            self.assertIsNone(toc.get_section('4'))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_part_versions_are_cached(self):
+        clear_caches()
+        request = self.get_request()
+        request.served_by_wagtail_sharing = True
+        self.assertEqual(len(self.reg_page.get_versions(request)), 3)
+        with self.assertNumQueries(0):
+            self.reg_page.get_effective_version(request)
+        baker.make(
+            EffectiveVersion,
+            part=self.part_1002,
+            effective_date=datetime.date(2019, 1, 1),
+        )
+        self.assertEqual(len(self.reg_page.get_versions(request)), 4)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_warm_regulation_sections(self):
+        clear_caches()
+        call_command('warm_regulation_sections')
+        with mock.patch('regulations3k.models.pages.regdown') as mock_regdown:
+            response = self.client.get('/reg-landing/1002/4/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(mock_regdown.call_count, 0)
+
     def test_reg_page_can_serve_draft_versions(self):
         request = self.get_request()
         request.served_by_wagtail_sharing = True
@@ -11,7 +11,8 @@ from regulations3k.models import (
     Subpart
 )
 from regulations3k.resolver import (
-    get_contents_resolver, get_url_resolver, resolve_reference
+    ContentsResolver, ReferenceResolver, get_contents_resolver,
+    get_reference_resolver, get_url_resolver, resolve_reference
 )
 
 
@@ -124,6 +125,26 @@ class ReferenceResolutionTestCase(TestCase):
             'Securities credit.</p>'
         )
 
+    def test_get_reference_resolver_is_reused(self):
+        self.assertIs(get_reference_resolver(), get_reference_resolver())
+
+    def test_reference_resolver_precompiles_patterns(self):
+        resolver = ReferenceResolver(
+            [(r'(?P<s>\d+)-(?P<p>\w+)', 's{s}', '{p}')])
+        self.assertEqual(resolver.resolve('2-c'), ('s2', 'c'))
+        self.assertEqual(resolver.resolve('c'), (None, None))
+
+    def test_contents_resolver_loads_sections_once(self):
+        contents_resolver = ContentsResolver(self.effective_version.pk)
+        with self.assertNumQueries(1):
+            self.assertIn(
+                'Interpreting adverse action',
+                contents_resolver('2-c-Interp')
+            )
+            self.assertEqual(contents_resolver('3-b-Interp'), '')
+            contents_resolver('2-c-Interp')
+        self.assertEqual(len(contents_resolver.paragraphs), 2)
+
     def test_get_url_resolver(self):
         url_resolver = get_url_resolver(self.reg_page)
         result = url_resolver('2-c-Interp')
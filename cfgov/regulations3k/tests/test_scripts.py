@@ -56,6 +56,25 @@ class LinkScriptTestCase(TestCase):
         test_result = insert_section_links(test_regdown)
         self.assertIn(REG_BASE.format('1002'), test_result)
 
+    def test_insert_section_links_repeated_reference(self):
+        test_regdown = 'See § 1002.2 and § 1002.2, not § 99.1.'
+        url = REG_BASE.format('1002/2')
+        self.assertEqual(
+            insert_section_links(test_regdown),
+            'See § <a href="{0}" data-linktag="0">1002.2</a>  and '
+            '§ <a href="{0}" data-linktag="1">1002.2,</a>  '
+            'not § 99.1.'.format(url)
+        )
+
+    @mock.patch('regulations3k.scripts.insert_section_links.PurgeBatch')
+    def test_insert_links_saves_in_bulk(self, mock_batch):
+        with mock.patch.object(Section, 'save') as mock_save:
+            insert_links('1002')
+        mock_save.assert_not_called()
+        self.assertEqual(mock_batch.return_value.purge.call_count, 1)
+        section = Section.objects.get(pk=1)
+        self.assertIn('data-linktag', section.contents)
+
     @mock.patch(
         'regulations3k.scripts.insert_section_links.get_url')
     def test_run_with_section(self, mock_get_url):
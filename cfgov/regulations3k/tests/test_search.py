@@ -0,0 +1,67 @@
+from django.core.paginator import Paginator
+from django.test import TestCase
+
+import mock
+
+from regulations3k.search import (
+    SearchResultPage, build_search_body, search_paragraphs
+)
+
+
+class SearchBodyTestCase(TestCase):
+
+    def test_build_search_body(self):
+        body = build_search_body('credit', offset=50, size=25)
+        self.assertEqual(body['from'], 50)
+        self.assertEqual(body['size'], 25)
+        self.assertEqual(
+            body['query']['bool']['must']['query_string']['query'],
+            '(credit)')
+        self.assertEqual(
+            body['aggs'], {'part': {'terms': {'field': 'part', 'size': 0}}})
+        self.assertNotIn('post_filter', body)
+        self.assertNotIn('sort', body)
+
+    def test_build_search_body_with_regs_and_order(self):
+        body = build_search_body(
+            'credit', regs=['1002', '1026'], order='regulation')
+        self.assertEqual(
+            body['post_filter'], {'terms': {'part': ['1002', '1026']}})
+        self.assertEqual(
+            [list(field) for field in body['sort']],
+            [['part'], ['section_order']])
+
+    @mock.patch('regulations3k.search.haystack_connections')
+    def test_search_paragraphs(self, mock_connections):
+        backend = mock_connections['default'].get_backend.return_value
+        backend.conn.search.return_value = {
+            'hits': {
+                'total': 30,
+                'hits': [
+                    {'_source': {'part': '1002', 'paragraph_id': 'a'},
+                     'highlight': {'text': ['<strong>credit</strong>']}},
+                    {'_source': {'part': '1026', 'paragraph_id': 'b'}},
+                ],
+            },
+            'aggregations': {'part': {'buckets': [
+                {'key': '1002', 'doc_count': 10},
+                {'key': '1026', 'doc_count': 20},
+            ]}},
+        }
+        results = search_paragraphs('credit')
+        self.assertEqual(backend.conn.search.call_count, 1)
+        self.assertEqual(results['count'], 30)
+        self.assertEqual(results['part_counts'], {'1002': 10, '1026': 20})
+        self.assertEqual(
+            results['hits'][0]['highlighted'], ['<strong>credit</strong>'])
+        self.assertIsNone(results['hits'][1]['highlighted'])
+
+
+class SearchResultPageTestCase(TestCase):
+
+    def test_paginator_uses_loaded_page(self):
+        hits = ['hit 26', 'hit 27']
+        paginator = Paginator(SearchResultPage(hits, 27, 25), 25)
+        self.assertEqual(paginator.count, 27)
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(list(paginator.page(2)), hits)
@@ -5,6 +5,7 @@ import mock
 
 from regulations3k.management.commands import update_regulation_index
 from regulations3k.models import Section, SectionParagraph
+from regulations3k.models.django import mark_indexed
 from regulations3k.search_indexes import RegulationParagraphIndex
 
 
@@ -15,7 +16,8 @@ class RegulationIndexTestCase(TestCase):
     index = RegulationParagraphIndex()
 
     def setUp(self):
-        Section.objects.order_by('pk').first().extract_graphs()
+        result = Section.objects.order_by('pk').first().extract_graphs()
+        mark_indexed(result['changed'])
 
     def test_extract_paragraphs(self):
         self.assertEqual(SectionParagraph.objects.count(), 13)
@@ -27,14 +29,85 @@ class RegulationIndexTestCase(TestCase):
             self.index.index_queryset().first().section.subpart.version.draft,
             False)
 
+    def test_extract_paragraphs_diffs_existing(self):
+        section = Section.objects.order_by('pk').first()
+        result = section.extract_graphs()
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['kept'], 13)
+        self.assertEqual(result['changed'], [])
+        graph = SectionParagraph.objects.get(paragraph_id='a')
+        graph.paragraph = 'stale text'
+        graph.save()
+        stray = SectionParagraph.objects.create(
+            section=section, paragraph_id='zz', paragraph='gone')
+        result = section.extract_graphs()
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(result['changed'], [graph])
+        self.assertEqual(result['removed'], [stray.pk])
+        self.assertEqual(SectionParagraph.objects.count(), 13)
+        self.assertNotEqual(
+            SectionParagraph.objects.get(paragraph_id='a').paragraph,
+            'stale text')
+
+    @mock.patch('regulations3k.management.commands'
+                '.update_regulation_index._update_haystack_documents')
     @mock.patch('regulations3k.management.commands'
                 '.update_regulation_index._run_haystack_update')
-    def test_index_management_command(self, mock_haystack):
+    def test_index_management_command(self, mock_haystack, mock_update):
         SectionParagraph.objects.all().delete()
         self.assertEqual(SectionParagraph.objects.count(), 0)
         call_command('update_regulation_index')
         self.assertEqual(SectionParagraph.objects.count(), 113)
+        self.assertEqual(mock_haystack.call_count, 0)
+        changed, removed = mock_update.call_args[0]
+        self.assertEqual(len(changed), 113)
+        self.assertEqual(removed, [])
+        call_command('update_regulation_index')
+        self.assertEqual(mock_update.call_args[0], ([], []))
+
+    def test_extract_paragraphs_reindexes_section_changes(self):
+        section = Section.objects.order_by('pk').first()
+        section.title = 'A new title'
+        section.save()
+        result = section.extract_graphs()
+        self.assertEqual(result['kept'], 13)
+        self.assertEqual(len(result['changed']), 13)
+        mark_indexed(result['changed'])
+        self.assertEqual(section.extract_graphs()['changed'], [])
+
+    def test_extract_paragraphs_indexes_unindexed(self):
+        SectionParagraph.objects.filter(paragraph_id='a').update(
+            index_hash='')
+        result = Section.objects.order_by('pk').first().extract_graphs()
+        self.assertEqual(
+            [graph.paragraph_id for graph in result['changed']], ['a'])
+
+    @mock.patch('regulations3k.management.commands'
+                '.update_regulation_index._update_haystack_documents')
+    @mock.patch('regulations3k.management.commands'
+                '.update_regulation_index._run_haystack_update')
+    def test_index_management_command_rebuild(
+            self, mock_haystack, mock_update):
+        call_command('update_regulation_index', '--rebuild')
         self.assertEqual(mock_haystack.call_count, 1)
+        self.assertEqual(mock_update.call_count, 0)
+
+    @mock.patch('regulations3k.management.commands'
+                '.update_regulation_index.bulk')
+    @mock.patch('regulations3k.management.commands'
+                '.update_regulation_index.haystack_connections')
+    def test_update_haystack_documents(self, mock_connections, mock_bulk):
+        backend = mock_connections['default'].get_backend.return_value
+        graph = SectionParagraph.objects.first()
+        update_regulation_index._update_haystack_documents([graph], [99])
+        self.assertEqual(backend.update.call_count, 1)
+        self.assertEqual(
+            list(backend.update.call_args[0][1]), [graph])
+        actions = mock_bulk.call_args[0][1]
+        self.assertEqual(actions, [{
+            '_op_type': 'delete',
+            '_id': 'regulations3k.sectionparagraph.99',
+        }])
 
     @mock.patch('regulations3k.management.commands'
                 '.update_regulation_index.call_command')
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from regulations3k.models import EffectiveVersion, Section
+from regulations3k.section_cache import (
+    SECTION_CACHE_TIMEOUT, get_section_cache, get_version_generation
+)
+
+
+class TableOfContents(object):
+    """
+    The sections of an effective version, in reading order.
+
+    Sections are grouped by subpart, and each subpart has its sections
+    prefetched, so navigation (including `Subpart.section_range`) can be
+    rendered without touching the database. Section contents are deferred
+    to keep the cached object small.
+    """
+    def __init__(self, sections):
+        self.sections = list(sections)
+        self.subparts = OrderedDict()
+        for section in self.sections:
+            # Share one Subpart instance between its sections.
+            subpart = self.subparts.setdefault(
+                section.subpart_id, section.subpart
+            )
+            section.subpart = subpart
+        prefetch_related_objects(
+            list(self.subparts.values()),
+            Prefetch('sections', queryset=Section.objects.defer('contents'))
+        )
+        self._index = {
+            section.label: i for i, section in enumerate(self.sections)
+        }
+
+    @classmethod
+    def for_version(cls, effective_version):
+        return cls(
+            Section.objects.filter(
+                subpart__version=effective_version
+            ).select_related(
+                'subpart__version__part'
+            ).defer('contents')
+        )
+
+    def get_section(self, label):
+        """Return the section with the given label, or None."""
+        index = self._index.get(label)
+        if index is None:
+            return None
+        return self.sections[index]
+
+    def index(self, label):
+        """Return the position of the section with the given label."""
+        return self._index[label]
+
+
+def _toc_cache_key(version_id):
+    return 'regulations3k:toc:{}:{}'.format(
+        get_version_generation(version_id), version_id
+    )
+
+
+def get_table_of_contents(effective_version):
+    """
+    Return the TableOfContents for an effective version, from the cache.
+
+    The cache key includes the version's generation token, so the table is
+    rebuilt after the version or any of its sections is saved or deleted.
+    """
+    key = _toc_cache_key(effective_version.pk)
+    toc = get_section_cache().get(key)
+    if toc is None:
+        toc = rebuild_table_of_contents(effective_version)
+    return toc
+
+
+def rebuild_table_of_contents(effective_version):
+    """Build an effective version's TableOfContents and cache it."""
+    toc = TableOfContents.for_version(effective_version)
+    get_section_cache().set(
+        _toc_cache_key(effective_version.pk), toc, SECTION_CACHE_TIMEOUT
+    )
+    return toc
+
+
+def _versions_cache_key(part_id):
+    return 'regulations3k:versions:{}'.format(part_id)
+
+
+def get_part_versions(part):
+    """
+    Return a list of all of a Part's effective versions, oldest first.
+
+    Drafts are included; callers filter them out for the public.
+    """
+    cache = get_section_cache()
+    key = _versions_cache_key(part.pk)
+    versions = cache.get(key)
+    if versions is None:
+        versions = list(
+            EffectiveVersion.objects.filter(part=part).select_related('part')
+        )
+        cache.set(key, versions, SECTION_CACHE_TIMEOUT)
+    return versions
+
+
+def invalidate_part_versions(part_id):
+    get_section_cache().delete(_versions_cache_key(part_id))
@@ -1,5 +1,12 @@
+import logging
+import re
+import threading
+import time
+
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.safestring import mark_safe
 
 from wagtail.admin.edit_handlers import FieldPanel, StreamFieldPanel
@@ -9,6 +16,9 @@ from wagtail.core.fields import StreamField
 from v1.atomic_elements.molecules import Notification
 
 
+logger = logging.getLogger(__name__)
+
+
 class BannerContent(StreamBlock):
     content = Notification()
 
@@ -49,3 +59,76 @@ class Banner(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class BannerMatcher(object):
+    """Enabled banners, with their URL patterns compiled, kept in memory.
+
+    Banners are loaded on first use and reloaded from the database at most
+    `reload_interval` seconds later. Saving or deleting a banner reloads
+    this process's banners immediately; other processes, on this host or
+    any other, pick up the change on their next reload.
+    """
+    reload_interval = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def get_banners(self, path):
+        """Return the enabled banners whose URL pattern matches path."""
+        return [
+            banner for banner, pattern in self.get_patterns()
+            if pattern.search(path)
+        ]
+
+    def get_patterns(self):
+        """Return (banner, compiled URL pattern) pairs, reloading if needed.
+        """
+        patterns, loaded_at = self._state
+        if not self.is_stale(patterns, loaded_at):
+            return patterns
+
+        with self._lock:
+            patterns, loaded_at = self._state
+            if self.is_stale(patterns, loaded_at):
+                patterns = self.load()
+                self._state = (patterns, time.monotonic())
+            return patterns
+
+    def is_stale(self, patterns, loaded_at):
+        return (
+            patterns is None or
+            time.monotonic() - loaded_at >= self.reload_interval
+        )
+
+    def load(self):
+        patterns = []
+
+        for banner in Banner.objects.filter(enabled=True).order_by('pk'):
+            try:
+                pattern = re.compile(banner.url_pattern)
+            except re.error:
+                logger.warning(
+                    'Banner %s has an invalid URL pattern: %s',
+                    banner.pk,
+                    banner.url_pattern
+                )
+                continue
+
+            patterns.append((banner, pattern))
+
+        return patterns
+
+    def clear(self):
+        """Forget this process's banners, so that they are reloaded."""
+        self._state = (None, None)
+
+
+banner_matcher = BannerMatcher()
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banners(sender, **kwargs):
+    banner_matcher.clear()
@@ -1,7 +1,6 @@
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models import F, Value
 from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.template.response import TemplateResponse
 from django.utils import timezone, translation
@@ -28,7 +27,7 @@ from wagtailinventory.helpers import get_page_blocks
 
 from v1 import blocks as v1_blocks
 from v1.atomic_elements import molecules, organisms
-from v1.models.banners import Banner
+from v1.models.banners import banner_matcher
 from v1.models.snippets import ReusableText
 from v1.util import ref
 from v1.util.util import validate_social_sharing_image
@@ -225,14 +224,7 @@ class CFGOVPage(Page):
 
         # Add any banners that are enabled and match the current request path
         # to a context variable.
-        context['banners'] = Banner.objects \
-            .filter(enabled=True) \
-            .annotate(
-                # This annotation creates a path field in the QuerySet
-                # that we can use in the filter below to compare with
-                # the url_pattern defined on each enabled banner.
-                path=Value(request.path, output_field=models.CharField())) \
-            .filter(path__regex=F('url_pattern'))
+        context['banners'] = banner_matcher.get_banners(request.path)
 
         if self.schema_json:
             context['schema_json'] = self.schema_json
@@ -1,9 +1,93 @@
 from django.test import TestCase
 
-from v1.models.banners import Banner
+import mock
+
+from v1.models.banners import Banner, BannerMatcher, banner_matcher
 
 
 class TestBanner(TestCase):
     def test_banner_str_method(self):
         test_banner = Banner(title="Test banner")
         self.assertEqual(str(test_banner), test_banner.title)
+
+
+class TestBannerMatcher(TestCase):
+    def setUp(self):
+        # Banners created in a test are rolled back without a delete signal.
+        banner_matcher.clear()
+        self.addCleanup(banner_matcher.clear)
+
+    def test_matches_without_database_queries(self):
+        banner = Banner.objects.create(
+            title='Banner', url_pattern='^/complaint/$|contact-us',
+            enabled=True
+        )
+        banner_matcher.get_banners('/')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                banner_matcher.get_banners('/complaint/'), [banner]
+            )
+            self.assertEqual(
+                banner_matcher.get_banners('/about-us/contact-us/'), [banner]
+            )
+            self.assertEqual(banner_matcher.get_banners('/complaint/x/'), [])
+
+    def test_saving_banner_reloads(self):
+        banner = Banner.objects.create(
+            title='Banner', url_pattern='foo', enabled=True
+        )
+        self.assertEqual(banner_matcher.get_banners('/foo/'), [banner])
+
+        banner.enabled = False
+        banner.save()
+        self.assertEqual(banner_matcher.get_banners('/foo/'), [])
+
+    def test_deleting_banner_reloads(self):
+        banner = Banner.objects.create(
+            title='Banner', url_pattern='foo', enabled=True
+        )
+        self.assertEqual(banner_matcher.get_banners('/foo/'), [banner])
+
+        banner.delete()
+        self.assertEqual(banner_matcher.get_banners('/foo/'), [])
+
+    def test_other_processes_reload_after_interval(self):
+        other_process = BannerMatcher()
+        self.assertEqual(other_process.get_banners('/foo/'), [])
+
+        banner = Banner.objects.create(
+            title='Banner', url_pattern='foo', enabled=True
+        )
+        self.assertEqual(other_process.get_banners('/foo/'), [])
+
+        with mock.patch(
+            'v1.models.banners.time.monotonic',
+            return_value=float('inf')
+        ):
+            self.assertEqual(other_process.get_banners('/foo/'), [banner])
+
+    def test_reloads_after_interval_without_signal(self):
+        banner = Banner.objects.create(
+            title='Banner', url_pattern='foo', enabled=True
+        )
+        self.assertEqual(banner_matcher.get_banners('/foo/'), [banner])
+
+        # A change made on another host sends no signal to this process.
+        Banner.objects.filter(pk=banner.pk).update(enabled=False)
+        self.assertEqual(banner_matcher.get_banners('/foo/'), [banner])
+
+        with mock.patch(
+            'v1.models.banners.time.monotonic',
+            return_value=float('inf')
+        ):
+            self.assertEqual(banner_matcher.get_banners('/foo/'), [])
+
+    def test_invalid_pattern_is_skipped(self):
+        Banner.objects.create(title='Bad', url_pattern='(', enabled=True)
+        banner = Banner.objects.create(
+            title='Banner', url_pattern='/', enabled=True
+        )
+
+        with self.assertLogs('v1.models.banners', 'WARNING'):
+            self.assertEqual(banner_matcher.get_banners('/'), [banner])
@@ -10,7 +10,7 @@ from wagtail.core.models import Site
 import mock
 
 from v1.models import BrowsePage, CFGOVPage
-from v1.models.banners import Banner
+from v1.models.banners import Banner, banner_matcher
 from v1.tests.wagtail_pages.helpers import save_new_page
 
 
@@ -248,6 +248,10 @@ class TestCFGOVPage(TestCase):
 
 class TestCFGOVPageContext(TestCase):
     def setUp(self):
+        # Banners created in a test are rolled back without a delete signal.
+        banner_matcher.clear()
+        self.addCleanup(banner_matcher.clear)
+
         self.page = CFGOVPage(title='Test', slug='test')
         self.factory = RequestFactory()
         self.request = self.factory.get('/')
@@ -287,7 +291,7 @@ class TestCFGOVPageContext(TestCase):
         Banner.objects.create(title='Banner3', url_pattern='/', enabled=False)
         Banner.objects.create(title='Banner4', url_pattern='foo', enabled=True)
         test_context = self.page.get_context(self.request)
-        self.assertEqual(test_context['banners'].count(), 2)
+        self.assertEqual(len(test_context['banners']), 2)
 
     def test_get_context_no_schema_json(self):
         test_context = self.page.get_context(self.request)